@@ -0,0 +1,151 @@
+"""Audio duration from container / frame headers, without decoding
+
+Reads a few kilobytes from the start of the file regardless of its length:
+
+    MP3  - Xing/Info or VBRI frame count from the first frame, else a CBR
+           estimate from the first frame's bitrate and the file size
+    WAV  - data chunk size / byte rate from the RIFF header
+"""
+import os
+import struct
+from typing import BinaryIO, Optional, Tuple
+
+# Kilobits per second, indexed by [version is MPEG-1][layer][bitrate index]
+_BITRATES = {
+    True: {
+        1: (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+        2: (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+        3: (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320)
+    },
+    False: {
+        1: (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+        2: (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+        3: (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160)
+    }
+}
+
+# Indexed by the version bits: 0 = MPEG-2.5, 2 = MPEG-2, 3 = MPEG-1
+_SAMPLE_RATES = {
+    0: (11025, 12000, 8000),
+    2: (22050, 24000, 16000),
+    3: (44100, 48000, 32000)
+}
+
+# How far past the ID3 tag to look for the first frame
+_MAX_SYNC_SEARCH = 64 * 1024
+
+def _id3v2_size(header: bytes) -> int:
+    """Total size of a leading ID3v2 tag (0 if there is none)"""
+    if len(header) < 10 or header[:3] != b'ID3':
+        return 0
+    # Syncsafe integer: 7 bits per byte
+    size = (header[6] << 21) | (header[7] << 14) | (header[8] << 7) | header[9]
+    footer = 10 if header[5] & 0x10 else 0
+    return 10 + size + footer
+
+def _parse_frame_header(header: bytes) -> Optional[Tuple[int, int, int, int, int]]:
+    """(version bits, layer, bitrate kbps, sample rate, channel mode) or None if not a frame"""
+    if len(header) < 4 or header[0] != 0xFF or (header[1] & 0xE0) != 0xE0:
+        return None
+    version = (header[1] >> 3) & 0x03
+    layer = 4 - ((header[1] >> 1) & 0x03)
+    bitrate_index = header[2] >> 4
+    sample_rate_index = (header[2] >> 2) & 0x03
+    if version == 1 or layer == 4 or bitrate_index in (0, 15) or sample_rate_index == 3:
+        return None
+    bitrate = _BITRATES[version == 3][layer][bitrate_index]
+    return version, layer, bitrate, _SAMPLE_RATES[version][sample_rate_index], header[3] >> 6
+
+def _samples_per_frame(version: int, layer: int) -> int:
+    if layer == 1:
+        return 384
+    if layer == 2 or version == 3:
+        return 1152
+    return 576  # Layer III, MPEG-2 / 2.5
+
+def _frame_length(version: int, layer: int, bitrate: int, sample_rate: int, padding: int) -> int:
+    if layer == 1:
+        return (12 * bitrate * 1000 // sample_rate + padding) * 4
+    return _samples_per_frame(version, layer) // 8 * bitrate * 1000 // sample_rate + padding
+
+def _mp3_duration(audio_file: BinaryIO, file_size: int) -> float:
+    audio_file.seek(0)
+    start = _id3v2_size(audio_file.read(10))
+    audio_file.seek(start)
+    data = audio_file.read(_MAX_SYNC_SEARCH)
+
+    # Find the first frame: a valid header followed by another valid header
+    offset = data.find(b'\xff')
+    frame = None
+    while 0 <= offset < len(data) - 4:
+        frame = _parse_frame_header(data[offset:offset + 4])
+        if frame is not None:
+            length = _frame_length(*frame[:4], (data[offset + 2] >> 1) & 0x01)
+            following = data[offset + length:offset + length + 4]
+            if len(following) < 4 or _parse_frame_header(following) is not None:
+                break
+        frame = None
+        offset = data.find(b'\xff', offset + 1)
+    if frame is None:
+        raise ValueError("No MPEG audio frame found")
+
+    version, layer, bitrate, sample_rate, channel_mode = frame
+    samples_per_frame = _samples_per_frame(version, layer)
+
+    # Xing / Info tag sits after the side information of the first frame
+    mono = channel_mode == 3
+    side_info = (17 if mono else 32) if version == 3 else (9 if mono else 17)
+    xing = offset + 4 + side_info
+    if data[xing:xing + 4] in (b'Xing', b'Info'):
+        flags = struct.unpack('>I', data[xing + 4:xing + 8])[0]
+        if flags & 0x01:
+            frames = struct.unpack('>I', data[xing + 8:xing + 12])[0]
+            return frames * samples_per_frame / sample_rate
+
+    # VBRI tag sits 32 bytes after the frame header
+    vbri = offset + 4 + 32
+    if data[vbri:vbri + 4] == b'VBRI':
+        frames = struct.unpack('>I', data[vbri + 14:vbri + 18])[0]
+        return frames * samples_per_frame / sample_rate
+
+    # Constant bitrate: audio bytes / bytes per second
+    audio_bytes = file_size - start - offset
+    audio_file.seek(max(0, file_size - 128))
+    if audio_file.read(3) == b'TAG':
+        audio_bytes -= 128  # ID3v1 trailer
+    return max(audio_bytes, 0) * 8 / (bitrate * 1000)
+
+def _wav_duration(audio_file: BinaryIO, file_size: int) -> float:
+    audio_file.seek(12)
+    byte_rate = None
+    while True:
+        chunk = audio_file.read(8)
+        if len(chunk) < 8:
+            raise ValueError("WAV file has no data chunk")
+        chunk_id, chunk_size = struct.unpack('<4sI', chunk)
+
+        if chunk_id == b'fmt ':
+            fmt = audio_file.read(12)
+            byte_rate = struct.unpack('<HHII', fmt)[3]
+            audio_file.seek(chunk_size - 12 + (chunk_size & 1), os.SEEK_CUR)
+        elif chunk_id == b'data':
+            if not byte_rate:
+                raise ValueError("WAV data chunk before fmt chunk")
+            if chunk_size in (0, 0xFFFFFFFF):
+                # Streamed WAV with no size filled in: data runs to the end of the file
+                chunk_size = file_size - audio_file.tell()
+            return chunk_size / byte_rate
+        else:
+            # Chunks are word-aligned
+            audio_file.seek(chunk_size + (chunk_size & 1), os.SEEK_CUR)
+
+def probe_duration(path: str) -> float:
+    """Duration in seconds of an MP3 or WAV file, read from its headers"""
+    file_size = os.path.getsize(path)
+    with open(path, 'rb') as audio_file:
+        magic = audio_file.read(12)
+        if magic[:4] == b'RIFF' and magic[8:12] == b'WAVE':
+            return _wav_duration(audio_file, file_size)
+        if magic[:3] == b'ID3' or (len(magic) >= 2 and magic[0] == 0xFF and (magic[1] & 0xE0) == 0xE0):
+            return _mp3_duration(audio_file, file_size)
+    raise ValueError(f"Unsupported audio format: {path}")
@@ -1,10 +1,16 @@
 import os
-import torch
-import whisper
-from elevenlabs import generate, save, voices
-from typing import Dict, Any, Optional
+import time
+from elevenlabs import voices
+from typing import Dict, Any, List, Optional, Iterator
 from dataclasses import dataclass
 from pathlib import Path
+from .lazy_loading import LazyModelLoader
+from .whisper_models import WhisperModelRegistry, load_audio
+from .transcription_engine import SAMPLE_RATE
+from .transcription_confidence import LOW_CONFIDENCE_THRESHOLD, score_segments
+from .tts_cache import get_tts_cache, tts_cache_key
+from .audio_probe import probe_duration
+from .tts_backends import create_tts_backend
 
 @dataclass
 class TranscriptionResult:
@@ -12,7 +18,10 @@ class TranscriptionResult:
     confidence: float
     language: str
     segments: list
+    # Every word of every segment: {'word', 'start', 'end', 'probability'} in seconds
     word_timestamps: Optional[list] = None
+    model: Optional[str] = None
+    low_confidence_segments: Optional[list] = None
 
 @dataclass
 class AudioGenerationResult:
@@ -23,15 +32,29 @@ class AudioGenerationResult:
 
 class AudioProcessor:
     def __init__(self):
-        # Initialize Whisper model
-        self.model = whisper.load_model("medium")
+        # Whisper is loaded on first transcription
+        self.models = LazyModelLoader()
+
+        # Whisper sizes / backends, routed per request by duration or requested quality
+        self.whisper_models = WhisperModelRegistry.from_env(self.models)
+
+        # Segments below the threshold are flagged; escalation re-transcribes
+        # only those segments with the next larger model
+        self.low_confidence_threshold = float(
+            os.getenv('WHISPER_LOW_CONFIDENCE_THRESHOLD', str(LOW_CONFIDENCE_THRESHOLD))
+        )
+        self.escalate_low_confidence = os.getenv('WHISPER_ESCALATE_LOW_CONFIDENCE', 'false').lower() == 'true'
         
         # Configure ElevenLabs
         self.eleven_api_key = os.getenv('ELEVEN_LABS_API_KEY')
+
+        # Speech synthesis backend (ElevenLabs, or a local stub for tests)
+        self.tts_backend = create_tts_backend()
         
-        # Cache directory for audio files
-        self.cache_dir = Path('audio_cache')
-        self.cache_dir.mkdir(exist_ok=True)
+        # Content-addressed cache of synthesized audio, shared with TextEvaluator
+        self.tts_cache = get_tts_cache()
+        self.cache_dir = self.tts_cache.cache_dir
+        self.tts_model = "eleven_monolingual_v1"
         
         # Available voices for different use cases
         self.voice_profiles = {
@@ -40,41 +63,143 @@ class AudioProcessor:
             'neutral': 'Sam'      # Clear, neutral voice
         }
 
-    def transcribe_audio(self, audio_path: str, task: str = None) -> TranscriptionResult:
+    @property
+    def model(self):
+        return self.whisper_models.get_model(self.whisper_models.default_size)
+
+    def warm_up(self) -> None:
+        """Preload the default Whisper model so the first transcription does not pay for it"""
+        self.whisper_models.get_engine(self.whisper_models.default_size)
+
+    def get_model_load_stats(self) -> Dict[str, Dict[str, Any]]:
+        stats = self.models.stats()
+        stats['whisper'] = self.whisper_models.metrics()
+        stats['tts_cache'] = self.tts_cache.stats()
+        return stats
+
+    def transcribe_audio(
+        self,
+        audio_path: str,
+        task: str = None,
+        quality: str = None,
+        model_size: str = None,
+        escalate: Optional[bool] = None
+    ) -> TranscriptionResult:
         """Transcribe audio using Whisper"""
         try:
-            # Load audio file
-            audio = whisper.load_audio(audio_path)
-            
-            # Detect language
-            detection = self.model.detect_language(audio)
-            detected_language = detection[0]
-
-            # Transcribe with word-level timestamps if needed
-            transcribe_options = {
-                'task': task or 'transcribe',
-                'language': detected_language,
-                'word_timestamps': True
-            }
+            # Route to a model size by requested quality or audio duration
+            audio, duration = load_audio(audio_path)
+            size = model_size or self.whisper_models.select(duration, quality)
+            engine = self.whisper_models.get_engine(size)
+
+            # Split into silence-bounded chunks, detect language on the first chunk
+            # and decode all chunks in batches
+            start = time.perf_counter()
+            result = engine.transcribe(audio, task=task)
+            self.whisper_models.record(size, duration, time.perf_counter() - start)
+            detected_language = result['language']
 
-            result = self.model.transcribe(audio, **transcribe_options)
+            # Calculate confidence scores from the decoder's log-probabilities
+            segments = result['segments']
+            confidence, low_confidence = score_segments(segments, self.low_confidence_threshold)
+            text = result['text']
 
-            # Calculate confidence scores
-            segment_confidences = [segment.get('confidence', 0) for segment in result['segments']]
-            avg_confidence = sum(segment_confidences) / len(segment_confidences) if segment_confidences else 0
+            if low_confidence and (self.escalate_low_confidence if escalate is None else escalate):
+                if self._escalate_segments(audio, segments, low_confidence, size, detected_language, task):
+                    confidence, low_confidence = score_segments(segments, self.low_confidence_threshold)
+                    text = ' '.join(segment['text'].strip() for segment in segments if segment['text'].strip())
 
             return TranscriptionResult(
-                text=result['text'],
-                confidence=avg_confidence,
+                text=text,
+                confidence=confidence,
                 language=detected_language,
-                segments=result['segments'],
-                word_timestamps=result.get('word_timestamps')
+                segments=segments,
+                word_timestamps=[word for segment in segments for word in segment.get('words', [])],
+                model=size,
+                low_confidence_segments=[segments[position]['id'] for position in low_confidence]
             )
 
         except Exception as e:
             print(f"Error in transcribe_audio: {str(e)}")
             raise
 
+    def _escalate_segments(
+        self,
+        audio: Any,
+        segments: List[Dict[str, Any]],
+        positions: List[int],
+        size: str,
+        language: str,
+        task: str = None
+    ) -> bool:
+        """Re-transcribe only the given segments with the next larger model
+
+        A segment is replaced when the larger model is more confident about it.
+        Returns whether any segment changed.
+        """
+        larger = self.whisper_models.larger(size)
+        if larger is None:
+            return False
+        engine = self.whisper_models.get_engine(larger)
+
+        changed = False
+        for position in positions:
+            segment = segments[position]
+            samples = audio[int(segment['start'] * SAMPLE_RATE):int(segment['end'] * SAMPLE_RATE)]
+            start = time.perf_counter()
+            retry = engine.transcribe(samples, task=task, language=language)
+            self.whisper_models.record(larger, len(samples) / SAMPLE_RATE, time.perf_counter() - start)
+
+            candidate = {
+                **segment,
+                'text': retry['text'],
+                'tokens': [token for part in retry['segments'] for token in part['tokens']],
+                'model': larger
+            }
+            for key in ('avg_logprob', 'no_speech_prob', 'compression_ratio'):
+                values = [part[key] for part in retry['segments']]
+                if values:
+                    candidate[key] = sum(values) / len(values)
+            words = [word for part in retry['segments'] for word in part.get('words', [])]
+            if words:
+                candidate['words'] = [
+                    {**word, 'start': word['start'] + segment['start'], 'end': word['end'] + segment['start']}
+                    for word in words
+                ]
+
+            score_segments([candidate], self.low_confidence_threshold)
+            if candidate['text'].strip() and candidate['confidence'] > segment['confidence']:
+                segments[position] = candidate
+                changed = True
+        return changed
+
+    def stream_transcription(
+        self,
+        audio_path: str,
+        task: str = None,
+        quality: str = None,
+        model_size: str = None
+    ) -> Iterator[Dict[str, Any]]:
+        """Yield a language header and then each segment as soon as its chunk is decoded"""
+        try:
+            audio, duration = load_audio(audio_path)
+            size = model_size or self.whisper_models.select(duration, quality)
+            engine = self.whisper_models.get_engine(size)
+
+            start = time.perf_counter()
+            stream = engine.transcribe_stream(audio, task=task)
+            header = next(stream)
+            header['model'] = size
+            yield header
+            for segment in stream:
+                score_segments([segment], self.low_confidence_threshold)
+                yield segment
+            self.whisper_models.record(size, duration, time.perf_counter() - start)
+
+        except Exception as e:
+            print(f"Error in stream_transcription: {str(e)}")
+            raise
+
     def generate_feedback_audio(
         self,
         text: str,
@@ -90,32 +215,20 @@ class AudioProcessor:
             # Prepare text for specific language and emotion
             prepared_text = self._prepare_text_for_tts(text, language, emotion)
             
-            # Generate audio
-            audio = generate(
-                text=prepared_text,
-                voice=voice_id,
-                model="eleven_monolingual_v1"
+            # Generate audio only on a cache miss
+            cached = self.tts_cache.get_or_create(
+                self._tts_key(prepared_text, voice_id, language, emotion),
+                lambda: self.tts_backend.synthesize(prepared_text, voice_id, self.tts_model),
+                metadata=self._tts_metadata(prepared_text, language, voice_type, emotion),
+                extension=self.tts_backend.extension
             )
 
-            # Generate unique filename
-            filename = f"feedback_{hash(prepared_text)}_{voice_type}.mp3"
-            filepath = self.cache_dir / filename
-            
-            # Save audio file
-            save(audio, str(filepath))
-            
-            # Get audio metadata
-            metadata = {
-                'language': language,
-                'voice_type': voice_type,
-                'emotion': emotion,
-                'text_length': len(prepared_text),
-                'timestamp': str(filepath.stat().st_mtime)
-            }
+            metadata = dict(cached.metadata)
+            metadata['cache_hit'] = cached.cache_hit
 
             return AudioGenerationResult(
-                audio_path=str(filepath),
-                duration=self._get_audio_duration(filepath),
+                audio_path=cached.path,
+                duration=cached.duration,
                 voice_id=voice_id,
                 metadata=metadata
             )
@@ -124,6 +237,46 @@ class AudioProcessor:
             print(f"Error in generate_feedback_audio: {str(e)}")
             raise
 
+    def stream_feedback_audio(
+        self,
+        text: str,
+        voice_type: str = 'neutral',
+        language: str = 'en',
+        emotion: str = None
+    ) -> Iterator[bytes]:
+        """Yield feedback audio chunks as they are synthesized, teeing them into the cache
+
+        Shares cache entries with generate_feedback_audio, so a clip streamed
+        once is served from disk afterwards.
+        """
+        voice_id = self.voice_profiles.get(voice_type, self.voice_profiles['neutral'])
+        prepared_text = self._prepare_text_for_tts(text, language, emotion)
+
+        return self.tts_cache.stream(
+            self._tts_key(prepared_text, voice_id, language, emotion),
+            lambda: self.tts_backend.stream(prepared_text, voice_id, self.tts_model),
+            metadata=self._tts_metadata(prepared_text, language, voice_type, emotion),
+            extension=self.tts_backend.extension
+        )
+
+    def _tts_key(self, prepared_text: str, voice_id: str, language: str, emotion: str = None) -> str:
+        return tts_cache_key(
+            prepared_text,
+            voice_id,
+            language,
+            emotion,
+            f"{self.tts_backend.name}:{self.tts_model}"
+        )
+
+    def _tts_metadata(self, prepared_text: str, language: str, voice_type: str, emotion: str = None) -> Dict[str, Any]:
+        return {
+            'language': language,
+            'voice_type': voice_type,
+            'emotion': emotion,
+            'text_length': len(prepared_text),
+            'timestamp': str(time.time())
+        }
+
     def _prepare_text_for_tts(
         self,
         text: str,
@@ -156,29 +309,18 @@ class AudioProcessor:
             return text
 
     def _get_audio_duration(self, audio_path: Path) -> float:
-        """Get duration of generated audio file"""
+        """Get duration of generated audio file (MP3 or WAV) from its headers"""
         try:
-            import wave
-            with wave.open(str(audio_path), 'rb') as audio_file:
-                frames = audio_file.getnframes()
-                rate = audio_file.getframerate()
-                duration = frames / float(rate)
-                return duration
+            return probe_duration(str(audio_path))
 
         except Exception as e:
             print(f"Error in _get_audio_duration: {str(e)}")
             return 0.0
 
     def clean_cache(self, max_age_hours: int = 24) -> None:
-        """Clean old audio files from cache"""
+        """Drop audio not played within max_age_hours and enforce the cache's byte budget"""
         try:
-            import time
-            current_time = time.time()
-            
-            for audio_file in self.cache_dir.glob('*.mp3'):
-                file_age = current_time - audio_file.stat().st_mtime
-                if file_age > (max_age_hours * 3600):
-                    audio_file.unlink()
+            self.tts_cache.clean(max_age_hours * 3600)
 
         except Exception as e:
             print(f"Error in clean_cache: {str(e)}")
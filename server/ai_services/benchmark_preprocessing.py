@@ -0,0 +1,109 @@
+"""Compare the legacy full-resolution preprocessing with PreprocessingEngine
+
+Reports per-image latency, peak Python-tracked memory and, when Tesseract is
+available, OCR character accuracy against optional ground-truth text files
+(same stem, .txt extension) or agreement between the two pipelines.
+
+    cd server
+    python -m ai_services.benchmark_preprocessing samples/*.jpg --truth-dir samples/truth
+"""
+import os
+import sys
+import time
+import argparse
+import difflib
+import tracemalloc
+import cv2
+import numpy as np
+from typing import Any, Callable, Dict, List, Mapping, Optional
+from .image_preprocessing import PreprocessingEngine
+
+DEFAULT_PARAMS = {
+    'blur_kernel': (5, 5),
+    'threshold_block_size': 11,
+    'threshold_c': 2,
+    'noise_kernel': (1, 1),
+    'dilation_kernel': (2, 2)
+}
+
+def legacy_preprocess(image: np.ndarray, params: Mapping[str, Any]) -> np.ndarray:
+    """The original full-resolution pipeline, allocating a new array at every step"""
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    blurred = cv2.GaussianBlur(gray, params['blur_kernel'], 0)
+    threshold = cv2.adaptiveThreshold(
+        blurred, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY_INV,
+        params['threshold_block_size'], params['threshold_c']
+    )
+    opening = cv2.morphologyEx(threshold, cv2.MORPH_OPEN, np.ones(params['noise_kernel'], np.uint8))
+    dilated = cv2.dilate(opening, np.ones(params['dilation_kernel'], np.uint8), iterations=1)
+    return cv2.bitwise_not(dilated)
+
+def measure(fn: Callable[[], np.ndarray], repeats: int) -> Dict[str, Any]:
+    fn()  # warm up buffers and OpenCV's thread pool
+    tracemalloc.start()
+    start = time.perf_counter()
+    for _ in range(repeats):
+        output = fn()
+    elapsed = (time.perf_counter() - start) / repeats
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'output': output, 'seconds': elapsed, 'peak_mb': peak / (1024 * 1024)}
+
+def ocr(image: np.ndarray) -> Optional[str]:
+    try:
+        import pytesseract
+        return pytesseract.image_to_string(image, config=r'--oem 3 --psm 6')
+    except Exception as e:
+        print(f"OCR skipped: {str(e)}")
+        return None
+
+def char_accuracy(text: str, reference: str) -> float:
+    return difflib.SequenceMatcher(None, ' '.join(text.split()), ' '.join(reference.split())).ratio()
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Benchmark handwriting preprocessing')
+    parser.add_argument('images', nargs='+')
+    parser.add_argument('--truth-dir', help='Directory with <image stem>.txt ground truth')
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--target-dpi', type=int, default=int(os.getenv('HANDWRITING_TARGET_DPI', '200')))
+    parser.add_argument('--no-ocr', action='store_true')
+    args = parser.parse_args(argv)
+
+    engine = PreprocessingEngine(target_dpi=args.target_dpi)
+
+    for path in args.images:
+        image = cv2.imread(path)
+        if image is None:
+            print(f"{path}: could not read image")
+            continue
+
+        legacy = measure(lambda: legacy_preprocess(image, DEFAULT_PARAMS), args.repeats)
+        tuned = measure(lambda: engine.process(engine.to_grayscale(image), DEFAULT_PARAMS)[0], args.repeats)
+
+        print(f"{path} ({image.shape[1]}x{image.shape[0]})")
+        for name, run in (('legacy', legacy), ('engine', tuned)):
+            height, width = run['output'].shape
+            print(f"  {name:<7} {run['seconds'] * 1000:8.1f} ms  peak {run['peak_mb']:7.1f} MB  output {width}x{height}")
+        print(f"  speedup {legacy['seconds'] / tuned['seconds']:.2f}x")
+
+        if args.no_ocr:
+            continue
+
+        legacy_text, engine_text = ocr(legacy['output']), ocr(tuned['output'])
+        if legacy_text is None or engine_text is None:
+            continue
+
+        truth_path = None
+        if args.truth_dir:
+            truth_path = os.path.join(args.truth_dir, os.path.splitext(os.path.basename(path))[0] + '.txt')
+        if truth_path and os.path.exists(truth_path):
+            with open(truth_path, encoding='utf-8') as truth_file:
+                truth = truth_file.read()
+            print(f"  accuracy legacy {char_accuracy(legacy_text, truth):.3f}  engine {char_accuracy(engine_text, truth):.3f}")
+        else:
+            print(f"  OCR agreement between pipelines {char_accuracy(engine_text, legacy_text):.3f}")
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,9 +1,50 @@
 import os
+import hashlib
+import re
+import json
+import asyncio
+import threading
 import torch
 import openai
-from transformers import RobertaTokenizer, RobertaForSequenceClassification
-from typing import Dict, List, Any
+from transformers import RobertaTokenizer
+from typing import Dict, List, Any, Optional, Tuple
 from dataclasses import dataclass
+from .lazy_loading import LazyModelLoader
+from .llm_cache import chat_completion
+from .llm_client import LLMError
+from .task_graph import Task, run_task_graph, run_sync
+from .batching import MicroBatcher
+from .inference_backends import CODEBERT_MODEL, load_codebert_encoder, check_codebert_parity, parity_check_enabled
+from .static_metrics import StaticAnalyzer
+from .code_runner import CodeRunner, ExecutionReport
+from .code_windows import split_code_units, sliding_windows
+from .cache_utils import LRUCache
+
+# Shape of the single-shot review response
+CODE_REVIEW_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'style_score': {'type': 'number', 'minimum': 0, 'maximum': 1},
+        'feedback': {'type': 'string'},
+        'suggestions': {'type': 'array', 'items': {'type': 'string'}, 'minItems': 1, 'maxItems': 5},
+        'code_snippets': {
+            'type': 'array',
+            'maxItems': 3,
+            'items': {
+                'type': 'object',
+                'properties': {
+                    'title': {'type': 'string'},
+                    'description': {'type': 'string'},
+                    'code': {'type': 'string'}
+                },
+                'required': ['title', 'description', 'code']
+            }
+        }
+    },
+    'required': ['style_score', 'feedback', 'suggestions', 'code_snippets']
+}
+
+CODE_EVAL_MODES = ('single', 'graph')
 
 @dataclass
 class CodeMetrics:
@@ -11,6 +52,7 @@ class CodeMetrics:
     maintainability: float
     efficiency: float
     style_score: float
+    details: Optional[Dict[str, Any]] = None  # Static analysis report, when available
 
 @dataclass
 class CodeFeedback:
@@ -19,15 +61,15 @@ class CodeFeedback:
     metrics: CodeMetrics
     suggestions: List[str]
     code_snippets: List[Dict[str, str]]
+    execution: Optional[ExecutionReport] = None  # Test case results, when tests were given
 
 class CodeEvaluator:
     def __init__(self):
         # Initialize OpenAI
         openai.api_key = os.getenv('OPENAI_API_KEY')
         
-        # Initialize CodeBERT
-        self.tokenizer = RobertaTokenizer.from_pretrained('microsoft/codebert-base')
-        self.model = RobertaForSequenceClassification.from_pretrained('microsoft/codebert-base')
+        # CodeBERT is loaded on first use
+        self.models = LazyModelLoader()
         
         # Language-specific style guides
         self.style_guides = {
@@ -37,30 +79,303 @@ class CodeEvaluator:
             'cpp': 'Google C++ Style Guide'
         }
 
-    def evaluate_code(self, code: str, language: str) -> CodeFeedback:
-        """Evaluate code submission using CodeBERT and GPT-4"""
+        # Maximum number of LLM calls / model passes in flight per evaluation
+        self.max_concurrency = int(os.getenv('CODE_EVAL_MAX_CONCURRENCY', '4'))
+
+        # "single": one structured GPT-4 review per submission, falling back to
+        # the per-aspect call graph only when the response does not validate
+        self.mode = os.getenv('CODE_EVAL_MODE', 'single')
+        if self.mode not in CODE_EVAL_MODES:
+            raise ValueError(f"Unknown code evaluation mode: {self.mode} (expected one of {', '.join(CODE_EVAL_MODES)})")
+        self.review_model = os.getenv('CODE_REVIEW_MODEL', 'gpt-4')
+        # Only models that support it (e.g. gpt-4o) accept response_format
+        self.review_json_mode = os.getenv('CODE_REVIEW_JSON_MODE', 'false').lower() == 'true'
+        self._review_stats_lock = threading.Lock()
+        self._review_stats = {'single_shot': 0, 'fallbacks': 0}
+
+        # Python and JavaScript/TypeScript metrics come from offline static
+        # analysis; other languages use CodeBERT features and a GPT-4 style score
+        self.static_metrics_enabled = os.getenv('STATIC_METRICS_ENABLED', 'true').lower() == 'true'
+        self.static_analyzer = StaticAnalyzer(cache_size=int(os.getenv('STATIC_METRICS_CACHE_SIZE', '1024')))
+
+        # Test cases run in warm sandbox workers, started on first use
+        self.code_runner = CodeRunner.from_env()
+
+        # Code longer than one CodeBERT context is covered by overlapping
+        # windows (tokens per window excluding <s>/</s>, and the step between them)
+        self.window_tokens = int(os.getenv('CODEBERT_WINDOW_TOKENS', '510'))
+        self.window_stride = int(os.getenv('CODEBERT_WINDOW_STRIDE', '384'))
+        if not 0 < self.window_stride <= self.window_tokens:
+            raise ValueError(
+                f"CODEBERT_WINDOW_STRIDE must be between 1 and CODEBERT_WINDOW_TOKENS "
+                f"({self.window_tokens}), got {self.window_stride}"
+            )
+        # Pooled embedding and token count per function-level unit of code
+        self.embedding_cache = LRUCache(max_entries=int(os.getenv('CODEBERT_EMBEDDING_CACHE_SIZE', '4096')))
+
+        # Concurrent CodeBERT windows, across submissions, are micro-batched
+        # into one forward pass
+        self.num_threads = int(os.getenv('CODEBERT_NUM_THREADS', '0'))
+        self.backend = os.getenv('CODEBERT_BACKEND', 'torch')
+        self.codebert_batcher = MicroBatcher(
+            self._encode_windows,
+            max_batch_size=int(os.getenv('CODEBERT_MAX_BATCH_SIZE', '16')),
+            max_wait_ms=float(os.getenv('CODEBERT_MAX_WAIT_MS', '5')),
+            name='codebert-batcher'
+        )
+
+    @property
+    def tokenizer(self) -> RobertaTokenizer:
+        return self.models.get(
+            'codebert-tokenizer',
+            lambda: RobertaTokenizer.from_pretrained(CODEBERT_MODEL)
+        )
+
+    @property
+    def encoder(self) -> Any:
+        """CodeBERT encoder for the configured backend: (input_ids, attention_mask) -> last hidden state"""
+        return self.models.get(f'codebert-{self.backend}', self._load_encoder)
+
+    def _load_encoder(self) -> Any:
+        if self.num_threads > 0:
+            torch.set_num_threads(self.num_threads)
+        encoder = load_codebert_encoder(self.backend)
+
+        # Optionally verify the selected backend against fp32 before serving with it
+        if self.backend != 'torch' and parity_check_enabled():
+            report = check_codebert_parity(self.backend, candidate=encoder)
+            if not report['passed']:
+                print(f"Parity check failed for CodeBERT ({self.backend}): {report}; using torch")
+                return load_codebert_encoder('torch')
+        return encoder
+
+    def warm_up(self) -> None:
+        """Preload CodeBERT so the first request does not pay for it"""
+        self.tokenizer
+        self.encoder
+
+    def get_model_load_stats(self) -> Dict[str, Dict[str, Any]]:
+        stats = self.models.stats()
+        stats['codebert_batching'] = self.codebert_batcher.stats()
+        stats['codebert_embeddings'] = self.embedding_cache.stats()
+        stats['static_metrics'] = self.static_analyzer.stats()
+        stats['code_runner'] = self.code_runner.stats()
+        with self._review_stats_lock:
+            stats['code_review'] = dict(self._review_stats, mode=self.mode)
+        return stats
+
+    def evaluate_code(self, code: str, language: str, test_cases: Optional[List[Any]] = None) -> CodeFeedback:
+        """Evaluate code submission using CodeBERT and GPT-4, running any test cases (use evaluate_code_async inside an event loop)"""
+        return run_sync(self.evaluate_code_async(code, language, test_cases))
+
+    async def evaluate_code_async(
+        self,
+        code: str,
+        language: str,
+        test_cases: Optional[List[Any]] = None
+    ) -> CodeFeedback:
+        """Evaluate code submission; test cases run in the sandbox alongside the review"""
+        if not test_cases:
+            return await self._review(code, language)
+
+        loop = asyncio.get_running_loop()
+        execution = loop.run_in_executor(None, self.code_runner.run_tests, code, language, test_cases)
         try:
-            # Get code metrics
-            metrics = self._analyze_code_metrics(code, language)
-            
-            # Generate detailed feedback using GPT-4
-            feedback = self._generate_feedback(code, language, metrics)
-            
-            # Calculate overall score
-            score = self._calculate_score(metrics, feedback)
-            
-            # Generate improvement suggestions
-            suggestions = self._generate_suggestions(code, language, metrics)
-            
-            # Generate example code snippets
-            code_snippets = self._generate_code_snippets(feedback, language)
-            
+            feedback = await self._review(code, language)
+        except BaseException:
+            execution.cancel()
+            raise
+        feedback.execution = await execution
+        return feedback
+
+    async def _review(self, code: str, language: str) -> CodeFeedback:
+        """Review with one structured call, or the call graph"""
+        if self.mode == 'single':
+            try:
+                return await self._evaluate_single_shot(code, language)
+            except (ValueError, LLMError) as e:
+                # Unparseable or invalid review, or a failed / timed-out call:
+                # redo it aspect by aspect with smaller requests
+                print(f"Single-shot code review failed, falling back: {str(e)}")
+                with self._review_stats_lock:
+                    self._review_stats['fallbacks'] += 1
+        return await self._evaluate_graph(code, language)
+
+    async def _evaluate_single_shot(self, code: str, language: str) -> CodeFeedback:
+        """CodeBERT and a single JSON review call run concurrently
+
+            model_features --+
+                             +--> metrics --> score
+            review ----------+
+
+        With static analysis the metrics do not wait for the review.
+        """
+        if self._uses_static_metrics(language):
+            metric_tasks = [Task('metrics', lambda: self._static_code_metrics(code, language))]
+        else:
+            metric_tasks = [
+                Task('model_features', lambda: self._compute_model_features(code, language)),
+                Task(
+                    'metrics',
+                    lambda model_features, review: self._build_metrics(model_features, review['style_score']),
+                    ('model_features', 'review')
+                )
+            ]
+
+        results = await run_task_graph([
+            Task('review', lambda: self._review_code(code, language)),
+            *metric_tasks,
+            Task(
+                'score',
+                lambda metrics, review: self._calculate_score(metrics, review['feedback']),
+                ('metrics', 'review')
+            )
+        ], max_concurrency=self.max_concurrency)
+
+        review = results['review']
+        with self._review_stats_lock:
+            self._review_stats['single_shot'] += 1
+        return CodeFeedback(
+            score=results['score'],
+            feedback=review['feedback'],
+            metrics=results['metrics'],
+            suggestions=review['suggestions'],
+            code_snippets=review['code_snippets']
+        )
+
+    def _review_code(self, code: str, language: str) -> Dict[str, Any]:
+        """Style score, feedback, suggestions and snippets from one GPT-4 call"""
+        prompt = f"""As an expert {language} developer, review this code.
+
+            Code:
+            ```{language}
+            {code}
+            ```
+
+            Cover code structure and organization, algorithm efficiency, best practices
+            and patterns, style guide compliance ({self.style_guides.get(language, 'standard conventions')})
+            and potential improvements. Respond with a single JSON object matching this schema:
+            {json.dumps(CODE_REVIEW_SCHEMA)}
+
+            - style_score: style compliance between 0 and 1
+            - feedback: detailed review
+            - suggestions: 3-5 specific, actionable suggestions
+            - code_snippets: 2-3 short {language} examples demonstrating the improvements
+            """
+
+        params = {}
+        if self.review_json_mode:
+            params['response_format'] = {'type': 'json_object'}
+        response = chat_completion(
+            model=self.review_model,
+            messages=[
+                {"role": "system", "content": "You are an expert code reviewer. Respond only with JSON."},
+                {"role": "user", "content": prompt}
+            ],
+            temperature=0,
+            **params
+        )
+        return self._parse_review(response.choices[0].message.content)
+
+    def _parse_review(self, content: str) -> Dict[str, Any]:
+        """Validate a review response against CODE_REVIEW_SCHEMA, raising ValueError if it does not fit"""
+        match = re.search(r'\{.*\}', content or '', re.DOTALL)
+        if match is None:
+            raise ValueError("No JSON object in review response")
+        try:
+            review = json.loads(match.group(0))
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Invalid JSON in review response: {str(e)}")
+
+        missing = [key for key in CODE_REVIEW_SCHEMA['required'] if key not in review]
+        if missing:
+            raise ValueError(f"Review response is missing {', '.join(missing)}")
+
+        style_score = review['style_score']
+        if isinstance(style_score, bool) or not isinstance(style_score, (int, float)):
+            raise ValueError(f"style_score is not a number: {style_score!r}")
+
+        feedback = review['feedback']
+        if not isinstance(feedback, str) or not feedback.strip():
+            raise ValueError("feedback is empty")
+
+        suggestions = review['suggestions']
+        if not isinstance(suggestions, list) or not all(isinstance(s, str) for s in suggestions):
+            raise ValueError("suggestions is not a list of strings")
+
+        snippets = review['code_snippets']
+        if not isinstance(snippets, list) or not all(
+            isinstance(snippet, dict) and all(isinstance(snippet.get(key), str) for key in ('title', 'description', 'code'))
+            for snippet in snippets
+        ):
+            raise ValueError("code_snippets is not a list of {title, description, code}")
+
+        return {
+            'style_score': min(max(float(style_score), 0.0), 1.0),
+            'feedback': feedback.strip(),
+            'suggestions': [s.strip() for s in suggestions if s.strip()],
+            'code_snippets': [
+                {key: snippet[key] for key in ('title', 'description', 'code')}
+                for snippet in snippets
+            ]
+        }
+
+    async def _evaluate_graph(self, code: str, language: str) -> CodeFeedback:
+        """Evaluate code submission, running independent model and LLM calls concurrently
+
+        Dependency graph (longest path: style -> feedback -> snippets):
+
+            model_features --+
+                             +--> metrics --+--> feedback --+--> code_snippets
+            style_score -----+              |               +--> score
+                                            +--> suggestions
+
+        With static analysis, metrics is a single offline task.
+        """
+        if self._uses_static_metrics(language):
+            metric_tasks = [Task('metrics', lambda: self._static_code_metrics(code, language))]
+        else:
+            metric_tasks = [
+                Task('model_features', lambda: self._compute_model_features(code, language)),
+                Task('style_score', lambda: self._check_code_style(code, language)),
+                Task(
+                    'metrics',
+                    lambda model_features, style_score: self._build_metrics(model_features, style_score),
+                    ('model_features', 'style_score')
+                )
+            ]
+
+        try:
+            results = await run_task_graph([
+                *metric_tasks,
+                Task(
+                    'feedback',
+                    lambda metrics: self._generate_feedback(code, language, metrics),
+                    ('metrics',)
+                ),
+                Task(
+                    'suggestions',
+                    lambda metrics: self._generate_suggestions(code, language, metrics),
+                    ('metrics',)
+                ),
+                Task(
+                    'code_snippets',
+                    lambda feedback: self._generate_code_snippets(feedback, language),
+                    ('feedback',)
+                ),
+                Task(
+                    'score',
+                    lambda metrics, feedback: self._calculate_score(metrics, feedback),
+                    ('metrics', 'feedback')
+                )
+            ], max_concurrency=self.max_concurrency)
+
             return CodeFeedback(
-                score=score,
-                feedback=feedback,
-                metrics=metrics,
-                suggestions=suggestions,
-                code_snippets=code_snippets
+                score=results['score'],
+                feedback=results['feedback'],
+                metrics=results['metrics'],
+                suggestions=results['suggestions'],
+                code_snippets=results['code_snippets']
             )
 
         except Exception as e:
@@ -68,37 +383,121 @@ class CodeEvaluator:
             raise
 
     def _analyze_code_metrics(self, code: str, language: str) -> CodeMetrics:
-        """Analyze code metrics using CodeBERT"""
+        """Analyze code metrics using static analysis or CodeBERT"""
         try:
-            # Tokenize code
-            inputs = self.tokenizer(code, return_tensors='pt', truncation=True, max_length=512)
-            
-            # Get model outputs
-            with torch.no_grad():
-                outputs = self.model(**inputs)
-            
-            # Extract features from the model's hidden states
-            features = outputs.hidden_states[-1].mean(dim=1)
-            
-            # Calculate metrics based on features
-            complexity = torch.sigmoid(features[:, 0]).item()
-            maintainability = torch.sigmoid(features[:, 1]).item()
-            efficiency = torch.sigmoid(features[:, 2]).item()
-            
+            if self._uses_static_metrics(language):
+                return self._static_code_metrics(code, language)
+
+            model_features = self._compute_model_features(code, language)
+
             # Calculate style score based on language-specific rules
             style_score = self._check_code_style(code, language)
-            
+
+            return self._build_metrics(model_features, style_score)
+
+        except Exception as e:
+            print(f"Error in _analyze_code_metrics: {str(e)}")
+            raise
+
+    def _uses_static_metrics(self, language: str) -> bool:
+        return self.static_metrics_enabled and self.static_analyzer.supports(language)
+
+    def _static_code_metrics(self, code: str, language: str) -> CodeMetrics:
+        """Complexity, maintainability, efficiency and style from the static analyzer"""
+        try:
+            report = self.static_analyzer.analyze(code, language)
+            scores = report.scores()
             return CodeMetrics(
-                complexity=complexity,
-                maintainability=maintainability,
-                efficiency=efficiency,
-                style_score=style_score
+                complexity=scores['complexity'],
+                maintainability=scores['maintainability'],
+                efficiency=scores['efficiency'],
+                style_score=scores['style'],
+                details=report.to_dict()
             )
 
         except Exception as e:
-            print(f"Error in _analyze_code_metrics: {str(e)}")
+            print(f"Error in _static_code_metrics: {str(e)}")
             raise
 
+    def _compute_model_features(self, code: str, language: str) -> Tuple[float, float, float]:
+        """Run CodeBERT and derive complexity, maintainability and efficiency"""
+        try:
+            embedding = self._embed_code(code, language)
+
+            # Calculate metrics based on features
+            scores = torch.sigmoid(embedding[:3])
+            return tuple(scores.tolist())
+
+        except Exception as e:
+            print(f"Error in _compute_model_features: {str(e)}")
+            raise
+
+    def _embed_code(self, code: str, language: str) -> torch.Tensor:
+        """Pooled CodeBERT embedding of the whole submission, however long
+
+        Each function-level unit is tokenized once, split into overlapping
+        windows and embedded; unit embeddings are cached, so a re-submission
+        only encodes the units that changed. Units are combined by a
+        token-weighted mean.
+        """
+        units = split_code_units(code, language) or [code]
+        keys = [
+            hashlib.sha256(f"{self.backend}\0{unit}".encode('utf-8')).hexdigest()
+            for unit in units
+        ]
+        cached = {key: self.embedding_cache.get(key) for key in keys}
+
+        # Queue every window of every uncached unit before waiting on any, so
+        # they share forward passes
+        pending = {}
+        for unit, key in zip(units, keys):
+            if cached[key] is not None or key in pending:
+                continue
+            token_ids = self.tokenizer(unit, add_special_tokens=False, verbose=False)['input_ids']
+            windows = sliding_windows(token_ids, self.window_tokens, self.window_stride) if token_ids else [[]]
+            pending[key] = [(len(window), self.codebert_batcher.submit(window)) for window in windows]
+
+        for key, windows in pending.items():
+            weights = torch.tensor([float(max(length, 1)) for length, _ in windows])
+            embeddings = torch.stack([future.result() for _, future in windows])
+            pooled = (embeddings * weights.unsqueeze(-1)).sum(dim=0) / weights.sum()
+            cached[key] = (pooled, sum(length for length, _ in windows))
+            self.embedding_cache.set(key, cached[key])
+
+        embeddings = torch.stack([cached[key][0] for key in keys])
+        weights = torch.tensor([float(max(cached[key][1], 1)) for key in keys])
+        return (embeddings * weights.unsqueeze(-1)).sum(dim=0) / weights.sum()
+
+    def _encode_windows(self, windows: List[List[int]]) -> List[torch.Tensor]:
+        """Run one padded CodeBERT forward pass over a batch of token windows"""
+        tokenizer = self.tokenizer
+        # Add <s>/</s> and pad to the longest window in the batch
+        sequences = [[tokenizer.cls_token_id] + list(window) + [tokenizer.sep_token_id] for window in windows]
+        longest = max(len(sequence) for sequence in sequences)
+        input_ids = torch.full((len(sequences), longest), tokenizer.pad_token_id, dtype=torch.long)
+        attention_mask = torch.zeros((len(sequences), longest), dtype=torch.long)
+        for row, sequence in enumerate(sequences):
+            input_ids[row, :len(sequence)] = torch.tensor(sequence, dtype=torch.long)
+            attention_mask[row, :len(sequence)] = 1
+
+        # Get the last hidden state from the configured backend
+        with torch.no_grad():
+            hidden = self.encoder(input_ids, attention_mask)
+
+        # Mean-pool the last hidden state over real (non-padding) tokens
+        mask = attention_mask.unsqueeze(-1).to(hidden.dtype)
+        features = (hidden * mask).sum(dim=1) / mask.sum(dim=1)
+        return list(features.float())
+
+    def _build_metrics(self, model_features: Tuple[float, float, float], style_score: float) -> CodeMetrics:
+        complexity, maintainability, efficiency = model_features
+        return CodeMetrics(
+            complexity=complexity,
+            maintainability=maintainability,
+            efficiency=efficiency,
+            style_score=style_score
+        )
+
     def _generate_feedback(self, code: str, language: str, metrics: CodeMetrics) -> str:
         """Generate detailed feedback using GPT-4"""
         try:
@@ -122,7 +521,7 @@ class CodeEvaluator:
             5. Potential improvements
             """
 
-            response = openai.ChatCompletion.create(
+            response = chat_completion(
                 model="gpt-4",
                 messages=[
                     {"role": "system", "content": "You are an expert code reviewer providing detailed feedback."},
@@ -165,6 +564,9 @@ class CodeEvaluator:
     def _check_code_style(self, code: str, language: str) -> float:
         """Check code style against language-specific guidelines"""
         try:
+            if self._uses_static_metrics(language):
+                return self.static_analyzer.analyze(code, language).scores()['style']
+
             prompt = f"""Rate this {language} code's style compliance with {self.style_guides.get(language, 'standard conventions')}.
             Return only a score between 0 and 1.
 
@@ -174,7 +576,7 @@ class CodeEvaluator:
             ```
             """
 
-            response = openai.ChatCompletion.create(
+            response = chat_completion(
                 model="gpt-4",
                 messages=[
                     {"role": "system", "content": "You are a code style analyzer. Respond only with a score between 0 and 1."},
@@ -204,7 +606,7 @@ class CodeEvaluator:
             ```
             """
 
-            response = openai.ChatCompletion.create(
+            response = chat_completion(
                 model="gpt-4",
                 messages=[
                     {"role": "system", "content": "You are a code improvement advisor. Provide specific, actionable suggestions."},
@@ -231,7 +633,7 @@ class CodeEvaluator:
             Format each snippet with a title and description.
             """
 
-            response = openai.ChatCompletion.create(
+            response = chat_completion(
                 model="gpt-4",
                 messages=[
                     {"role": "system", "content": "You are a code example generator. Provide educational code snippets."},
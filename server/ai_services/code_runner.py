@@ -0,0 +1,615 @@
+"""Sandboxed execution of student code against stdin/stdout test cases
+
+Each worker is a separate, single-threaded Python interpreter started once
+(`python -I code_runner.py`) and kept warm. For every test it forks a child
+that applies CPU, address-space, file-size and process rlimits, runs the code
+with the test input on stdin, and is reaped with wait4() for CPU time and
+peak RSS. Python submissions run directly in the forked child, so a test
+costs a fork rather than an interpreter start; JavaScript is exec'd into
+node from the same fork.
+
+Test cases are spread across the worker pool. rlimits bound resources but do
+not block network or filesystem reads; run the service in a container for
+stronger isolation. POSIX only.
+"""
+import os
+import sys
+import json
+import time
+import queue
+import signal
+import select
+import shutil
+import tempfile
+import threading
+import traceback
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, asdict
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import pwd
+    import resource
+except ImportError:  # Windows
+    pwd = resource = None
+
+RUNNABLE_LANGUAGES = ('python', 'javascript')
+
+LANGUAGE_ALIASES = {
+    'py': 'python',
+    'js': 'javascript'
+}
+
+@dataclass
+class ResourceLimits:
+    cpu_seconds: float = 2.0
+    wall_seconds: float = 5.0
+    memory_mb: int = 256
+    output_bytes: int = 64 * 1024
+    file_bytes: int = 1024 * 1024
+    # Threads and processes the sandbox user may have while node runs (V8 and
+    # libuv need about 7 per process); applied only when tests drop to the
+    # sandbox user, since the service's own user already has processes
+    node_tasks: int = 64
+
+    @classmethod
+    def from_env(cls) -> 'ResourceLimits':
+        return cls(
+            cpu_seconds=float(os.getenv('CODE_RUN_CPU_SECONDS', '2')),
+            wall_seconds=float(os.getenv('CODE_RUN_WALL_SECONDS', '5')),
+            memory_mb=int(os.getenv('CODE_RUN_MEMORY_MB', '256')),
+            output_bytes=int(os.getenv('CODE_RUN_OUTPUT_BYTES', str(64 * 1024))),
+            node_tasks=int(os.getenv('CODE_RUN_NODE_TASKS', '64'))
+        )
+
+@dataclass
+class TestCase:
+    input: str = ''
+    expected_output: str = ''
+    name: Optional[str] = None
+
+@dataclass
+class TestResult:
+    name: str
+    status: str  # passed, failed, error, timeout, memory_limit, output_limit
+    passed: bool
+    runtime: float  # wall-clock seconds
+    cpu_time: float
+    memory_kb: int  # peak RSS
+    output: str = ''
+    error: str = ''
+
+@dataclass
+class ExecutionReport:
+    language: str
+    passed_tests: int
+    total_tests: int
+    runtime: float  # wall-clock seconds, summed over tests
+    memory_usage_kb: int  # largest peak RSS of any test
+    results: List[TestResult] = field(default_factory=list)
+
+def normalize_language(language: Optional[str]) -> str:
+    language = (language or '').strip().lower()
+    return LANGUAGE_ALIASES.get(language, language)
+
+def parse_test_cases(test_cases: List[Any]) -> List[TestCase]:
+    """Accept TestCase objects or dicts with input / expected_output / name"""
+    parsed = []
+    for i, case in enumerate(test_cases):
+        if isinstance(case, TestCase):
+            parsed.append(case)
+            continue
+        if not isinstance(case, dict) or 'expected_output' not in case:
+            raise ValueError(f"Test case {i} must be an object with 'input' and 'expected_output'")
+        parsed.append(TestCase(
+            input=str(case.get('input') or ''),
+            expected_output=str(case['expected_output']),
+            name=case.get('name')
+        ))
+    return parsed
+
+def outputs_match(actual: str, expected: str) -> bool:
+    """Compare line by line, ignoring trailing whitespace and trailing blank lines"""
+    def lines(text: str) -> List[str]:
+        return [line.rstrip() for line in text.rstrip().splitlines()]
+    return lines(actual) == lines(expected)
+
+# ---------------------------------------------------------------------------
+# Worker process (runs as `python -I code_runner.py`)
+
+# Address space node needs beyond its heap: V8 reserves far more than it uses
+NODE_ADDRESS_SPACE_MB = 2048
+
+def _apply_limits(limits: Dict[str, Any], language: str, unprivileged: bool) -> None:
+    cpu = max(1, int(limits['cpu_seconds'] + 0.999))
+    # SIGXCPU at the soft limit, SIGKILL one second later
+    resource.setrlimit(resource.RLIMIT_CPU, (cpu, cpu + 1))
+    resource.setrlimit(resource.RLIMIT_FSIZE, (limits['file_bytes'], limits['file_bytes']))
+    resource.setrlimit(resource.RLIMIT_CORE, (0, 0))
+    if language == 'python':
+        # No new processes or threads (binding because the child is not root)
+        resource.setrlimit(resource.RLIMIT_NPROC, (0, 0))
+        memory = limits['memory_mb'] * 1024 * 1024
+    else:
+        # node needs its own threads, so it gets a small task budget for the
+        # sandbox user instead of none; its heap is capped with --max-old-space-size
+        if unprivileged:
+            resource.setrlimit(resource.RLIMIT_NPROC, (limits['node_tasks'], limits['node_tasks']))
+        memory = (limits['memory_mb'] + NODE_ADDRESS_SPACE_MB) * 1024 * 1024
+    resource.setrlimit(resource.RLIMIT_AS, (memory, memory))
+
+# prctl(), resolved once in the worker: after dropping privileges the child
+# may not be able to read the interpreter's modules to import ctypes
+_prctl = None
+
+def _load_prctl() -> None:
+    global _prctl
+    if sys.platform.startswith('linux'):
+        import ctypes
+        _prctl = ctypes.CDLL(None, use_errno=True).prctl
+
+def _die_with_parent() -> None:
+    """Have the kernel kill the child if its worker is killed (Linux only)"""
+    if _prctl is not None:
+        PR_SET_PDEATHSIG = 1
+        _prctl(PR_SET_PDEATHSIG, signal.SIGKILL)
+
+def _drop_privileges(credentials: Optional[List[int]]) -> None:
+    """Switch the child to the unprivileged sandbox user, so rlimits bind it"""
+    if not credentials:
+        return
+    uid, gid = credentials
+    os.setgroups([])
+    os.setgid(gid)
+    os.setuid(uid)
+
+def _exec_python(code: str) -> int:
+    # The worker's buffered stdio may hold protocol bytes; start clean on fds 0-2
+    sys.stdin = open(0, 'r', encoding='utf-8', closefd=False)
+    sys.stdout = open(1, 'w', encoding='utf-8', closefd=False)
+    sys.stderr = open(2, 'w', encoding='utf-8', closefd=False)
+    sys.argv = ['main.py']
+    status = 0
+    try:
+        exec(compile(code, 'main.py', 'exec'), {'__name__': '__main__', '__builtins__': __builtins__})
+    except SystemExit as e:
+        if isinstance(e.code, int):
+            status = e.code
+        elif e.code is not None:
+            print(e.code, file=sys.stderr)
+            status = 1
+    except BaseException as e:
+        # Start the traceback at the student's code, not this frame
+        traceback.print_exception(type(e), e, e.__traceback__.tb_next)
+        status = 1
+    finally:
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+        except BaseException:
+            status = status or 1
+    return status
+
+def _child(request: Dict[str, Any], workdir: str, stdin_fd: int, stdout_fd: int, stderr_fd: int) -> None:
+    """Runs in the forked child; never returns"""
+    status = 1
+    try:
+        os.dup2(stdin_fd, 0)
+        os.dup2(stdout_fd, 1)
+        os.dup2(stderr_fd, 2)
+        os.closerange(3, 65536)
+        os.setsid()
+        os.chdir(workdir)
+        _drop_privileges(request.get('credentials'))
+        # After the credential change, which clears the parent-death signal
+        _die_with_parent()
+        _apply_limits(request['limits'], request['language'], bool(request.get('credentials')))
+        if request['language'] == 'python':
+            status = _exec_python(request['code'])
+        else:
+            script = os.path.join(workdir, 'main.js')
+            with open(script, 'w', encoding='utf-8') as f:
+                f.write(request['code'])
+            node = request.get('node_binary') or 'node'
+            flags = [f"--max-old-space-size={request['limits']['memory_mb']}"]
+            if request.get('node_permission_flag'):
+                # No child_process, worker threads or writes outside the workdir
+                flags += [request['node_permission_flag'], '--no-warnings', '--allow-fs-read=*', f'--allow-fs-write={workdir}']
+            os.execvp(node, [node, *flags, script])
+    except BaseException:
+        try:
+            os.write(2, traceback.format_exc().encode('utf-8', 'replace'))
+        except OSError:
+            pass
+    os._exit(status)
+
+def _run_request(request: Dict[str, Any]) -> Dict[str, Any]:
+    """Fork, feed stdin, collect bounded output and reap with wait4()"""
+    limits = request['limits']
+    workdir = tempfile.mkdtemp(prefix='code_run_')
+    if request.get('credentials'):
+        uid, gid = request['credentials']
+        os.chown(workdir, uid, gid)
+    stdin_r, stdin_w = os.pipe()
+    stdout_r, stdout_w = os.pipe()
+    stderr_r, stderr_w = os.pipe()
+
+    started = time.monotonic()
+    pid = os.fork()
+    if pid == 0:
+        _child(request, workdir, stdin_r, stdout_w, stderr_w)
+
+    for fd in (stdin_r, stdout_w, stderr_w):
+        os.close(fd)
+
+    pending_input = request.get('input', '').encode('utf-8')
+    if not pending_input:
+        os.close(stdin_w)
+        stdin_w = None
+    else:
+        os.set_blocking(stdin_w, False)
+
+    captured = {stdout_r: bytearray(), stderr_r: bytearray()}
+    open_fds = [stdout_r, stderr_r]
+    deadline = started + limits['wall_seconds']
+    timed_out = truncated = False
+
+    while open_fds or stdin_w is not None:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            timed_out = True
+            break
+        writers = [stdin_w] if stdin_w is not None else []
+        readable, writable, _ = select.select(open_fds, writers, [], remaining)
+        if writable:
+            try:
+                written = os.write(stdin_w, pending_input[:65536])
+                pending_input = pending_input[written:]
+            except (BrokenPipeError, BlockingIOError) as e:
+                if isinstance(e, BrokenPipeError):
+                    pending_input = b''
+            if not pending_input:
+                os.close(stdin_w)
+                stdin_w = None
+        for fd in readable:
+            chunk = os.read(fd, 65536)
+            if not chunk:
+                open_fds.remove(fd)
+                continue
+            captured[fd] += chunk
+            if len(captured[fd]) > limits['output_bytes']:
+                truncated = True
+        if truncated:
+            break
+        if not open_fds and stdin_w is not None:
+            # The program exited without reading all of its input
+            os.close(stdin_w)
+            stdin_w = None
+
+    if not (timed_out or truncated):
+        # Output closed, but the child can still be running (it may have
+        # closed stdout/stderr and gone to sleep); keep the wall-clock limit.
+        # WNOWAIT leaves an exited child unreaped so its pid keeps naming the session
+        delay = 0.001
+        while os.waitid(os.P_PID, pid, os.WEXITED | os.WNOHANG | os.WNOWAIT) is None:
+            if time.monotonic() >= deadline:
+                timed_out = True
+                break
+            time.sleep(min(delay, max(0.0, deadline - time.monotonic())))
+            delay = min(delay * 2, 0.05)
+
+    # Kill the whole session even after a normal exit, so nothing the test
+    # started outlives it (and the child itself, if it has not called setsid() yet)
+    for kill in (os.killpg, os.kill):
+        try:
+            kill(pid, signal.SIGKILL)
+        except OSError:
+            pass
+    _, wait_status, usage = os.wait4(pid, 0)
+    runtime = time.monotonic() - started
+
+    for fd in (stdout_r, stderr_r, stdin_w):
+        if fd is not None:
+            os.close(fd)
+    shutil.rmtree(workdir, ignore_errors=True)
+
+    # ru_maxrss is kilobytes on Linux and bytes on macOS
+    memory_kb = usage.ru_maxrss // 1024 if sys.platform == 'darwin' else usage.ru_maxrss
+    return {
+        'stdout': bytes(captured[stdout_r][:limits['output_bytes']]).decode('utf-8', 'replace'),
+        'stderr': bytes(captured[stderr_r][:limits['output_bytes']]).decode('utf-8', 'replace'),
+        'exit_code': os.WEXITSTATUS(wait_status) if os.WIFEXITED(wait_status) else None,
+        'signal': os.WTERMSIG(wait_status) if os.WIFSIGNALED(wait_status) else None,
+        'runtime': runtime,
+        'cpu_time': usage.ru_utime + usage.ru_stime,
+        'memory_kb': memory_kb,
+        'timed_out': timed_out,
+        'truncated': truncated
+    }
+
+def _worker_main() -> None:
+    """Serve one JSON request per line on stdin, one JSON reply per line on stdout"""
+    _load_prctl()
+    requests = os.fdopen(os.dup(0), 'rb')
+    replies = os.fdopen(os.dup(1), 'wb')
+    for line in requests:
+        try:
+            reply = _run_request(json.loads(line))
+        except Exception as e:
+            reply = {'worker_error': f"{type(e).__name__}: {str(e)}"}
+        replies.write(json.dumps(reply).encode('utf-8') + b'\n')
+        replies.flush()
+
+# ---------------------------------------------------------------------------
+# Server side
+
+class WorkerTimeout(RuntimeError):
+    pass
+
+# Extra seconds, beyond the test's wall-clock limit, allowed for a worker reply
+REPLY_MARGIN_SECONDS = 5.0
+
+class SandboxWorker:
+    """One warm worker interpreter; used by a single thread at a time"""
+
+    def __init__(self):
+        self._process: Optional[subprocess.Popen] = None
+
+    def _start(self) -> subprocess.Popen:
+        return subprocess.Popen(
+            [sys.executable, '-I', os.path.abspath(__file__)],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True
+        )
+
+    def ensure_started(self) -> None:
+        if self._process is None or self._process.poll() is not None:
+            self._process = self._start()
+
+    def _read_reply(self, timeout: float) -> bytes:
+        """One reply line, read straight from the pipe so the wait can be bounded"""
+        fd = self._process.stdout.fileno()
+        deadline = time.monotonic() + timeout
+        data = bytearray()
+        while not data.endswith(b'\n'):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not select.select([fd], [], [], remaining)[0]:
+                raise WorkerTimeout(f"Sandbox worker did not reply within {timeout:.1f}s")
+            chunk = os.read(fd, 65536)
+            if not chunk:
+                return b''
+            data += chunk
+        return bytes(data)
+
+    def run(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        self.ensure_started()
+        try:
+            self._process.stdin.write(json.dumps(request).encode('utf-8') + b'\n')
+            self._process.stdin.flush()
+            line = self._read_reply(request['limits']['wall_seconds'] + REPLY_MARGIN_SECONDS)
+        except WorkerTimeout:
+            # A stuck worker is replaced; its test child dies with it
+            self.close()
+            raise
+        except (BrokenPipeError, OSError):
+            line = b''
+        if not line:
+            self.close()
+            raise RuntimeError("Sandbox worker exited unexpectedly")
+        reply = json.loads(line)
+        if 'worker_error' in reply:
+            raise RuntimeError(f"Sandbox worker failed: {reply['worker_error']}")
+        return reply
+
+    def close(self) -> None:
+        if self._process is not None:
+            try:
+                self._process.kill()
+                self._process.wait()
+            except OSError:
+                pass
+            self._process = None
+
+def _user_credentials(user: str) -> Optional[Tuple[int, int]]:
+    """uid and gid of a user name or numeric uid, or None if there is no such user"""
+    try:
+        entry = pwd.getpwuid(int(user)) if user.isdigit() else pwd.getpwnam(user)
+    except (KeyError, TypeError, AttributeError):
+        return None
+    return entry.pw_uid, entry.pw_gid
+
+class CodeRunner:
+    """Runs test cases in parallel across a pool of warm sandbox workers"""
+
+    def __init__(
+        self,
+        workers: int = 2,
+        limits: Optional[ResourceLimits] = None,
+        max_tests: int = 50,
+        node_binary: str = 'node',
+        sandbox_user: Optional[str] = 'nobody',
+        allow_root: bool = False
+    ):
+        self.workers = workers
+        self.limits = limits or ResourceLimits()
+        self.max_tests = max_tests
+        self.node_binary = node_binary
+
+        # rlimits such as RLIMIT_NPROC do not bind root, so when the service
+        # runs as root each test child switches to sandbox_user; running
+        # tests as root instead has to be allowed explicitly
+        self.sandbox_user = sandbox_user
+        self.allow_root = allow_root
+        self._as_root = hasattr(os, 'geteuid') and os.geteuid() == 0
+        self._credentials = _user_credentials(sandbox_user) if self._as_root and sandbox_user else None
+
+        # node's permission model flag, if this node has one; probed on first JavaScript run
+        self._node_permission_flag: Optional[str] = None
+        self._node_probed = False
+
+        self._idle: 'queue.Queue[SandboxWorker]' = queue.Queue()
+        for _ in range(workers):
+            self._idle.put(SandboxWorker())
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='code-runner')
+        self._stats_lock = threading.Lock()
+        self._stats = {'runs': 0, 'tests': 0, 'passed': 0, 'timeouts': 0, 'worker_restarts': 0}
+
+    @classmethod
+    def from_env(cls) -> 'CodeRunner':
+        return cls(
+            workers=int(os.getenv('CODE_RUN_WORKERS', str(min(4, os.cpu_count() or 1)))),
+            limits=ResourceLimits.from_env(),
+            max_tests=int(os.getenv('CODE_RUN_MAX_TESTS', '50')),
+            node_binary=os.getenv('CODE_RUN_NODE', 'node'),
+            sandbox_user=os.getenv('CODE_RUN_USER', 'nobody') or None,
+            allow_root=os.getenv('CODE_RUN_ALLOW_ROOT', 'false').lower() == 'true'
+        )
+
+    def supports(self, language: Optional[str]) -> bool:
+        if resource is None or not hasattr(os, 'fork'):
+            return False
+        language = normalize_language(language)
+        if language == 'javascript':
+            return shutil.which(self.node_binary) is not None
+        return language in RUNNABLE_LANGUAGES
+
+    def _node_permission(self) -> Optional[str]:
+        """The flag enabling node's permission model (node 20+), or None if unsupported"""
+        if not self._node_probed:
+            for flag in ('--permission', '--experimental-permission'):
+                try:
+                    probe = subprocess.run([self.node_binary, flag, '-e', '0'], capture_output=True, timeout=10)
+                except (OSError, subprocess.TimeoutExpired):
+                    break
+                if probe.returncode == 0:
+                    self._node_permission_flag = flag
+                    break
+            self._node_probed = True
+        return self._node_permission_flag
+
+    def warm_up(self) -> None:
+        """Start the worker interpreters ahead of the first test"""
+        workers = [self._idle.get() for _ in range(self.workers)]
+        try:
+            for worker in workers:
+                worker.ensure_started()
+        finally:
+            for worker in workers:
+                self._idle.put(worker)
+
+    def _run_one(self, code: str, language: str, case: TestCase, index: int) -> TestResult:
+        request = {
+            'language': language,
+            'code': code,
+            'input': case.input,
+            'limits': asdict(self.limits),
+            'node_binary': self.node_binary,
+            'node_permission_flag': self._node_permission() if language == 'javascript' else None,
+            'credentials': self._credentials
+        }
+        worker = self._idle.get()
+        started = time.monotonic()
+        try:
+            try:
+                raw = worker.run(request)
+            except WorkerTimeout:
+                with self._stats_lock:
+                    self._stats['worker_restarts'] += 1
+                raw = {
+                    'stdout': '',
+                    'stderr': '',
+                    'exit_code': None,
+                    'signal': None,
+                    'runtime': time.monotonic() - started,
+                    'cpu_time': 0.0,
+                    'memory_kb': 0,
+                    'timed_out': True,
+                    'truncated': False
+                }
+            except RuntimeError:
+                # One retry on a fresh interpreter
+                with self._stats_lock:
+                    self._stats['worker_restarts'] += 1
+                raw = worker.run(request)
+        finally:
+            self._idle.put(worker)
+
+        return self._to_result(raw, case, index)
+
+    def _to_result(self, raw: Dict[str, Any], case: TestCase, index: int) -> TestResult:
+        stderr = raw['stderr']
+        killed_for_cpu = raw['signal'] in (signal.SIGXCPU, signal.SIGKILL) and not raw['truncated']
+        if raw['timed_out'] or killed_for_cpu:
+            status = 'timeout'
+        elif raw['truncated']:
+            status = 'output_limit'
+        elif raw['exit_code'] != 0 and ('MemoryError' in stderr or 'heap out of memory' in stderr):
+            status = 'memory_limit'
+        elif raw['exit_code'] != 0:
+            status = 'error'
+        elif outputs_match(raw['stdout'], case.expected_output):
+            status = 'passed'
+        else:
+            status = 'failed'
+
+        return TestResult(
+            name=case.name or f"test_{index + 1}",
+            status=status,
+            passed=status == 'passed',
+            runtime=round(raw['runtime'], 4),
+            cpu_time=round(raw['cpu_time'], 4),
+            memory_kb=raw['memory_kb'],
+            output=raw['stdout'],
+            error=stderr
+        )
+
+    def run_tests(self, code: str, language: str, test_cases: List[Any]) -> ExecutionReport:
+        """Run every test case and summarize the results"""
+        language = normalize_language(language)
+        if not self.supports(language):
+            raise ValueError(f"Test execution is not available for {language} (supported: {', '.join(RUNNABLE_LANGUAGES)})")
+        if self._as_root and self._credentials is None and not self.allow_root:
+            raise RuntimeError(
+                f"Refusing to run submitted code as root: sandbox user {self.sandbox_user!r} does not exist "
+                "(set CODE_RUN_USER to an unprivileged user, or CODE_RUN_ALLOW_ROOT=true)"
+            )
+        cases = parse_test_cases(test_cases)
+        if len(cases) > self.max_tests:
+            raise ValueError(f"Too many test cases: {len(cases)} (limit {self.max_tests})")
+
+        futures = [
+            self._executor.submit(self._run_one, code, language, case, i)
+            for i, case in enumerate(cases)
+        ]
+        results = [future.result() for future in futures]
+
+        passed = sum(1 for result in results if result.passed)
+        with self._stats_lock:
+            self._stats['runs'] += 1
+            self._stats['tests'] += len(results)
+            self._stats['passed'] += passed
+            self._stats['timeouts'] += sum(1 for result in results if result.status == 'timeout')
+
+        return ExecutionReport(
+            language=language,
+            passed_tests=passed,
+            total_tests=len(results),
+            runtime=round(sum(result.runtime for result in results), 4),
+            memory_usage_kb=max((result.memory_kb for result in results), default=0),
+            results=results
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            return dict(self._stats, workers=self.workers)
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False)
+        while not self._idle.empty():
+            self._idle.get().close()
+
+if __name__ == '__main__':
+    _worker_main()
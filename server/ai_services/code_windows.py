@@ -0,0 +1,135 @@
+"""Splitting code into function-level units and token windows for CodeBERT
+
+Code is split into top-level units (functions, classes, and the statements
+between them) so embeddings can be cached per unit: editing one function
+only re-encodes that function. Units longer than the model's context are
+covered by overlapping token windows.
+"""
+import re
+import ast
+from typing import List
+
+_STRING_OR_COMMENT = re.compile(r'"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'|//.*$|#.*$')
+# Blocks whose members are split into units of their own
+_CONTAINER = re.compile(r'\b(class|interface|struct|enum|namespace|impl|object|trait)\b')
+
+_PY_FUNCTIONS = (ast.FunctionDef, ast.AsyncFunctionDef)
+
+def _split_python(code: str) -> List[str]:
+    tree = ast.parse(code)
+    lines = code.splitlines(keepends=True)
+
+    # Each top-level function, class and method is its own unit; statements
+    # in between are grouped
+    boundaries = set()
+    nodes = list(tree.body)
+    for node in tree.body:
+        if isinstance(node, ast.ClassDef):
+            nodes.extend(child for child in node.body if isinstance(child, _PY_FUNCTIONS))
+    for node in nodes:
+        if isinstance(node, _PY_FUNCTIONS + (ast.ClassDef,)):
+            start = min([node.lineno] + [d.lineno for d in node.decorator_list])
+            boundaries.add(start - 1)
+            boundaries.add(node.end_lineno)
+
+    units, current = [], []
+    for index, line in enumerate(lines):
+        if index in boundaries and current:
+            units.append(''.join(current))
+            current = []
+        current.append(line)
+    if current:
+        units.append(''.join(current))
+    return units
+
+def _split_braces(code: str) -> List[str]:
+    """Top-level blocks of brace languages, and the members of classes and namespaces
+
+    At the top level a unit ends where a block closes or at a blank line.
+    Directly inside a class-like container, the container header is a unit of
+    its own and so is every member: a unit ends wherever a statement or block
+    finishes at the container's body level. Comments and annotations stay
+    with the member below them.
+    """
+    units, current = [], []
+    # Open blocks, innermost last: True for a container whose members are split
+    blocks: List[bool] = []
+    header = ''
+    for line in code.splitlines(keepends=True):
+        current.append(line)
+        last, closed = None, False
+        for char in _STRING_OR_COMMENT.sub('', line):
+            if char == '{':
+                # Only containers nested directly in containers split their members
+                blocks.append(all(blocks) and bool(_CONTAINER.search(header)))
+            elif char == '}':
+                closed = True
+                if blocks:
+                    blocks.pop()
+            elif char != ';':
+                header += char
+                continue
+            header = ''
+            last = char
+
+        if not blocks:
+            boundary = closed or not line.strip()
+        elif blocks[-1]:
+            ended = last is not None and not header.strip()
+            boundary = ended or not line.strip()
+        else:
+            boundary = False
+        if boundary:
+            units.append(''.join(current))
+            current = []
+    if current:
+        units.append(''.join(current))
+
+    # A container's closing brace belongs with its last member
+    merged: List[str] = []
+    for unit in units:
+        if merged and merged[-1].strip() and unit.strip() and not unit.strip(' \t\r\n{};'):
+            merged[-1] += unit
+        else:
+            merged.append(unit)
+    return merged
+
+def split_code_units(code: str, language: str) -> List[str]:
+    """Split code into consecutive units that concatenate back to the original"""
+    units = None
+    if (language or '').lower() in ('python', 'py'):
+        try:
+            units = _split_python(code)
+        except SyntaxError:
+            pass
+    if units is None:
+        units = _split_braces(code)
+
+    # Blank-only pieces carry no signal; fold them into the next unit
+    merged, pending = [], ''
+    for unit in units:
+        if not unit.strip():
+            pending += unit
+            continue
+        merged.append(pending + unit)
+        pending = ''
+    if pending:
+        if merged:
+            merged[-1] += pending
+        else:
+            merged.append(pending)
+    return merged
+
+def sliding_windows(token_ids: List[int], size: int, stride: int) -> List[List[int]]:
+    """Overlapping windows of at most size tokens, starting every stride tokens, covering every token"""
+    if not 0 < stride <= size:
+        raise ValueError(f"Window stride must be between 1 and the window size ({size}), got {stride}")
+    if len(token_ids) <= size:
+        return [token_ids]
+    windows = []
+    start = 0
+    while True:
+        windows.append(token_ids[start:start + size])
+        if start + size >= len(token_ids):
+            return windows
+        start += stride
@@ -0,0 +1,137 @@
+import os
+import json
+import re
+import numpy
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Sequence
+from .llm_cache import chat_completion
+
+CLASS_NAMES = ['poor', 'fair', 'good', 'excellent']
+
+class ExplanationScorer(ABC):
+    """Scores a batch of texts into a (n_texts, n_classes) probability matrix for LIME"""
+
+    num_classes = len(CLASS_NAMES)
+
+    @abstractmethod
+    def score(self, texts: Sequence[str]) -> numpy.ndarray:
+        ...
+
+    def predictor(self) -> 'MemoizedPredictor':
+        """Create a LIME classifier_fn that scores each distinct text only once"""
+        return MemoizedPredictor(self)
+
+class MemoizedPredictor:
+    """LIME classifier_fn for a single explanation, reusing scores across sampling rounds"""
+
+    def __init__(self, scorer: ExplanationScorer):
+        self.scorer = scorer
+        self.scores: Dict[str, numpy.ndarray] = {}
+
+    @property
+    def samples_scored(self) -> int:
+        return len(self.scores)
+
+    def __call__(self, texts: Sequence[str]) -> numpy.ndarray:
+        pending = list(dict.fromkeys(t for t in texts if t not in self.scores))
+        if pending:
+            matrix = self.scorer.score(pending)
+            for text, row in zip(pending, matrix):
+                self.scores[text] = row
+        return numpy.vstack([self.scores[t] for t in texts])
+
+def _one_hot(labels: Sequence[int], num_classes: int) -> numpy.ndarray:
+    labels = numpy.clip(numpy.asarray(labels, dtype=int), 0, num_classes - 1)
+    matrix = numpy.zeros((len(labels), num_classes))
+    matrix[numpy.arange(len(labels)), labels] = 1
+    return matrix
+
+class BatchedLLMScorer(ExplanationScorer):
+    """Rates many texts per GPT-4 request instead of one request per text"""
+
+    def __init__(self, model: str = 'gpt-4', batch_size: int = 25, max_parallel_requests: int = 4):
+        self.model = model
+        self.batch_size = batch_size
+        self.max_parallel_requests = max_parallel_requests
+
+    def _score_batch(self, texts: Sequence[str]) -> List[int]:
+        numbered = '\n'.join(
+            f"[{i + 1}] {json.dumps(text, ensure_ascii=False)}" for i, text in enumerate(texts)
+        )
+        response = chat_completion(
+            model=self.model,
+            messages=[
+                {"role": "system", "content": (
+                    "Rate each of the following numbered texts on a scale of 0-3 "
+                    "(0=poor, 1=fair, 2=good, 3=excellent). Return only a JSON array "
+                    f"of {len(texts)} integers, one per text, in the given order."
+                )},
+                {"role": "user", "content": numbered}
+            ],
+            temperature=0
+        )
+
+        content = response.choices[0].message.content
+        match = re.search(r'\[.*\]', content, re.DOTALL)
+        if match is None:
+            raise ValueError(f"Could not parse batched scores: {content!r}")
+        scores = [int(round(float(s))) for s in json.loads(match.group(0))]
+        if len(scores) != len(texts):
+            raise ValueError(f"Expected {len(texts)} scores, got {len(scores)}")
+        return scores
+
+    def score(self, texts: Sequence[str]) -> numpy.ndarray:
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        if len(batches) == 1:
+            labels = self._score_batch(batches[0])
+        else:
+            with ThreadPoolExecutor(max_workers=min(self.max_parallel_requests, len(batches))) as pool:
+                labels = [label for batch in pool.map(self._score_batch, batches) for label in batch]
+        return _one_hot(labels, self.num_classes)
+
+class LocalModelScorer(ExplanationScorer):
+    """Scores texts with a local model in one vectorized pass
+
+    The model is anything exposing ``predict_proba(texts)`` (e.g. a scikit-learn
+    text pipeline) or a plain callable returning a (n_texts, 4) matrix.
+    """
+
+    def __init__(self, model):
+        self.model = model
+
+    @classmethod
+    def from_path(cls, path: str) -> 'LocalModelScorer':
+        import joblib
+        return cls(joblib.load(path))
+
+    def score(self, texts: Sequence[str]) -> numpy.ndarray:
+        predict = getattr(self.model, 'predict_proba', self.model)
+        matrix = numpy.asarray(predict(list(texts)), dtype=float)
+        if matrix.shape != (len(texts), self.num_classes):
+            raise ValueError(
+                f"Local scorer returned shape {matrix.shape}, expected {(len(texts), self.num_classes)}"
+            )
+        return matrix
+
+def create_explanation_scorer(kind: Optional[str] = None) -> ExplanationScorer:
+    """Build the scorer selected by EXPLANATION_SCORER ('llm' or 'local')"""
+    kind = kind or os.getenv('EXPLANATION_SCORER', 'llm')
+    if kind == 'llm':
+        return BatchedLLMScorer(batch_size=int(os.getenv('EXPLANATION_BATCH_SIZE', '25')))
+    if kind == 'local':
+        model_path = os.getenv('EXPLANATION_LOCAL_MODEL')
+        if not model_path:
+            raise ValueError("EXPLANATION_LOCAL_MODEL must point to a saved model for the local scorer")
+        return LocalModelScorer.from_path(model_path)
+    raise ValueError(f"Unknown explanation scorer: {kind}")
+
+def weights_converged(previous: Dict[str, float], current: Dict[str, float], tolerance: float) -> bool:
+    """Check whether LIME feature weights are stable between two sampling rounds"""
+    if set(previous) != set(current):
+        return False
+    scale = max((abs(w) for w in current.values()), default=0.0)
+    if scale == 0:
+        return True
+    drift = max(abs(current[f] - previous[f]) for f in current)
+    return drift <= tolerance * scale
@@ -0,0 +1,116 @@
+"""Local stand-in for the OpenAI chat completions API
+
+Answers POST /v1/chat/completions with deterministic content, and can inject
+latency, 429s and 5xx errors to exercise the LLM client's retries, rate
+limiting and coalescing without network access or an API key:
+
+    python -m ai_services.fake_llm_server --port 8089 --latency-ms 200 --rate-limit-every 5
+    OPENAI_BASE_URL=http://127.0.0.1:8089/v1 uvicorn ai_services.main:app
+"""
+import re
+import json
+import time
+import asyncio
+import argparse
+from typing import Any, Callable, Dict, List, Optional
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+def default_responder(params: Dict[str, Any]) -> str:
+    """Plausible replies for the prompts the evaluators send"""
+    messages = params.get('messages', [])
+    system = ' '.join(m.get('content', '') for m in messages if m.get('role') == 'system')
+    user = messages[-1].get('content', '') if messages else ''
+
+    match = re.search(r'JSON array of (\d+) integers', system)
+    if match:
+        # Batched explanation scoring: one 0-3 rating per numbered text
+        return '[' + ', '.join(str(len(text) % 4) for text in re.findall(r'^\[\d+\] (.*)$', user, flags=re.MULTILINE)) + ']'
+    if 'Respond only with JSON' in system:
+        # Single-shot code review (CODE_REVIEW_SCHEMA)
+        return json.dumps({
+            'style_score': 0.8,
+            'feedback': f"Fake review ({len(user)} characters of input).",
+            'suggestions': ['Add docstrings', 'Use descriptive names', 'Handle edge cases'],
+            'code_snippets': [{'title': 'Docstring', 'description': 'Document the function', 'code': 'def f():\n    """Explain f."""'}]
+        })
+    if 'Return only the number' in system or 'Return only the number' in user:
+        return '0.8'
+    return f"Fake response ({len(user)} characters of input)."
+
+def create_app(
+    responder: Callable[[Dict[str, Any]], str] = default_responder,
+    latency_ms: float = 0.0,
+    rate_limit_every: int = 0,
+    fail_every: int = 0,
+    retry_after: float = 1.0
+) -> FastAPI:
+    """Build the fake API; every Nth request can be answered with a 429 or a 500"""
+    app = FastAPI()
+    app.state.requests = 0
+    app.state.calls = []
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        params = await request.json()
+        app.state.requests += 1
+        count = app.state.requests
+        app.state.calls.append(params)
+
+        if latency_ms:
+            await asyncio.sleep(latency_ms / 1000)
+        if rate_limit_every and count % rate_limit_every == 0:
+            return JSONResponse(
+                {'error': {'message': 'Rate limit reached', 'type': 'requests'}},
+                status_code=429,
+                headers={'Retry-After': str(retry_after)}
+            )
+        if fail_every and count % fail_every == 0:
+            return JSONResponse({'error': {'message': 'Server error', 'type': 'server_error'}}, status_code=500)
+
+        content = responder(params)
+        prompt_tokens = sum(len(str(m.get('content', ''))) for m in params.get('messages', [])) // 4
+        completion_tokens = len(content) // 4 + 1
+        return {
+            'id': f'chatcmpl-fake-{count}',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': params.get('model', 'fake'),
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': content},
+                'finish_reason': 'stop'
+            }],
+            'usage': {
+                'prompt_tokens': prompt_tokens,
+                'completion_tokens': completion_tokens,
+                'total_tokens': prompt_tokens + completion_tokens
+            }
+        }
+
+    @app.get("/stats")
+    def stats():
+        return {'requests': app.state.requests}
+
+    return app
+
+def main(argv: Optional[List[str]] = None) -> None:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description='Fake OpenAI chat completions server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--latency-ms', type=float, default=0.0)
+    parser.add_argument('--rate-limit-every', type=int, default=0, help='Answer every Nth request with 429')
+    parser.add_argument('--fail-every', type=int, default=0, help='Answer every Nth request with 500')
+    args = parser.parse_args(argv)
+
+    app = create_app(
+        latency_ms=args.latency_ms,
+        rate_limit_every=args.rate_limit_every,
+        fail_every=args.fail_every
+    )
+    uvicorn.run(app, host=args.host, port=args.port)
+
+if __name__ == '__main__':
+    main()
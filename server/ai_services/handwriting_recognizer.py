@@ -1,17 +1,65 @@
 import os
 import cv2
+import random
+import hashlib
+from types import MappingProxyType
 import numpy as np
 import pytesseract
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, FIRST_COMPLETED, wait
 from PIL import Image
-from typing import Dict, Any, Tuple
-from dataclasses import dataclass
+from typing import Dict, Any, Tuple, List, Iterable, Iterator, Optional, Union
+from dataclasses import dataclass, field
+from .cache_utils import LRUCache
+from .image_preprocessing import PreprocessingEngine
 
 @dataclass
 class RecognitionResult:
     text: str
     confidence: float
-    preprocessed_image_path: str
+    preprocessed_image_path: Optional[str]
     debug_info: Dict[str, Any]
+    words: List[Dict[str, Any]] = field(default_factory=list)
+
+# Anything recognize_handwriting accepts: a path, encoded image bytes, or a decoded array
+ImageInput = Union[str, bytes, bytearray, memoryview, np.ndarray]
+
+@dataclass
+class PageResult:
+    page: int
+    source: str
+    result: Optional[RecognitionResult] = None
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+# Per-process recognizer used by bulk recognition workers
+_worker_recognizer = None
+
+def _init_worker() -> None:
+    # One Tesseract thread per process; the pool provides the parallelism
+    os.environ['OMP_THREAD_LIMIT'] = '1'
+
+def _recognize_page_worker(
+    page: int,
+    source: str,
+    image: ImageInput,
+    subject: Optional[str],
+    image_path: Optional[str] = None
+) -> PageResult:
+    """Recognize one page inside a pool worker, reporting failures instead of raising"""
+    global _worker_recognizer
+    try:
+        if _worker_recognizer is None:
+            _worker_recognizer = HandwritingRecognizer()
+        decoded = _worker_recognizer._load_image(image)
+        result = _worker_recognizer._recognize_image(decoded, image_path, subject)
+        return PageResult(page=page, source=source, result=result)
+
+    except Exception as e:
+        return PageResult(page=page, source=source, error=str(e))
 
 class HandwritingRecognizer:
     def __init__(self):
@@ -22,45 +70,83 @@ class HandwritingRecognizer:
         # Configure Tesseract parameters
         self.custom_config = r'--oem 3 --psm 6'
         
-        # Initialize preprocessing parameters
-        self.preprocessing_params = {
+        # Default preprocessing parameters; read-only because the recognizer is shared
+        # across concurrent requests (per-image parameters are derived from these)
+        self.preprocessing_params = MappingProxyType({
             'blur_kernel': (5, 5),
             'threshold_block_size': 11,
             'threshold_c': 2,
             'noise_kernel': (1, 1),
             'dilation_kernel': (2, 2)
-        }
-
-    def recognize_handwriting(self, image_path: str, subject: str = None) -> RecognitionResult:
-        """Recognize handwritten text from an image"""
+        })
+
+        # Tune parameters per image from brightness statistics, cached by statistics bucket
+        self.adaptive_params = os.getenv('HANDWRITING_ADAPTIVE_PARAMS', 'true').lower() == 'true'
+        self._params_cache = LRUCache(max_entries=256)
+
+        # Downscales to a target DPI, reuses scratch buffers and tiles very large images
+        self.preprocessing_engine = PreprocessingEngine.from_env()
+
+        # Bounded process pool for bulk / multi-page recognition, created on first use
+        self.max_workers = int(os.getenv('HANDWRITING_MAX_WORKERS', '0')) or os.cpu_count() or 1
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+        # Debug image persistence: "off" (default), "on", or a sample rate between 0 and 1
+        debug_images = os.getenv('HANDWRITING_DEBUG_IMAGES', 'off').lower()
+        if debug_images in ('on', 'true', 'always'):
+            self.debug_sample_rate = 1.0
+        elif debug_images in ('off', 'false', 'never', ''):
+            self.debug_sample_rate = 0.0
+        else:
+            self.debug_sample_rate = min(max(float(debug_images), 0.0), 1.0)
+        self.debug_dir = os.getenv('HANDWRITING_DEBUG_DIR') or None
+        self._debug_writer: Optional[ThreadPoolExecutor] = None
+
+    def recognize_handwriting(self, image: ImageInput, subject: str = None) -> RecognitionResult:
+        """Recognize handwritten text from an image path, encoded bytes or a decoded array"""
         try:
-            # Read and preprocess image
-            image = cv2.imread(image_path)
-            if image is None:
-                raise ValueError(f"Could not read image at {image_path}")
+            # Decode in memory; only paths touch the disk
+            decoded = self._load_image(image)
+            return self._recognize_image(decoded, image if isinstance(image, str) else None, subject)
+
+        except Exception as e:
+            print(f"Error in recognize_handwriting: {str(e)}")
+            raise
 
+    def _load_image(self, image: ImageInput) -> np.ndarray:
+        """Decode an image path, encoded bytes / buffer, or pass through an array"""
+        if isinstance(image, np.ndarray):
+            decoded = image
+        elif isinstance(image, (bytes, bytearray, memoryview)):
+            decoded = cv2.imdecode(np.frombuffer(image, dtype=np.uint8), cv2.IMREAD_COLOR)
+            if decoded is None:
+                raise ValueError("Could not decode image bytes")
+        else:
+            decoded = cv2.imread(image)
+            if decoded is None:
+                raise ValueError(f"Could not read image at {image}")
+        return decoded
+
+    def _recognize_image(self, image: np.ndarray, image_path: Optional[str], subject: str = None) -> RecognitionResult:
+        """Recognize handwritten text from an already-decoded image"""
+        try:
             # Preprocess image
             preprocessed_image, debug_info = self._preprocess_image(image)
             
-            # Save preprocessed image for debugging
-            debug_image_path = self._save_debug_image(preprocessed_image, image_path)
+            # Save preprocessed image for debugging (opt-in, sampled, off the hot path)
+            debug_image_path = None
+            if self.debug_sample_rate > 0 and random.random() < self.debug_sample_rate:
+                debug_image_path = self._save_debug_image(preprocessed_image, image_path)
 
-            # Perform OCR
-            text = pytesseract.image_to_string(
-                Image.fromarray(preprocessed_image),
-                config=self.custom_config
-            )
+            # Perform OCR (single Tesseract pass for text, layout and confidences)
+            text, words, avg_confidence = self._run_ocr(preprocessed_image)
 
-            # Get confidence scores
-            confidence_data = pytesseract.image_to_data(
-                Image.fromarray(preprocessed_image),
-                config=self.custom_config,
-                output_type=pytesseract.Output.DICT
-            )
-
-            # Calculate average confidence
-            confidences = [float(conf) for conf in confidence_data['conf'] if conf != '-1']
-            avg_confidence = sum(confidences) / len(confidences) if confidences else 0
+            # Report word boxes in the coordinates of the original image
+            scale = debug_info.get('scale', 1.0)
+            if scale != 1.0:
+                for word in words:
+                    for key in ('left', 'top', 'width', 'height'):
+                        word[key] = int(round(word[key] / scale))
 
             # Apply subject-specific post-processing if needed
             if subject:
@@ -68,61 +154,232 @@ class HandwritingRecognizer:
 
             return RecognitionResult(
                 text=text,
-                confidence=avg_confidence / 100,  # Normalize to 0-1
+                confidence=avg_confidence,
                 preprocessed_image_path=debug_image_path,
-                debug_info=debug_info
+                debug_info=debug_info,
+                words=words
             )
 
         except Exception as e:
-            print(f"Error in recognize_handwriting: {str(e)}")
+            print(f"Error in _recognize_image: {str(e)}")
             raise
 
-    def _preprocess_image(self, image: np.ndarray) -> Tuple[np.ndarray, Dict[str, Any]]:
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # Spawn rather than fork: the parent may hold torch / batcher threads
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker
+            )
+        return self._pool
+
+    def close(self) -> None:
+        """Shut down the bulk recognition process pool and flush pending debug images"""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+        if self._debug_writer is not None:
+            self._debug_writer.shutdown()
+            self._debug_writer = None
+
+    def _render_pdf_page(self, source: str, number: int) -> np.ndarray:
+        """Render a single PDF page, so large documents are never held in memory at once"""
+        from pdf2image import convert_from_path
+        page, = convert_from_path(
+            source,
+            dpi=int(os.getenv('HANDWRITING_PDF_DPI', '300')),
+            first_page=number,
+            last_page=number
+        )
+        return cv2.cvtColor(np.asarray(page.convert('RGB')), cv2.COLOR_RGB2BGR)
+
+    def _expand_pages(self, sources: Iterable[ImageInput]) -> Iterator[Tuple[str, Any, Optional[str]]]:
+        """Yield (page label, image / exception, path for debug output) for each page of each source"""
+        for index, source in enumerate(sources):
+            if not isinstance(source, str):
+                # In-memory uploads are single pages
+                yield f'upload_{index}', source, None
+                continue
+
+            stem, extension = os.path.splitext(source)
+            extension = extension.lower()
+
+            try:
+                if extension == '.pdf':
+                    from pdf2image import pdfinfo_from_path
+                    count = int(pdfinfo_from_path(source)['Pages'])
+                    # Pages are rendered one at a time as recognize_pages asks for them
+                    pages = (
+                        (number, lambda number=number: self._render_pdf_page(source, number))
+                        for number in range(1, count + 1)
+                    )
+                elif extension in ('.tif', '.tiff'):
+                    success, images = cv2.imreadmulti(source, flags=cv2.IMREAD_COLOR)
+                    if not success:
+                        raise ValueError(f"Could not read image at {source}")
+                    count = len(images)
+                    pages = ((number, lambda image=image: image) for number, image in enumerate(images, start=1))
+                else:
+                    pages = None
+            except Exception as e:
+                # An unreadable document is reported as a single failed page
+                yield source, e, None
+                continue
+
+            if pages is None:
+                yield source, source, source
+                continue
+
+            for number, render in pages:
+                page_path = source if count == 1 else f"{stem}_page{number}.png"
+                try:
+                    image = render()
+                except Exception as e:
+                    # A page that fails to render fails alone
+                    yield page_path, e, None
+                    continue
+                yield page_path, image, page_path
+
+    def recognize_pages(
+        self,
+        sources: Iterable[ImageInput],
+        subject: str = None,
+        ordered: bool = False
+    ) -> Iterator[PageResult]:
+        """Recognize many images / multi-page documents across the process pool
+
+        Yields a PageResult per page as soon as it finishes (or, with
+        ordered=True, as soon as every earlier page has finished). A failing
+        page is reported through PageResult.error and does not stop the batch.
+        """
+        pool = self._get_pool()
+        # Bound in-flight pages so large PDFs are not rendered all at once
+        max_in_flight = self.max_workers * 2
+
+        pending = {}
+        finished: Dict[int, PageResult] = {}
+        next_to_yield = 0
+        pages = enumerate(self._expand_pages(sources))
+        exhausted = False
+
+        while pending or not exhausted:
+            while not exhausted and len(pending) < max_in_flight:
+                try:
+                    page, (label, image, image_path) = next(pages)
+                except StopIteration:
+                    exhausted = True
+                    break
+                if isinstance(image, Exception):
+                    finished[page] = PageResult(page=page, source=label, error=str(image))
+                    continue
+                future = pool.submit(_recognize_page_worker, page, label, image, subject, image_path)
+                pending[future] = (page, label)
+
+            if pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    page, label = pending.pop(future)
+                    try:
+                        finished[page] = future.result()
+                    except Exception as e:
+                        # The worker process itself died
+                        finished[page] = PageResult(page=page, source=label, error=str(e))
+
+            if ordered:
+                while next_to_yield in finished:
+                    yield finished.pop(next_to_yield)
+                    next_to_yield += 1
+            else:
+                for page in sorted(finished):
+                    yield finished.pop(page)
+
+        for page in sorted(finished):
+            yield finished.pop(page)
+
+    def recognize_batch(self, sources: Iterable[ImageInput], subject: str = None) -> List[PageResult]:
+        """Recognize many images / multi-page documents and return results in page order"""
+        return list(self.recognize_pages(sources, subject, ordered=True))
+
+    def _run_ocr(self, image: np.ndarray) -> Tuple[str, List[Dict[str, Any]], float]:
+        """Run Tesseract once and build text, per-word boxes and average confidence"""
+        data = pytesseract.image_to_data(
+            Image.fromarray(image),
+            config=self.custom_config,
+            output_type=pytesseract.Output.DICT
+        )
+
+        words = []
+        lines: List[str] = []
+        current_line: List[str] = []
+        current_key = None
+        for i, word in enumerate(data['text']):
+            word = str(word).strip()
+            if not word:
+                continue
+
+            block, paragraph, line = data['block_num'][i], data['par_num'][i], data['line_num'][i]
+            if current_key is not None and (block, paragraph, line) != current_key:
+                lines.append(' '.join(current_line))
+                current_line = []
+                # Blank line between paragraphs, matching image_to_string layout
+                if (block, paragraph) != current_key[:2]:
+                    lines.append('')
+            current_key = (block, paragraph, line)
+            current_line.append(word)
+
+            confidence = float(data['conf'][i])
+            words.append({
+                'text': word,
+                'confidence': confidence / 100 if confidence >= 0 else None,  # Normalize to 0-1
+                'left': int(data['left'][i]),
+                'top': int(data['top'][i]),
+                'width': int(data['width'][i]),
+                'height': int(data['height'][i]),
+                'block': block,
+                'paragraph': paragraph,
+                'line': line
+            })
+
+        if current_line:
+            lines.append(' '.join(current_line))
+
+        # Calculate average confidence over words Tesseract scored
+        confidences = [w['confidence'] for w in words if w['confidence'] is not None]
+        avg_confidence = sum(confidences) / len(confidences) if confidences else 0
+
+        return '\n'.join(lines), words, avg_confidence
+
+    def _preprocess_image(
+        self,
+        image: np.ndarray,
+        params: Optional[Dict[str, Any]] = None
+    ) -> Tuple[np.ndarray, Dict[str, Any]]:
         """Apply various preprocessing techniques to improve OCR accuracy"""
         debug_info = {}
         
         try:
-            # Convert to grayscale
-            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-            debug_info['grayscale_mean'] = gray.mean()
-
-            # Apply Gaussian blur to reduce noise
-            blurred = cv2.GaussianBlur(
-                gray,
-                self.preprocessing_params['blur_kernel'],
-                0
-            )
+            # Convert to grayscale and normalize resolution
+            gray = self.preprocessing_engine.to_grayscale(image)
+            debug_info['scale'] = gray.shape[0] / image.shape[0]
+
+            # Per-request parameters; never mutate the shared defaults
+            if params is None:
+                if self.adaptive_params:
+                    params, stats = self._compute_preprocessing_params(gray)
+                    debug_info.update(stats)
+                else:
+                    params = self.preprocessing_params
+            debug_info.setdefault('grayscale_mean', float(cv2.mean(gray)[0]))
+            debug_info['preprocessing_params'] = dict(params)
+
+            # Blur, adaptive threshold, noise removal, dilation and inversion
+            final, engine_info = self.preprocessing_engine.process(gray, params)
+            debug_info.update(engine_info)
             debug_info['blur_applied'] = True
-
-            # Apply adaptive thresholding
-            threshold = cv2.adaptiveThreshold(
-                blurred,
-                255,
-                cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
-                cv2.THRESH_BINARY_INV,
-                self.preprocessing_params['threshold_block_size'],
-                self.preprocessing_params['threshold_c']
-            )
             debug_info['threshold_applied'] = True
-
-            # Remove noise
-            kernel = np.ones(
-                self.preprocessing_params['noise_kernel'],
-                np.uint8
-            )
-            opening = cv2.morphologyEx(threshold, cv2.MORPH_OPEN, kernel)
             debug_info['noise_removed'] = True
-
-            # Dilate to connect text components
-            kernel = np.ones(
-                self.preprocessing_params['dilation_kernel'],
-                np.uint8
-            )
-            dilated = cv2.dilate(opening, kernel, iterations=1)
             debug_info['dilation_applied'] = True
-
-            # Invert back to black text on white background
-            final = cv2.bitwise_not(dilated)
             debug_info['preprocessing_complete'] = True
 
             return final, debug_info
@@ -132,25 +389,40 @@ class HandwritingRecognizer:
             debug_info['error'] = str(e)
             raise
 
-    def _save_debug_image(self, image: np.ndarray, original_path: str) -> str:
-        """Save preprocessed image for debugging"""
+    def _save_debug_image(self, image: np.ndarray, original_path: Optional[str]) -> str:
+        """Queue the preprocessed image to be written in the background and return its path"""
         try:
-            # Create debug directory if it doesn't exist
-            debug_dir = os.path.join(os.path.dirname(original_path), 'debug')
-            os.makedirs(debug_dir, exist_ok=True)
+            # Debug images go next to the original file unless a debug directory is configured
+            if self.debug_dir:
+                debug_dir = self.debug_dir
+            elif original_path:
+                debug_dir = os.path.join(os.path.dirname(original_path), 'debug')
+            else:
+                debug_dir = 'debug'
 
             # Generate debug image path
-            filename = os.path.basename(original_path)
+            if original_path:
+                filename = os.path.basename(original_path)
+            else:
+                filename = hashlib.sha1(image.tobytes()).hexdigest()[:16] + '.png'
             debug_path = os.path.join(debug_dir, f'preprocessed_{filename}')
 
-            # Save image
-            cv2.imwrite(debug_path, image)
+            if self._debug_writer is None:
+                self._debug_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='debug-image')
+            self._debug_writer.submit(self._write_debug_image, image, debug_path)
             return debug_path
 
         except Exception as e:
             print(f"Error in _save_debug_image: {str(e)}")
             raise
 
+    def _write_debug_image(self, image: np.ndarray, debug_path: str) -> None:
+        try:
+            os.makedirs(os.path.dirname(debug_path) or '.', exist_ok=True)
+            cv2.imwrite(debug_path, image)
+        except Exception as e:
+            print(f"Error in _write_debug_image: {str(e)}")
+
     def _post_process_text(self, text: str, subject: str) -> str:
         """Apply subject-specific post-processing to the recognized text"""
         try:
@@ -182,38 +454,52 @@ class HandwritingRecognizer:
             print(f"Error in _post_process_text: {str(e)}")
             return text  # Return original text if post-processing fails
 
-    def adjust_preprocessing_params(self, image_path: str) -> None:
-        """Dynamically adjust preprocessing parameters based on image characteristics"""
-        try:
-            image = cv2.imread(image_path)
-            if image is None:
-                return
-
-            # Convert to grayscale
-            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    def _compute_preprocessing_params(self, gray: np.ndarray) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """Derive preprocessing parameters for one image from its brightness statistics"""
+        # Mean and standard deviation in a single pass
+        mean, std = cv2.meanStdDev(gray)
+        mean_brightness, std_brightness = float(mean[0][0]), float(std[0][0])
+
+        # Images with similar statistics share one tuned parameter set
+        bucket = (int(mean_brightness // 16), int(std_brightness // 10))
+        stats = {
+            'grayscale_mean': mean_brightness,
+            'grayscale_std': std_brightness,
+            'params_bucket': bucket
+        }
 
-            # Calculate image statistics
-            mean_brightness = gray.mean()
-            std_brightness = gray.std()
+        params = self._params_cache.get(bucket)
+        if params is None:
+            params = dict(self.preprocessing_params)
 
-            # Adjust parameters based on image characteristics
-            if mean_brightness < 127:  # Dark image
-                self.preprocessing_params.update({
+            # Adjust parameters based on the bucket's representative statistics
+            bucket_mean = (bucket[0] + 0.5) * 16
+            bucket_std = (bucket[1] + 0.5) * 10
+            if bucket_mean < 127:  # Dark image
+                params.update({
                     'threshold_block_size': 15,
                     'threshold_c': 3
                 })
-            elif std_brightness < 50:  # Low contrast
-                self.preprocessing_params.update({
+            elif bucket_std < 50:  # Low contrast
+                params.update({
                     'blur_kernel': (3, 3),
                     'threshold_block_size': 13
                 })
-            else:  # Normal image
-                self.preprocessing_params.update({
-                    'blur_kernel': (5, 5),
-                    'threshold_block_size': 11,
-                    'threshold_c': 2
-                })
+
+            params = MappingProxyType(params)
+            self._params_cache.set(bucket, params)
+
+        return params, stats
+
+    def adjust_preprocessing_params(self, image: ImageInput) -> Dict[str, Any]:
+        """Compute preprocessing parameters suited to an image without changing shared state"""
+        try:
+            decoded = self._load_image(image)
+            gray = decoded if decoded.ndim == 2 else cv2.cvtColor(decoded, cv2.COLOR_BGR2GRAY)
+            params, _ = self._compute_preprocessing_params(gray)
+            return dict(params)
 
         except Exception as e:
             print(f"Error in adjust_preprocessing_params: {str(e)}")
-            # Keep default parameters if adjustment fails
\ No newline at end of file
+            # Keep default parameters if adjustment fails
+            return dict(self.preprocessing_params)
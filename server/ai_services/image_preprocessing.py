@@ -0,0 +1,145 @@
+import os
+import threading
+import cv2
+import numpy as np
+from typing import Any, Dict, Mapping, Optional, Tuple
+
+class PreprocessingEngine:
+    """Resolution-normalized, buffer-reusing, tiled OCR preprocessing
+
+    Large uploads (e.g. 12 MP phone photos) are first downscaled so the page
+    lands near target_dpi, then blur / adaptive threshold / open / dilate run
+    into per-thread scratch buffers via OpenCV dst= outputs. Images above
+    max_untiled_pixels are processed in tiles with a halo wide enough that the
+    output matches untiled processing, keeping scratch memory proportional to
+    the tile size rather than the image size.
+    """
+
+    def __init__(
+        self,
+        target_dpi: int = 200,
+        page_long_side_inches: float = 11.69,  # A4 portrait height
+        tile_size: int = 1024,
+        max_untiled_pixels: int = 4_000_000
+    ):
+        self.target_dpi = target_dpi
+        self.page_long_side_inches = page_long_side_inches
+        self.tile_size = tile_size
+        self.max_untiled_pixels = max_untiled_pixels
+        self._local = threading.local()
+
+    @classmethod
+    def from_env(cls) -> 'PreprocessingEngine':
+        return cls(
+            target_dpi=int(os.getenv('HANDWRITING_TARGET_DPI', '200')),
+            tile_size=int(os.getenv('HANDWRITING_TILE_SIZE', '1024')),
+            max_untiled_pixels=int(os.getenv('HANDWRITING_MAX_UNTILED_PIXELS', '4000000'))
+        )
+
+    def _buffer(self, name: str, shape: Tuple[int, ...]) -> np.ndarray:
+        """Per-thread scratch buffer, reallocated only when a larger shape is needed"""
+        buffers = getattr(self._local, 'buffers', None)
+        if buffers is None:
+            buffers = self._local.buffers = {}
+        buffer = buffers.get(name)
+        if buffer is None or buffer.shape[0] < shape[0] or buffer.shape[1] < shape[1]:
+            buffer = np.empty(shape, dtype=np.uint8)
+            buffers[name] = buffer
+        # A view of the top-left corner keeps the buffer reusable for smaller inputs
+        return buffer[:shape[0], :shape[1]]
+
+    def to_grayscale(self, image: np.ndarray) -> np.ndarray:
+        """Convert to grayscale and downscale to the target DPI in one output allocation"""
+        if image.ndim == 2:
+            gray = image
+        else:
+            code = cv2.COLOR_BGRA2GRAY if image.shape[2] == 4 else cv2.COLOR_BGR2GRAY
+            gray = cv2.cvtColor(image, code, dst=self._buffer('gray', image.shape[:2]))
+
+        scale = self.scale_for(gray.shape)
+        if scale >= 1.0:
+            # Callers keep the result, so never hand out a scratch buffer
+            return gray.copy() if gray is not image else gray
+
+        size = (max(1, int(round(gray.shape[1] * scale))), max(1, int(round(gray.shape[0] * scale))))
+        return cv2.resize(gray, size, interpolation=cv2.INTER_AREA)
+
+    def scale_for(self, shape: Tuple[int, ...]) -> float:
+        """Downscale factor that brings the page's long side to target_dpi (never upscales)"""
+        target_long_side = self.target_dpi * self.page_long_side_inches
+        return min(1.0, target_long_side / max(shape[0], shape[1]))
+
+    def _halo(self, params: Mapping[str, Any]) -> int:
+        # Sum of the radii of every neighbourhood operation in the chain
+        return (
+            max(params['blur_kernel']) // 2
+            + params['threshold_block_size'] // 2
+            + max(params['noise_kernel'])
+            + max(params['dilation_kernel'])
+            + 1
+        )
+
+    def _process_region(
+        self,
+        src: np.ndarray,
+        params: Mapping[str, Any],
+        out: Optional[np.ndarray] = None
+    ) -> np.ndarray:
+        """Run the threshold chain on src, ping-ponging between two scratch buffers"""
+        shape = src.shape[:2]
+        first = self._buffer('first', shape)
+        second = self._buffer('second', shape)
+
+        # Apply Gaussian blur to reduce noise
+        blurred = cv2.GaussianBlur(src, tuple(params['blur_kernel']), 0, dst=first)
+
+        # Apply adaptive thresholding
+        threshold = cv2.adaptiveThreshold(
+            blurred,
+            255,
+            cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+            cv2.THRESH_BINARY_INV,
+            params['threshold_block_size'],
+            params['threshold_c'],
+            dst=second
+        )
+
+        # Remove noise
+        kernel = np.ones(params['noise_kernel'], np.uint8)
+        opening = cv2.morphologyEx(threshold, cv2.MORPH_OPEN, kernel, dst=first)
+
+        # Dilate to connect text components
+        kernel = np.ones(params['dilation_kernel'], np.uint8)
+        dilated = cv2.dilate(opening, kernel, dst=second, iterations=1)
+
+        # Invert back to black text on white background
+        return cv2.bitwise_not(dilated, dst=dilated if out is None else out)
+
+    def process(self, gray: np.ndarray, params: Mapping[str, Any]) -> Tuple[np.ndarray, Dict[str, Any]]:
+        """Binarize a grayscale image, tiling it when it is too large to process at once"""
+        height, width = gray.shape[:2]
+        output = np.empty((height, width), dtype=np.uint8)
+
+        if height * width <= self.max_untiled_pixels:
+            output = self._process_region(gray, params, out=output)
+            return output, {'tiles': 1}
+
+        halo = self._halo(params)
+        tiles = 0
+        for top in range(0, height, self.tile_size):
+            for left in range(0, width, self.tile_size):
+                bottom = min(top + self.tile_size, height)
+                right = min(left + self.tile_size, width)
+
+                # Process the tile plus a halo so edge pixels see their full neighbourhood
+                region_top, region_left = max(0, top - halo), max(0, left - halo)
+                region = gray[region_top:min(height, bottom + halo), region_left:min(width, right + halo)]
+                processed = self._process_region(region, params)
+
+                output[top:bottom, left:right] = processed[
+                    top - region_top:bottom - region_top,
+                    left - region_left:right - region_left
+                ]
+                tiles += 1
+
+        return output, {'tiles': tiles}
@@ -0,0 +1,185 @@
+"""Selectable CPU inference backends for the MarianMT and CodeBERT models
+
+Backends:
+    torch  - eager fp32 PyTorch (baseline)
+    int8   - dynamic int8 quantization of the Linear layers (torch.quantization)
+    onnx   - ONNX Runtime through optimum's exported models
+
+Pick one per model with MARIAN_BACKEND / CODEBERT_BACKEND. Run the parity
+check against the fp32 baseline before rolling a backend out:
+
+    python -m ai_services.inference_backends --model marian --backend int8
+    python -m ai_services.inference_backends --model codebert --backend onnx
+"""
+import os
+import sys
+import argparse
+import torch
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from transformers import MarianMTModel, MarianTokenizer, RobertaTokenizer, RobertaForSequenceClassification
+
+BACKENDS = ('torch', 'int8', 'onnx')
+
+CODEBERT_MODEL = 'microsoft/codebert-base'
+
+# Minimum agreement with the fp32 baseline for a backend to pass
+MARIAN_MIN_CHRF = 90.0
+CODEBERT_MIN_COSINE = 0.99
+
+PARITY_SENTENCES = [
+    "Your answer shows a clear understanding of the main concept.",
+    "Add more specific examples to support your argument.",
+    "The introduction is strong, but the conclusion needs more detail.",
+    "Check your calculations in the second step."
+]
+
+PARITY_CODE = [
+    "def add(a, b):\n    return a + b\n",
+    "for i in range(10):\n    if i % 2 == 0:\n        print(i)\n",
+    "function greet(name) {\n  return `Hello, ${name}`;\n}\n"
+]
+
+def _check_backend(backend: str) -> str:
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown inference backend: {backend} (expected one of {', '.join(BACKENDS)})")
+    return backend
+
+def _quantize(model: torch.nn.Module) -> torch.nn.Module:
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+def load_marian(model_name: str, backend: str = 'torch') -> Tuple[Any, MarianTokenizer]:
+    """Load a MarianMT model (anything with .generate) and its tokenizer for the given backend"""
+    backend = _check_backend(backend)
+    tokenizer = MarianTokenizer.from_pretrained(model_name)
+
+    if backend == 'onnx':
+        from optimum.onnxruntime import ORTModelForSeq2SeqLM
+        return ORTModelForSeq2SeqLM.from_pretrained(model_name, export=True), tokenizer
+
+    model = MarianMTModel.from_pretrained(model_name)
+    model.eval()
+    if backend == 'int8':
+        model = _quantize(model)
+    return model, tokenizer
+
+class TorchEncoder:
+    """Returns CodeBERT's last hidden state from an eager (fp32 or int8) PyTorch model"""
+
+    def __init__(self, model: torch.nn.Module):
+        self.model = model
+
+    def __call__(self, input_ids: torch.Tensor, attention_mask: torch.Tensor) -> torch.Tensor:
+        with torch.no_grad():
+            outputs = self.model(
+                input_ids=input_ids,
+                attention_mask=attention_mask,
+                output_hidden_states=True
+            )
+        return outputs.hidden_states[-1]
+
+class OnnxEncoder:
+    """Returns CodeBERT's last hidden state from an ONNX Runtime feature-extraction export"""
+
+    def __init__(self, model: Any):
+        self.model = model
+
+    def __call__(self, input_ids: torch.Tensor, attention_mask: torch.Tensor) -> torch.Tensor:
+        outputs = self.model(input_ids=input_ids, attention_mask=attention_mask)
+        return torch.as_tensor(outputs.last_hidden_state)
+
+def load_codebert_encoder(backend: str = 'torch', model_name: str = CODEBERT_MODEL) -> Any:
+    """Load a CodeBERT encoder callable (input_ids, attention_mask) -> last hidden state"""
+    backend = _check_backend(backend)
+
+    if backend == 'onnx':
+        from optimum.onnxruntime import ORTModelForFeatureExtraction
+        return OnnxEncoder(ORTModelForFeatureExtraction.from_pretrained(model_name, export=True))
+
+    model = RobertaForSequenceClassification.from_pretrained(model_name)
+    model.eval()
+    if backend == 'int8':
+        model = _quantize(model)
+    return TorchEncoder(model)
+
+def pooled_embeddings(encoder: Any, tokenizer: RobertaTokenizer, codes: Sequence[str]) -> torch.Tensor:
+    """Mean-pool the encoder's last hidden state over non-padding tokens"""
+    inputs = tokenizer(list(codes), return_tensors='pt', padding=True, truncation=True, max_length=512)
+    hidden = encoder(inputs['input_ids'], inputs['attention_mask'])
+    mask = inputs['attention_mask'].unsqueeze(-1).to(hidden.dtype)
+    return (hidden * mask).sum(dim=1) / mask.sum(dim=1)
+
+def check_marian_parity(
+    model_name: str,
+    backend: str,
+    sentences: Optional[List[str]] = None,
+    baseline: Optional[Tuple[Any, MarianTokenizer]] = None,
+    candidate: Optional[Tuple[Any, MarianTokenizer]] = None
+) -> Dict[str, Any]:
+    """Compare a backend's translations against the fp32 baseline using chrF"""
+    import sacrebleu
+
+    sentences = sentences or PARITY_SENTENCES
+    base_model, tokenizer = baseline or load_marian(model_name, 'torch')
+    model, _ = candidate or load_marian(model_name, backend)
+
+    def translate(m: Any) -> List[str]:
+        inputs = tokenizer(sentences, return_tensors='pt', padding=True, truncation=True)
+        with torch.no_grad():
+            output = m.generate(**inputs)
+        return tokenizer.batch_decode(output, skip_special_tokens=True)
+
+    expected = translate(base_model)
+    actual = translate(model)
+    chrf = sacrebleu.corpus_chrf(actual, [expected]).score
+    return {
+        'model': model_name,
+        'backend': backend,
+        'chrf': round(chrf, 2),
+        'exact_matches': sum(a == e for a, e in zip(actual, expected)),
+        'samples': len(sentences),
+        'passed': chrf >= MARIAN_MIN_CHRF
+    }
+
+def check_codebert_parity(
+    backend: str,
+    codes: Optional[List[str]] = None,
+    candidate: Optional[Any] = None
+) -> Dict[str, Any]:
+    """Compare a backend's pooled CodeBERT embeddings against the fp32 baseline"""
+    codes = codes or PARITY_CODE
+    tokenizer = RobertaTokenizer.from_pretrained(CODEBERT_MODEL)
+    expected = pooled_embeddings(load_codebert_encoder('torch'), tokenizer, codes)
+    actual = pooled_embeddings(candidate or load_codebert_encoder(backend), tokenizer, codes)
+
+    cosine = torch.nn.functional.cosine_similarity(actual.float(), expected.float(), dim=1)
+    feature_drift = (torch.sigmoid(actual[:, :3]) - torch.sigmoid(expected[:, :3])).abs().max().item()
+    return {
+        'model': CODEBERT_MODEL,
+        'backend': backend,
+        'min_cosine': round(cosine.min().item(), 4),
+        'max_feature_drift': round(feature_drift, 4),
+        'samples': len(codes),
+        'passed': cosine.min().item() >= CODEBERT_MIN_COSINE
+    }
+
+def parity_check_enabled() -> bool:
+    return os.getenv('INFERENCE_PARITY_CHECK', 'false').lower() == 'true'
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Compare an inference backend against the fp32 baseline')
+    parser.add_argument('--model', choices=['marian', 'codebert'], required=True)
+    parser.add_argument('--backend', choices=BACKENDS, required=True)
+    parser.add_argument('--language', default='hi', help='Target language for MarianMT (en-<language>)')
+    args = parser.parse_args(argv)
+
+    if args.model == 'marian':
+        report = check_marian_parity(f'Helsinki-NLP/opus-mt-en-{args.language}', args.backend)
+    else:
+        report = check_codebert_parity(args.backend)
+
+    for key, value in report.items():
+        print(f"{key}: {value}")
+    return 0 if report['passed'] else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,379 @@
+import os
+import json
+import socket
+import time
+import uuid
+import pickle
+import sqlite3
+import itertools
+import threading
+import dataclasses
+from queue import PriorityQueue
+from typing import Any, Callable, Dict, List, Optional
+
+# Lower runs first: students waiting on a result go ahead of teacher bulk grading
+PRIORITIES = {
+    'interactive': 0,
+    'bulk': 10
+}
+
+QUEUED, RUNNING, SUCCEEDED, FAILED = 'queued', 'running', 'succeeded', 'failed'
+FINISHED_STATES = (SUCCEEDED, FAILED)
+
+class QueueFullError(Exception):
+    pass
+
+@dataclasses.dataclass
+class Job:
+    id: str
+    kind: str
+    params: Dict[str, Any]
+    priority: int
+    status: str = QUEUED
+    created_at: float = 0.0
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    result: Any = None
+    error: Optional[str] = None
+    # Process that queued or is running the job, and when it last renewed its lease
+    owner: Optional[str] = None
+    heartbeat_at: Optional[float] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Public view of the job; params can hold raw uploads and are left out"""
+        return {
+            'job_id': self.id,
+            'kind': self.kind,
+            'priority': self.priority,
+            'status': self.status,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'result': self.result,
+            'error': self.error
+        }
+
+def _jsonable(value: Any) -> Any:
+    """Convert dataclass results to plain JSON-compatible structures"""
+    if dataclasses.is_dataclass(value):
+        value = dataclasses.asdict(value)
+    return json.loads(json.dumps(value, default=str))
+
+class MemoryJobStore:
+    """In-process job store; jobs are lost on restart"""
+
+    def __init__(self, result_ttl: Optional[float] = 86400):
+        self.result_ttl = result_ttl
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+
+    def add(self, job: Job) -> None:
+        with self._lock:
+            self._jobs[job.id] = job
+            self._expire()
+
+    def update(self, job_id: str, **fields) -> None:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                for name, value in fields.items():
+                    setattr(job, name, value)
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dataclasses.replace(job) if job is not None else None
+
+    def claim(self, job_id: str, owner: str) -> Optional[Job]:
+        """Mark a queued job owned by owner as running; None if it is not there to claim"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.status != QUEUED or job.owner != owner:
+                return None
+            job.status = RUNNING
+            job.started_at = job.heartbeat_at = time.time()
+            return dataclasses.replace(job)
+
+    def renew(self, owner: str) -> None:
+        pass
+
+    def recover(self, owner: str, lease_seconds: float) -> List[Job]:
+        # Jobs live and die with this process; there is nothing to recover
+        return []
+
+    def _expire(self) -> None:
+        if not self.result_ttl:
+            return
+        cutoff = time.time() - self.result_ttl
+        for job_id in [j.id for j in self._jobs.values() if j.finished_at and j.finished_at < cutoff]:
+            del self._jobs[job_id]
+
+class SQLiteJobStore:
+    """Job store in a SQLite file, shareable by several processes
+
+    Unfinished jobs are picked up again by another process (or after a
+    restart) once their owner stops renewing its lease.
+    """
+
+    def __init__(self, path: str, result_ttl: Optional[float] = 86400):
+        self.path = path
+        self.result_ttl = result_ttl
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS jobs ('
+            'id TEXT PRIMARY KEY, kind TEXT NOT NULL, params BLOB NOT NULL, '
+            'priority INTEGER NOT NULL, status TEXT NOT NULL, created_at REAL NOT NULL, '
+            'started_at REAL, finished_at REAL, result TEXT, error TEXT)'
+        )
+        columns = {row[1] for row in self._conn.execute('PRAGMA table_info(jobs)')}
+        for column in ('owner TEXT', 'heartbeat_at REAL'):
+            if column.split()[0] not in columns:
+                self._conn.execute(f'ALTER TABLE jobs ADD COLUMN {column}')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status)')
+        self._conn.commit()
+
+    def add(self, job: Job) -> None:
+        with self._lock:
+            self._conn.execute(
+                'INSERT INTO jobs (id, kind, params, priority, status, created_at, owner, heartbeat_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (job.id, job.kind, pickle.dumps(job.params), job.priority, job.status, job.created_at,
+                 job.owner, job.heartbeat_at)
+            )
+            if self.result_ttl:
+                self._conn.execute(
+                    'DELETE FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ?',
+                    (time.time() - self.result_ttl,)
+                )
+            self._conn.commit()
+
+    def update(self, job_id: str, **fields) -> None:
+        if 'result' in fields:
+            fields['result'] = json.dumps(fields['result'])
+        columns = ', '.join(f'{name} = ?' for name in fields)
+        with self._lock:
+            self._conn.execute(f'UPDATE jobs SET {columns} WHERE id = ?', (*fields.values(), job_id))
+            self._conn.commit()
+
+    _COLUMNS = 'id, kind, params, priority, status, created_at, started_at, finished_at, result, error, owner, heartbeat_at'
+
+    def _row_to_job(self, row: tuple) -> Job:
+        job_id, kind, params, priority, status, created_at, started_at, finished_at, result, error, owner, heartbeat_at = row
+        return Job(
+            id=job_id,
+            kind=kind,
+            params=pickle.loads(params),
+            priority=priority,
+            status=status,
+            created_at=created_at,
+            started_at=started_at,
+            finished_at=finished_at,
+            result=json.loads(result) if result is not None else None,
+            error=error,
+            owner=owner,
+            heartbeat_at=heartbeat_at
+        )
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            row = self._conn.execute(f'SELECT {self._COLUMNS} FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return self._row_to_job(row) if row is not None else None
+
+    def claim(self, job_id: str, owner: str) -> Optional[Job]:
+        """Atomically mark a queued job owned by owner as running; None if another process has it"""
+        now = time.time()
+        with self._lock:
+            claimed = self._conn.execute(
+                'UPDATE jobs SET status = ?, started_at = ?, heartbeat_at = ? '
+                'WHERE id = ? AND status = ? AND owner = ?',
+                (RUNNING, now, now, job_id, QUEUED, owner)
+            ).rowcount
+            self._conn.commit()
+        return self.get(job_id) if claimed == 1 else None
+
+    def renew(self, owner: str) -> None:
+        """Extend the lease on every unfinished job owned by owner"""
+        with self._lock:
+            self._conn.execute(
+                'UPDATE jobs SET heartbeat_at = ? WHERE owner = ? AND status IN (?, ?)',
+                (time.time(), owner, QUEUED, RUNNING)
+            )
+            self._conn.commit()
+
+    def recover(self, owner: str, lease_seconds: float) -> List[Job]:
+        """Take over unfinished jobs whose owner has not renewed its lease, requeued for owner"""
+        now = time.time()
+        with self._lock:
+            # One write transaction, so two processes never take the same job
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                ids = [row[0] for row in self._conn.execute(
+                    'SELECT id FROM jobs WHERE status IN (?, ?) AND (heartbeat_at IS NULL OR heartbeat_at < ?) '
+                    'ORDER BY created_at',
+                    (QUEUED, RUNNING, now - lease_seconds)
+                )]
+                self._conn.executemany(
+                    'UPDATE jobs SET status = ?, owner = ?, started_at = NULL, heartbeat_at = ? WHERE id = ?',
+                    [(QUEUED, owner, now, job_id) for job_id in ids]
+                )
+                self._conn.commit()
+            except BaseException:
+                self._conn.rollback()
+                raise
+        return [job for job in map(self.get, ids) if job is not None]
+
+class JobQueue:
+    """Priority worker pool for long-running evaluations, with results kept for polling
+
+    Handlers are registered by job kind and called with the job's params as
+    keyword arguments. Jobs with a lower priority number run first; within a
+    priority they run in submission order.
+    """
+
+    def __init__(
+        self,
+        store: Any,
+        handlers: Optional[Dict[str, Callable[..., Any]]] = None,
+        workers: int = 2,
+        max_queued: int = 1000,
+        lease_seconds: float = 60.0
+    ):
+        self.store = store
+        # Jobs are claimed by this process's owner id and kept alive by renewing
+        # a lease; jobs whose owner stops renewing are taken over by another process
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.lease_seconds = lease_seconds
+        self.handlers: Dict[str, Callable[..., Any]] = dict(handlers or {})
+        self.max_queued = max_queued
+        self._queue: 'PriorityQueue[tuple]' = PriorityQueue()
+        self._sequence = itertools.count()
+        self._stats_lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+        self._succeeded = 0
+        self._failed = 0
+
+        self._workers = [
+            threading.Thread(target=self._work, name=f'job-worker-{i}', daemon=True)
+            for i in range(workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+        # Jobs left behind by a process that stopped, now and whenever a lease runs out
+        self.recover()
+        self._lease_thread = threading.Thread(target=self._renew_leases, name='job-leases', daemon=True)
+        self._lease_thread.start()
+
+    @classmethod
+    def from_env(cls, handlers: Optional[Dict[str, Callable[..., Any]]] = None) -> 'JobQueue':
+        ttl = float(os.getenv('JOB_RESULT_TTL', '86400'))
+        if os.getenv('JOB_STORE', 'memory') == 'sqlite':
+            store = SQLiteJobStore(os.getenv('JOB_DB_PATH', 'jobs.sqlite3'), ttl or None)
+        else:
+            store = MemoryJobStore(ttl or None)
+        return cls(
+            store,
+            handlers,
+            workers=int(os.getenv('JOB_WORKERS', '2')),
+            max_queued=int(os.getenv('JOB_MAX_QUEUED', '1000')),
+            lease_seconds=float(os.getenv('JOB_LEASE_SECONDS', '60'))
+        )
+
+    def register(self, kind: str, handler: Callable[..., Any]) -> None:
+        self.handlers[kind] = handler
+
+    def recover(self) -> int:
+        """Queue unfinished jobs whose owner's lease has expired; returns how many"""
+        jobs = self.store.recover(self.owner, self.lease_seconds)
+        for job in jobs:
+            self._enqueue(job.priority, job.id)
+        return len(jobs)
+
+    def _renew_leases(self) -> None:
+        while True:
+            time.sleep(self.lease_seconds / 3)
+            try:
+                self.store.renew(self.owner)
+                self.recover()
+            except Exception as e:
+                print(f"Error renewing job leases: {str(e)}")
+
+    def _enqueue(self, priority: int, job_id: str) -> None:
+        with self._stats_lock:
+            self._queued += 1
+        self._queue.put((priority, next(self._sequence), job_id))
+
+    def submit(self, kind: str, params: Dict[str, Any], priority: str = 'interactive') -> str:
+        """Queue a job and return its id"""
+        if kind not in self.handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority: {priority} (expected one of {', '.join(PRIORITIES)})")
+        with self._stats_lock:
+            if self._queued >= self.max_queued:
+                raise QueueFullError(f"Job queue is full ({self.max_queued} jobs waiting)")
+
+        job = Job(
+            id=uuid.uuid4().hex,
+            kind=kind,
+            params=params,
+            priority=PRIORITIES[priority],
+            created_at=time.time(),
+            owner=self.owner,
+            heartbeat_at=time.time()
+        )
+        self.store.add(job)
+        self._enqueue(job.priority, job.id)
+        return job.id
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        job = self.store.get(job_id)
+        return job.to_dict() if job is not None else None
+
+    def _work(self) -> None:
+        while True:
+            _, _, job_id = self._queue.get()
+            with self._stats_lock:
+                self._queued -= 1
+                self._running += 1
+            try:
+                self._run(job_id)
+            finally:
+                with self._stats_lock:
+                    self._running -= 1
+                self._queue.task_done()
+
+    def _run(self, job_id: str) -> None:
+        # Another process may have taken the job over, or already finished it
+        job = self.store.claim(job_id, self.owner)
+        if job is None:
+            return
+
+        try:
+            result = _jsonable(self.handlers[job.kind](**job.params))
+        except Exception as e:
+            print(f"Error in job {job_id} ({job.kind}): {str(e)}")
+            self.store.update(job_id, status=FAILED, error=str(e), finished_at=time.time())
+            with self._stats_lock:
+                self._failed += 1
+            return
+
+        self.store.update(job_id, status=SUCCEEDED, result=result, finished_at=time.time())
+        with self._stats_lock:
+            self._succeeded += 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._stats_lock:
+            return {
+                'workers': len(self._workers),
+                'queued': self._queued,
+                'running': self._running,
+                'succeeded': self._succeeded,
+                'failed': self._failed
+            }
@@ -0,0 +1,71 @@
+import os
+import sys
+import time
+import threading
+from typing import Dict, Any, Callable
+
+def current_rss_bytes() -> int:
+    """Get the resident set size of the current process in bytes"""
+    try:
+        # /proc gives the current RSS on Linux
+        with open('/proc/self/statm') as statm:
+            resident_pages = int(statm.read().split()[1])
+        return resident_pages * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+
+    try:
+        # Fall back to peak RSS where /proc is not available
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is reported in bytes on macOS and kilobytes elsewhere
+        return peak if sys.platform == 'darwin' else peak * 1024
+    except Exception:
+        return 0
+
+def bytes_to_mb(value: int) -> float:
+    return round(value / (1024 * 1024), 1)
+
+class LazyModelLoader:
+    """Load heavy models on first use and record what each one cost"""
+
+    def __init__(self):
+        self._models: Dict[str, Any] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+        self._stats: Dict[str, Dict[str, Any]] = {}
+
+    def _lock_for(self, name: str) -> threading.Lock:
+        with self._locks_guard:
+            if name not in self._locks:
+                self._locks[name] = threading.Lock()
+            return self._locks[name]
+
+    def get(self, name: str, loader: Callable[[], Any]) -> Any:
+        """Return the named model, calling loader exactly once across threads"""
+        model = self._models.get(name)
+        if model is not None:
+            return model
+
+        with self._lock_for(name):
+            if name in self._models:
+                return self._models[name]
+
+            rss_before = current_rss_bytes()
+            start = time.perf_counter()
+            model = loader()
+            load_time = time.perf_counter() - start
+
+            self._stats[name] = {
+                'load_time': round(load_time, 3),
+                'rss_delta_mb': bytes_to_mb(current_rss_bytes() - rss_before)
+            }
+            self._models[name] = model
+            print(f"✓ Loaded {name} in {load_time:.2f}s")
+            return model
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._models
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {name: dict(entry) for name, entry in self._stats.items()}
@@ -0,0 +1,178 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from typing import Any, Dict, Optional
+from .cache_utils import LRUCache
+from .llm_client import get_llm_client, to_response_object
+
+def completion_cache_key(**params) -> str:
+    """Content hash of everything that determines a completion (model, messages, temperature, ...)"""
+    payload = json.dumps(params, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+class SQLiteResponseStore:
+    """On-disk cache tier shared by every worker on the node"""
+
+    def __init__(self, path: str, max_entries: int = 100000, ttl: Optional[float] = None):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS responses ('
+            'key TEXT PRIMARY KEY, value TEXT NOT NULL, '
+            'created_at REAL NOT NULL, last_access REAL NOT NULL)'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)')
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT value, created_at FROM responses WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, created_at = row
+            if self.ttl and created_at + self.ttl < now:
+                self._conn.execute('DELETE FROM responses WHERE key = ?', (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute('UPDATE responses SET last_access = ? WHERE key = ?', (now, key))
+            self._conn.commit()
+            return value
+
+    def set(self, key: str, value: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO responses (key, value, created_at, last_access) VALUES (?, ?, ?, ?)',
+                (key, value, now, now)
+            )
+            # Size-bounded eviction of the least recently used rows
+            self._conn.execute(
+                'DELETE FROM responses WHERE key IN ('
+                'SELECT key FROM responses ORDER BY last_access DESC LIMIT -1 OFFSET ?)',
+                (self.max_entries,)
+            )
+            self._conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+
+class CompletionCache:
+    """Two-tier (memory LRU, optional SQLite) cache for chat completion responses"""
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttl: Optional[float] = 86400,
+        disk_path: Optional[str] = None,
+        disk_max_entries: int = 100000,
+        cache_nondeterministic: bool = False
+    ):
+        self.memory = LRUCache(max_entries=max_entries, ttl=ttl)
+        self.disk = SQLiteResponseStore(disk_path, disk_max_entries, ttl) if disk_path else None
+        self.cache_nondeterministic = cache_nondeterministic
+        self.disk_hits = 0
+
+    @classmethod
+    def from_env(cls) -> 'CompletionCache':
+        ttl = float(os.getenv('LLM_CACHE_TTL', '86400'))
+        return cls(
+            max_entries=int(os.getenv('LLM_CACHE_MAX_ENTRIES', '1024')),
+            ttl=ttl if ttl > 0 else None,
+            disk_path=os.getenv('LLM_CACHE_PATH') or None,
+            disk_max_entries=int(os.getenv('LLM_CACHE_DISK_MAX_ENTRIES', '100000')),
+            cache_nondeterministic=os.getenv('LLM_CACHE_NONDETERMINISTIC', 'false').lower() == 'true'
+        )
+
+    def should_cache(self, params: Dict[str, Any], cache: Optional[bool]) -> bool:
+        if cache is not None:
+            return cache
+        # Only deterministic calls are cached unless configured otherwise
+        return params.get('temperature', 1) == 0 or self.cache_nondeterministic
+
+    def get(self, key: str) -> Optional[Any]:
+        response = self.memory.get(key)
+        if response is not None or self.disk is None:
+            return response
+
+        stored = self.disk.get(key)
+        if stored is None:
+            return None
+        self.disk_hits += 1
+        response = to_response_object(json.loads(stored))
+        self.memory.set(key, response)
+        return response
+
+    def set(self, key: str, response: Any) -> None:
+        self.memory.set(key, response)
+        if self.disk is not None:
+            self.disk.set(key, json.dumps(response, ensure_ascii=False))
+
+    def stats(self) -> Dict[str, Any]:
+        stats = self.memory.stats()
+        # Memory misses that the disk tier served count as hits
+        stats['hits'] = self.memory.hits + self.disk_hits
+        stats['misses'] = self.memory.misses - self.disk_hits
+        stats['disk_hits'] = self.disk_hits
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 3) if lookups else 0.0
+        if self.disk is not None:
+            stats['disk_entries'] = len(self.disk)
+        return stats
+
+_completion_cache: Optional[CompletionCache] = None
+_completion_cache_lock = threading.Lock()
+
+def get_completion_cache() -> CompletionCache:
+    global _completion_cache
+    if _completion_cache is None:
+        with _completion_cache_lock:
+            if _completion_cache is None:
+                _completion_cache = CompletionCache.from_env()
+    return _completion_cache
+
+def chat_completion(cache: Optional[bool] = None, timeout: Optional[float] = None, **params) -> Any:
+    """Cached drop-in for openai.ChatCompletion.create, served by the shared LLM client
+
+    Deterministic (temperature=0) calls are cached by default; pass cache=True
+    or False to override for a single call. timeout is the deadline for the
+    call including retries.
+    """
+    client = get_llm_client()
+    completion_cache = get_completion_cache()
+    if not completion_cache.should_cache(params, cache):
+        return client.chat_completion_sync(timeout=timeout, **params)
+
+    key = completion_cache_key(**params)
+    response = completion_cache.get(key)
+    if response is None:
+        response = client.chat_completion_sync(timeout=timeout, **params)
+        completion_cache.set(key, response)
+    return response
+
+async def achat_completion(cache: Optional[bool] = None, timeout: Optional[float] = None, **params) -> Any:
+    """Async chat_completion for callers already on an event loop"""
+    client = get_llm_client()
+    completion_cache = get_completion_cache()
+    if not completion_cache.should_cache(params, cache):
+        return await client.chat_completion(timeout=timeout, **params)
+
+    key = completion_cache_key(**params)
+    response = completion_cache.get(key)
+    if response is None:
+        response = await client.chat_completion(timeout=timeout, **params)
+        completion_cache.set(key, response)
+    return response
@@ -0,0 +1,286 @@
+"""Shared async client for OpenAI-compatible chat completion APIs
+
+One pooled httpx.AsyncClient on a background event loop serves every
+evaluator. Requests pass through token buckets for requests and tokens per
+minute, are retried with jittered exponential backoff (honouring
+Retry-After) within a per-call deadline, and identical in-flight requests
+share one upstream call.
+
+Synchronous code calls chat_completion_sync(); async code awaits
+chat_completion() from any event loop. Point OPENAI_BASE_URL at
+fake_llm_server for tests.
+"""
+import os
+import json
+import time
+import random
+import asyncio
+import threading
+import httpx
+from typing import Any, Dict, Optional
+
+# Retried after backoff; anything else fails immediately
+RETRYABLE_STATUS = (408, 409, 429, 500, 502, 503, 504)
+
+class LLMError(Exception):
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+class LLMResponse(dict):
+    """JSON response with attribute access (response.choices[0].message.content)"""
+
+    def __getattr__(self, name: str) -> Any:
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+def to_response_object(value: Any) -> Any:
+    if isinstance(value, dict):
+        return LLMResponse({key: to_response_object(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return [to_response_object(item) for item in value]
+    return value
+
+def estimate_tokens(params: Dict[str, Any]) -> int:
+    """Rough prompt + completion token count (about 4 characters per token)"""
+    prompt_chars = sum(len(str(message.get('content') or '')) for message in params.get('messages', []))
+    return prompt_chars // 4 + int(params.get('max_tokens') or 256)
+
+class TokenBucket:
+    """Async token bucket refilled continuously at rate_per_minute, holding at most one minute's worth"""
+
+    def __init__(self, rate_per_minute: float):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = rate_per_minute
+        self.tokens = rate_per_minute
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount: float = 1.0) -> float:
+        """Wait until amount tokens are available and take them; returns seconds waited"""
+        amount = min(amount, self.capacity)
+        waited = 0.0
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return waited
+                delay = (amount - self.tokens) / self.rate
+                await asyncio.sleep(delay)
+                waited += delay
+
+    def adjust(self, amount: float) -> None:
+        """Return (negative amount) or take extra tokens once the real usage is known"""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens - amount)
+
+class _SharedCall:
+    """One upstream call and the number of callers still waiting on it"""
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+class LLMClient:
+    def __init__(
+        self,
+        base_url: str = 'https://api.openai.com/v1',
+        api_key: Optional[str] = None,
+        max_connections: int = 20,
+        requests_per_minute: float = 500,
+        tokens_per_minute: float = 90000,
+        max_retries: int = 5,
+        timeout: float = 60.0,
+        backoff_base: float = 0.5,
+        backoff_max: float = 20.0
+    ):
+        self.base_url = base_url.rstrip('/')
+        self.api_key = api_key
+        self.max_connections = max_connections
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_lock = threading.Lock()
+        self._in_flight: Dict[str, _SharedCall] = {}
+        self._stats = {
+            'requests': 0,
+            'upstream_calls': 0,
+            'coalesced': 0,
+            'retries': 0,
+            'rate_limited': 0,
+            'errors': 0,
+            'throttle_seconds': 0.0
+        }
+
+    @classmethod
+    def from_env(cls) -> 'LLMClient':
+        return cls(
+            base_url=os.getenv('OPENAI_BASE_URL', 'https://api.openai.com/v1'),
+            api_key=os.getenv('OPENAI_API_KEY'),
+            max_connections=int(os.getenv('LLM_MAX_CONNECTIONS', '20')),
+            requests_per_minute=float(os.getenv('LLM_REQUESTS_PER_MINUTE', '500')),
+            tokens_per_minute=float(os.getenv('LLM_TOKENS_PER_MINUTE', '90000')),
+            max_retries=int(os.getenv('LLM_MAX_RETRIES', '5')),
+            timeout=float(os.getenv('LLM_TIMEOUT', '60'))
+        )
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        """Start the client's event loop thread, and the pooled HTTP client on it, on first use"""
+        if self._loop is None:
+            with self._loop_lock:
+                if self._loop is None:
+                    loop = asyncio.new_event_loop()
+                    threading.Thread(target=loop.run_forever, name='llm-client', daemon=True).start()
+                    asyncio.run_coroutine_threadsafe(self._setup(), loop).result()
+                    self._loop = loop
+        return self._loop
+
+    async def _setup(self) -> None:
+        # httpx and asyncio primitives are bound to the loop they are created on
+        self._http = httpx.AsyncClient(
+            base_url=self.base_url,
+            headers={'Authorization': f'Bearer {self.api_key}'} if self.api_key else {},
+            limits=httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_connections
+            ),
+            timeout=self.timeout
+        )
+        self._request_bucket = TokenBucket(self.requests_per_minute)
+        self._token_bucket = TokenBucket(self.tokens_per_minute)
+
+    def _backoff(self, attempt: int, retry_after: Optional[str]) -> float:
+        # Full jitter, but never sooner than the server asked for
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        if retry_after:
+            try:
+                delay = max(delay, float(retry_after))
+            except ValueError:
+                pass
+        return delay
+
+    async def _throttle(self, bucket: TokenBucket, amount: float, deadline: float) -> None:
+        """Take rate limit tokens, giving up once the call's deadline passes"""
+        try:
+            waited = await asyncio.wait_for(bucket.acquire(amount), timeout=max(0.0, deadline - time.monotonic()))
+        except asyncio.TimeoutError:
+            raise LLMError("LLM request deadline exceeded waiting for rate limit", 408) from None
+        self._stats['throttle_seconds'] += waited
+
+    async def _request(self, params: Dict[str, Any], deadline: float) -> Dict[str, Any]:
+        estimated = estimate_tokens(params)
+        await self._throttle(self._token_bucket, estimated, deadline)
+
+        attempt = 0
+        while True:
+            # Every attempt, retries included, counts against the request rate
+            await self._throttle(self._request_bucket, 1, deadline)
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise LLMError("LLM request deadline exceeded", 408)
+
+            self._stats['upstream_calls'] += 1
+            retry_after = None
+            try:
+                response = await self._http.post('/chat/completions', json=params, timeout=remaining)
+                if response.status_code < 400:
+                    body = response.json()
+                    used = (body.get('usage') or {}).get('total_tokens')
+                    if used is not None:
+                        self._token_bucket.adjust(used - estimated)
+                    return body
+                if response.status_code not in RETRYABLE_STATUS:
+                    raise LLMError(f"LLM request failed ({response.status_code}): {response.text[:500]}", response.status_code)
+                if response.status_code == 429:
+                    self._stats['rate_limited'] += 1
+                retry_after = response.headers.get('Retry-After')
+                error = LLMError(f"LLM request failed ({response.status_code})", response.status_code)
+            except httpx.TimeoutException:
+                error = LLMError("LLM request timed out", 408)
+            except httpx.TransportError as e:
+                error = LLMError(f"LLM connection error: {str(e)}")
+
+            delay = self._backoff(attempt, retry_after)
+            if attempt >= self.max_retries or time.monotonic() + delay >= deadline:
+                raise error
+            attempt += 1
+            self._stats['retries'] += 1
+            await asyncio.sleep(delay)
+
+    async def _upstream(self, params: Dict[str, Any], deadline: float) -> Dict[str, Any]:
+        try:
+            return await self._request(params, deadline)
+        except Exception:
+            self._stats['errors'] += 1
+            raise
+
+    async def _complete(self, params: Dict[str, Any], timeout: Optional[float]) -> Any:
+        self._stats['requests'] += 1
+        key = json.dumps(params, sort_keys=True, default=str)
+
+        # Identical requests already in flight share one upstream task, which
+        # outlives any single caller and is cancelled only when the last
+        # waiting caller goes away
+        call = self._in_flight.get(key)
+        if call is None:
+            deadline = time.monotonic() + (timeout or self.timeout)
+            call = _SharedCall(asyncio.get_running_loop().create_task(self._upstream(params, deadline)))
+            self._in_flight[key] = call
+            call.task.add_done_callback(lambda _: self._forget(key, call))
+        else:
+            self._stats['coalesced'] += 1
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                # New callers must not join a call that is being cancelled
+                self._forget(key, call)
+                call.task.cancel()
+
+    def _forget(self, key: str, call: _SharedCall) -> None:
+        if self._in_flight.get(key) is call:
+            del self._in_flight[key]
+
+    def _submit(self, params: Dict[str, Any], timeout: Optional[float]):
+        return asyncio.run_coroutine_threadsafe(self._complete(params, timeout), self._ensure_loop())
+
+    async def chat_completion(self, timeout: Optional[float] = None, **params) -> LLMResponse:
+        """Create a chat completion from any event loop; timeout is the deadline across retries"""
+        body = await asyncio.wrap_future(self._submit(params, timeout))
+        return to_response_object(body)
+
+    def chat_completion_sync(self, timeout: Optional[float] = None, **params) -> LLMResponse:
+        """Blocking chat completion for synchronous callers"""
+        return to_response_object(self._submit(params, timeout).result())
+
+    def stats(self) -> Dict[str, Any]:
+        stats = dict(self._stats)
+        stats['throttle_seconds'] = round(stats['throttle_seconds'], 3)
+        return stats
+
+_llm_client: Optional[LLMClient] = None
+_llm_client_lock = threading.Lock()
+
+def get_llm_client() -> LLMClient:
+    global _llm_client
+    if _llm_client is None:
+        with _llm_client_lock:
+            if _llm_client is None:
+                _llm_client = LLMClient.from_env()
+    return _llm_client
@@ -1,7 +1,404 @@
-from fastapi import FastAPI
+import os
+import json
+import time
+import asyncio
+import dataclasses
+import functools
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+from fastapi import FastAPI, File, Form, HTTPException, UploadFile
+from fastapi.responses import FileResponse, StreamingResponse
+from pydantic import BaseModel
+from .service_factory import ai_service_factory
+from .tts_cache import get_tts_cache
+from .job_queue import FINISHED_STATES, QueueFullError
 
 app = FastAPI()
 
+# Blocking model inference runs here, never on the event loop
+executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv('AI_API_WORKERS', '4')),
+    thread_name_prefix='ai-api'
+)
+
+# Job store calls (SQLite) and health probes are short but blocking; their own
+# pool keeps them off the event loop without queueing them behind inference
+job_store_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv('AI_API_JOB_STORE_WORKERS', '4')),
+    thread_name_prefix='ai-jobs'
+)
+
+# Concurrent requests admitted per endpoint; override with AI_API_MAX_CONCURRENT_<NAME>
+ENDPOINT_LIMITS = {
+    'text': 8,
+    'code': 4,
+    'handwritten': 4,
+    'voice': 2,
+    'translate': 8,
+    'audio': 4
+}
+
+class ConcurrencyLimiter:
+    """Admit at most `limit` requests at once and reject the rest with 429 instead of queueing
+
+    Only touched from the event loop thread, so a plain counter is enough.
+    """
+
+    def __init__(self, name: str, limit: int):
+        self.name = name
+        self.limit = limit
+        self.active = 0
+        self.rejected = 0
+
+    def acquire(self) -> None:
+        if self.active >= self.limit:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=429,
+                detail=f"Too many concurrent {self.name} requests",
+                headers={'Retry-After': '1'}
+            )
+        self.active += 1
+
+    def release(self) -> None:
+        self.active -= 1
+
+    def __enter__(self) -> 'ConcurrencyLimiter':
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.release()
+
+    def stats(self) -> Dict[str, int]:
+        return {'limit': self.limit, 'active': self.active, 'rejected': self.rejected}
+
+limiters = {
+    name: ConcurrencyLimiter(name, int(os.getenv(f'AI_API_MAX_CONCURRENT_{name.upper()}', str(limit))))
+    for name, limit in ENDPOINT_LIMITS.items()
+}
+
+class TextEvaluationRequest(BaseModel):
+    text: str
+    subject: Optional[str] = None
+    language: Optional[str] = None  # Also return the feedback translated into this language
+
+class TestCaseRequest(BaseModel):
+    input: str = ''
+    expected_output: str
+    name: Optional[str] = None
+
+class CodeEvaluationRequest(BaseModel):
+    code: str
+    language: str = 'python'
+    test_cases: Optional[List[TestCaseRequest]] = None  # Run in the sandbox; results under "execution"
+
+    def test_case_dicts(self) -> Optional[List[Dict[str, Any]]]:
+        if not self.test_cases:
+            return None
+        return [
+            {'input': case.input, 'expected_output': case.expected_output, 'name': case.name}
+            for case in self.test_cases
+        ]
+
+class TextJobRequest(TextEvaluationRequest):
+    priority: str = 'interactive'
+
+class CodeJobRequest(CodeEvaluationRequest):
+    priority: str = 'interactive'
+
+class TranslationRequest(BaseModel):
+    feedback: str
+    languages: List[str]
+
+class AudioFeedbackRequest(BaseModel):
+    feedback: str
+    language: str = 'en'
+    voice_type: str = 'neutral'
+
+async def run_blocking(fn, *args, **kwargs) -> Any:
+    """Run a blocking call on the bounded inference executor"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, functools.partial(fn, *args, **kwargs))
+
+async def run_job_store(fn, *args, **kwargs) -> Any:
+    """Run a short blocking call (job store, health probe) on the job store executor"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(job_store_executor, functools.partial(fn, *args, **kwargs))
+
+def _to_response(result: Any) -> Any:
+    if dataclasses.is_dataclass(result):
+        return dataclasses.asdict(result)
+    return result
+
+async def _call(endpoint: str, fn, *args, **kwargs) -> Any:
+    """Run fn under the endpoint's concurrency limit, mapping service errors to HTTP errors"""
+    with limiters[endpoint]:
+        try:
+            return _to_response(await run_blocking(fn, *args, **kwargs))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+
 @app.get("/")
 def read_root():
     return {"message": "Hello, World"}
+
+@app.post("/evaluate/text")
+async def evaluate_text(request: TextEvaluationRequest) -> Dict[str, Any]:
+    def evaluate() -> Dict[str, Any]:
+        result = ai_service_factory.evaluate_submission('text', request.text, subject=request.subject)
+        if request.language and request.language != 'en':
+            text_service = ai_service_factory.get_service('text')
+            result['translated_feedback'] = text_service.translate_feedback(result['feedback'], request.language)
+        return result
+
+    return await _call('text', evaluate)
+
+@app.post("/evaluate/code")
+async def evaluate_code(request: CodeEvaluationRequest) -> Dict[str, Any]:
+    return await _call(
+        'code',
+        ai_service_factory.evaluate_submission,
+        'code',
+        request.code,
+        language=request.language,
+        test_cases=request.test_case_dicts()
+    )
+
+@app.post("/evaluate/handwritten")
+async def evaluate_handwritten(
+    image: UploadFile = File(...),
+    subject: Optional[str] = Form(None)
+) -> Dict[str, Any]:
+    # Decoded straight from memory; nothing is written to disk
+    content = await image.read()
+    if not content:
+        raise HTTPException(status_code=400, detail="Empty image upload")
+    return await _call(
+        'handwritten',
+        ai_service_factory.evaluate_submission,
+        'handwritten',
+        content,
+        subject=subject
+    )
+
+@app.post("/evaluate/voice")
+async def evaluate_voice(
+    audio: UploadFile = File(...),
+    subject: Optional[str] = Form(None),
+    quality: Optional[str] = Form(None)
+) -> Dict[str, Any]:
+    content = await audio.read()
+    if not content:
+        raise HTTPException(status_code=400, detail="Empty audio upload")
+    suffix = Path(audio.filename or '').suffix or '.wav'
+
+    def evaluate() -> Dict[str, Any]:
+        # Whisper decodes through ffmpeg, which reads from a file
+        with tempfile.NamedTemporaryFile(suffix=suffix) as audio_file:
+            audio_file.write(content)
+            audio_file.flush()
+            return ai_service_factory.evaluate_submission(
+                'voice',
+                audio_file.name,
+                subject=subject,
+                quality=quality
+            )
+
+    return await _call('voice', evaluate)
+
+@app.post("/translate")
+async def translate(request: TranslationRequest) -> Dict[str, str]:
+    def translate_all() -> Dict[str, str]:
+        text_service = ai_service_factory.get_service('text')
+        return text_service.translate_feedback_all(request.feedback, request.languages)
+
+    return await _call('translate', translate_all)
+
+@app.post("/audio/feedback")
+async def audio_feedback(request: AudioFeedbackRequest) -> Dict[str, Any]:
+    result = await _call(
+        'audio',
+        ai_service_factory.generate_audio_feedback,
+        request.feedback,
+        language=request.language,
+        voice_type=request.voice_type
+    )
+    result['audio_url'] = f"/audio/files/{Path(result['audio_path']).name}"
+    return result
+
+@app.get("/audio/files/{filename}")
+async def audio_file(filename: str) -> FileResponse:
+    cache_dir = get_tts_cache().cache_dir.resolve()
+    path = (cache_dir / filename).resolve()
+    if path.parent != cache_dir or not path.name.startswith('feedback_') or not path.is_file():
+        raise HTTPException(status_code=404, detail="Audio file not found")
+    return FileResponse(str(path), media_type='audio/mpeg')
+
+@app.post("/audio/feedback/stream")
+async def stream_audio_feedback(request: AudioFeedbackRequest) -> StreamingResponse:
+    """Chunked MP3 response; playback can start before synthesis finishes"""
+    limiter = limiters['audio']
+    limiter.acquire()
+    try:
+        chunks = await run_blocking(
+            ai_service_factory.stream_audio_feedback,
+            request.feedback,
+            language=request.language,
+            voice_type=request.voice_type
+        )
+        # Pull the first chunk here so synthesis errors become a 500, not a truncated 200
+        first = await run_blocking(next, chunks, b'')
+    except Exception as e:
+        limiter.release()
+        raise HTTPException(status_code=500, detail=str(e))
+
+    loop = asyncio.get_running_loop()
+
+    def body() -> Iterator[bytes]:
+        try:
+            yield first
+            yield from chunks
+        finally:
+            # Closing the stream on disconnect discards the partial cache file
+            # and ends synthesis now rather than at garbage collection
+            chunks.close()
+            # The response iterates in a worker thread; release back on the loop
+            loop.call_soon_threadsafe(limiter.release)
+
+    return StreamingResponse(body(), media_type='audio/mpeg')
+
+@app.on_event("startup")
+async def start_job_queue() -> None:
+    await run_job_store(ai_service_factory.start_job_queue)
+
+async def _submit(submission_type: str, content: Any, priority: str, spool_path: Optional[str] = None, **kwargs) -> Dict[str, str]:
+    try:
+        job_id = await run_job_store(
+            ai_service_factory.submit_evaluation,
+            submission_type,
+            content,
+            priority=priority,
+            spool_path=spool_path,
+            **kwargs
+        )
+    except QueueFullError as e:
+        if spool_path:
+            os.unlink(spool_path)
+        raise HTTPException(status_code=429, detail=str(e), headers={'Retry-After': '5'})
+    except ValueError as e:
+        if spool_path:
+            os.unlink(spool_path)
+        raise HTTPException(status_code=400, detail=str(e))
+    return {'job_id': job_id, 'status': 'queued', 'status_url': f"/jobs/{job_id}"}
+
+@app.post("/jobs/evaluate/text", status_code=202)
+async def submit_text_job(request: TextJobRequest) -> Dict[str, str]:
+    return await _submit('text', request.text, request.priority, subject=request.subject)
+
+@app.post("/jobs/evaluate/code", status_code=202)
+async def submit_code_job(request: CodeJobRequest) -> Dict[str, str]:
+    return await _submit(
+        'code',
+        request.code,
+        request.priority,
+        language=request.language,
+        test_cases=request.test_case_dicts()
+    )
+
+@app.post("/jobs/evaluate/handwritten", status_code=202)
+async def submit_handwritten_job(
+    image: UploadFile = File(...),
+    subject: Optional[str] = Form(None),
+    priority: str = Form('interactive')
+) -> Dict[str, str]:
+    content = await image.read()
+    if not content:
+        raise HTTPException(status_code=400, detail="Empty image upload")
+    return await _submit('handwritten', content, priority, subject=subject)
+
+@app.post("/jobs/evaluate/voice", status_code=202)
+async def submit_voice_job(
+    audio: UploadFile = File(...),
+    subject: Optional[str] = Form(None),
+    quality: Optional[str] = Form(None),
+    priority: str = Form('interactive')
+) -> Dict[str, str]:
+    content = await audio.read()
+    if not content:
+        raise HTTPException(status_code=400, detail="Empty audio upload")
+
+    # Whisper reads from a file; the job removes it once it has run
+    spool_dir = os.getenv('JOB_SPOOL_DIR', os.path.join(tempfile.gettempdir(), 'ai_jobs'))
+    os.makedirs(spool_dir, exist_ok=True)
+    fd, spool_path = tempfile.mkstemp(dir=spool_dir, suffix=Path(audio.filename or '').suffix or '.wav')
+    with os.fdopen(fd, 'wb') as spool_file:
+        spool_file.write(content)
+
+    return await _submit('voice', spool_path, priority, spool_path=spool_path, subject=subject, quality=quality)
+
+@app.get("/jobs/{job_id}")
+async def job_status(job_id: str) -> Dict[str, Any]:
+    job = await run_job_store(ai_service_factory.get_job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str) -> StreamingResponse:
+    """Server-sent events: one event per status change, ending when the job finishes"""
+    if await run_job_store(ai_service_factory.get_job, job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    poll_seconds = float(os.getenv('JOB_EVENTS_POLL_SECONDS', '0.5'))
+    keepalive_seconds = 15.0
+
+    async def events() -> AsyncIterator[str]:
+        last_status = None
+        last_sent = time.monotonic()
+        while True:
+            job = await run_job_store(ai_service_factory.get_job, job_id)
+            if job is None:
+                yield "event: expired\ndata: {}\n\n"
+                return
+            if job['status'] != last_status:
+                last_status = job['status']
+                last_sent = time.monotonic()
+                yield f"event: {last_status}\ndata: {json.dumps(job, default=str)}\n\n"
+                if last_status in FINISHED_STATES:
+                    return
+            elif time.monotonic() - last_sent > keepalive_seconds:
+                # Comment line keeps proxies from closing an idle stream
+                last_sent = time.monotonic()
+                yield ": keep-alive\n\n"
+            await asyncio.sleep(poll_seconds)
+
+    return StreamingResponse(
+        events(),
+        media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+def _overall_health(services: Dict[str, str]) -> str:
+    """'degraded' if any service failed, 'not_warmed' if any is still unloaded, else 'ok'"""
+    if 'failed' in services.values():
+        return 'degraded'
+    if 'unloaded' in services.values():
+        return 'not_warmed'
+    return 'ok'
+
+@app.get("/health")
+async def health(details: bool = False) -> Dict[str, Any]:
+    services = await run_job_store(ai_service_factory.health_check)
+    response = {
+        'status': _overall_health(services),
+        'services': services,
+        'limits': {name: limiter.stats() for name, limiter in limiters.items()}
+    }
+    if details:
+        response['load_stats'] = await run_job_store(ai_service_factory.get_load_stats)
+    return response
@@ -1,4 +1,10 @@
-from typing import Dict, Any, Optional
+import os
+import time
+import threading
+from typing import Dict, Any, Optional, List, Iterable, Iterator
+from .lazy_loading import current_rss_bytes, bytes_to_mb
+from .job_queue import JobQueue
+from .llm_client import get_llm_client
 from .text_evaluator import TextEvaluator
 from .code_evaluator import CodeEvaluator
 from .handwriting_recognizer import HandwritingRecognizer
@@ -8,6 +14,21 @@ class AIServiceFactory:
     _instance = None
     _services: Dict[str, Any] = {}
 
+    # Service registry; instances are created on first use
+    _service_classes = {
+        'text': TextEvaluator,
+        'code': CodeEvaluator,
+        'handwriting': HandwritingRecognizer,
+        'audio': AudioProcessor
+    }
+
+    _service_labels = {
+        'text': 'Text evaluation',
+        'code': 'Code evaluation',
+        'handwriting': 'Handwriting recognition',
+        'audio': 'Audio processing'
+    }
+
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super(AIServiceFactory, cls).__new__(cls)
@@ -15,33 +36,121 @@ class AIServiceFactory:
         return cls._instance
 
     def _initialize_services(self) -> None:
-        """Initialize all AI services with proper error handling"""
-        try:
-            # Initialize text evaluation service
-            self._services['text'] = TextEvaluator()
-            print("✓ Text evaluation service initialized")
+        """Set up the lazy service registry and start warm-up if configured"""
+        self._registry_lock = threading.Lock()
+        self._service_locks = {name: threading.Lock() for name in self._service_classes}
+        self._load_stats: Dict[str, Dict[str, Any]] = {}
+        self._warmup_thread: Optional[threading.Thread] = None
+        self._job_queue: Optional[JobQueue] = None
 
-            # Initialize code evaluation service
-            self._services['code'] = CodeEvaluator()
-            print("✓ Code evaluation service initialized")
+        # AI_SERVICES_WARMUP: comma-separated service names, or "all"
+        warmup = os.getenv('AI_SERVICES_WARMUP', '').strip()
+        if warmup:
+            services = None if warmup == 'all' else [s.strip() for s in warmup.split(',') if s.strip()]
+            self.warm_up(services, background=True)
 
-            # Initialize handwriting recognition service
-            self._services['handwriting'] = HandwritingRecognizer()
-            print("✓ Handwriting recognition service initialized")
+    def _load_service(self, service_type: str) -> Any:
+        """Instantiate a service and record its load time and memory cost"""
+        with self._service_locks[service_type]:
+            # Another thread may have finished loading while we waited
+            if service_type in self._services:
+                return self._services[service_type]
 
-            # Initialize audio processing service
-            self._services['audio'] = AudioProcessor()
-            print("✓ Audio processing service initialized")
+            try:
+                rss_before = current_rss_bytes()
+                start = time.perf_counter()
 
-        except Exception as e:
-            print(f"Error initializing AI services: {str(e)}")
-            raise
+                service = self._service_classes[service_type]()
+
+                load_time = time.perf_counter() - start
+                rss_after = current_rss_bytes()
+
+                self._load_stats[service_type] = {
+                    'load_time': round(load_time, 3),
+                    'rss_delta_mb': bytes_to_mb(rss_after - rss_before),
+                    'rss_mb': bytes_to_mb(rss_after),
+                    'loaded_at': time.time()
+                }
+                self._services[service_type] = service
+                print(f"✓ {self._service_labels[service_type]} service initialized in {load_time:.2f}s")
+                return service
+
+            except Exception as e:
+                print(f"Error initializing {service_type} service: {str(e)}")
+                raise
 
     def get_service(self, service_type: str) -> Optional[Any]:
-        """Get an instance of the requested service"""
-        if service_type not in self._services:
+        """Get an instance of the requested service, loading it on first use"""
+        if service_type not in self._service_classes:
             raise ValueError(f"Unknown service type: {service_type}")
-        return self._services[service_type]
+
+        service = self._services.get(service_type)
+        if service is None:
+            service = self._load_service(service_type)
+        return service
+
+    def is_loaded(self, service_type: str) -> bool:
+        """Check whether a service has already been instantiated"""
+        return service_type in self._services
+
+    def warm_up(
+        self,
+        services: Optional[Iterable[str]] = None,
+        background: bool = True,
+        load_models: bool = True
+    ) -> Optional[threading.Thread]:
+        """Preload services (and optionally their models) ahead of the first request"""
+        names: List[str] = list(services) if services is not None else list(self._service_classes)
+        for name in names:
+            if name not in self._service_classes:
+                raise ValueError(f"Unknown service type: {name}")
+
+        def _warm() -> None:
+            for name in names:
+                try:
+                    service = self.get_service(name)
+                    if load_models and hasattr(service, 'warm_up'):
+                        start = time.perf_counter()
+                        rss_before = current_rss_bytes()
+                        service.warm_up()
+                        self._load_stats[name].update({
+                            'model_load_time': round(time.perf_counter() - start, 3),
+                            'model_rss_delta_mb': bytes_to_mb(current_rss_bytes() - rss_before),
+                            'rss_mb': bytes_to_mb(current_rss_bytes())
+                        })
+                except Exception as e:
+                    # Warm-up is best effort; the request path will retry and surface errors
+                    print(f"Warm-up failed for {name}: {str(e)}")
+
+        if not background:
+            _warm()
+            return None
+
+        with self._registry_lock:
+            if self._warmup_thread is None or not self._warmup_thread.is_alive():
+                self._warmup_thread = threading.Thread(
+                    target=_warm,
+                    name='ai-service-warmup',
+                    daemon=True
+                )
+                self._warmup_thread.start()
+            return self._warmup_thread
+
+    def get_load_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Report load time and resident memory for every registered service"""
+        stats = {}
+        for name in self._service_classes:
+            entry = {'loaded': self.is_loaded(name)}
+            entry.update(self._load_stats.get(name, {}))
+            service = self._services.get(name)
+            if service is not None and hasattr(service, 'get_model_load_stats'):
+                entry['models'] = service.get_model_load_stats()
+            stats[name] = entry
+        if self._job_queue is not None:
+            stats['jobs'] = self._job_queue.stats()
+        stats['llm'] = get_llm_client().stats()
+        stats['process'] = {'rss_mb': bytes_to_mb(current_rss_bytes())}
+        return stats
 
     def evaluate_submission(self, submission_type: str, content: Any, **kwargs) -> Dict[str, Any]:
         """Evaluate a submission using the appropriate service"""
@@ -52,7 +161,7 @@ class AIServiceFactory:
 
             elif submission_type == 'code':
                 service = self.get_service('code')
-                result = service.evaluate_code(content, kwargs.get('language'))
+                result = service.evaluate_code(content, kwargs.get('language'), kwargs.get('test_cases'))
 
             elif submission_type == 'handwritten':
                 # First recognize the handwriting
@@ -73,7 +182,10 @@ class AIServiceFactory:
             elif submission_type == 'voice':
                 # First transcribe the audio
                 audio_service = self.get_service('audio')
-                transcription_result = audio_service.transcribe_audio(content)
+                transcription_result = audio_service.transcribe_audio(
+                    content,
+                    quality=kwargs.get('quality')
+                )
 
                 # Then evaluate the transcribed text
                 text_service = self.get_service('text')
@@ -82,6 +194,7 @@ class AIServiceFactory:
                     kwargs.get('subject')
                 )
                 result['transcription_confidence'] = transcription_result.confidence
+                result['low_confidence_segments'] = transcription_result.low_confidence_segments
 
             else:
                 raise ValueError(f"Unsupported submission type: {submission_type}")
@@ -92,6 +205,52 @@ class AIServiceFactory:
             print(f"Error evaluating {submission_type} submission: {str(e)}")
             raise
 
+    @property
+    def job_queue(self) -> JobQueue:
+        """Background queue for evaluations too slow for a request/response cycle"""
+        if self._job_queue is None:
+            with self._registry_lock:
+                if self._job_queue is None:
+                    self._job_queue = JobQueue.from_env({'evaluate': self._run_evaluation_job})
+        return self._job_queue
+
+    def start_job_queue(self) -> JobQueue:
+        """Start the job workers now, recovering abandoned jobs, rather than on the first job request"""
+        return self.job_queue
+
+    def submit_evaluation(
+        self,
+        submission_type: str,
+        content: Any,
+        priority: str = 'interactive',
+        spool_path: Optional[str] = None,
+        **kwargs
+    ) -> str:
+        """Queue a submission for evaluation and return the job id to poll"""
+        return self.job_queue.submit(
+            'evaluate',
+            {'submission_type': submission_type, 'content': content, 'spool_path': spool_path, **kwargs},
+            priority=priority
+        )
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Status (and result or error once finished) of a queued evaluation"""
+        return self.job_queue.get(job_id)
+
+    def _run_evaluation_job(
+        self,
+        submission_type: str,
+        content: Any,
+        spool_path: Optional[str] = None,
+        **kwargs
+    ) -> Dict[str, Any]:
+        try:
+            return self.evaluate_submission(submission_type, content, **kwargs)
+        finally:
+            # Uploads spooled to disk for the job are removed once it has run
+            if spool_path and os.path.exists(spool_path):
+                os.unlink(spool_path)
+
     def generate_audio_feedback(
         self,
         feedback: str,
@@ -123,6 +282,30 @@ class AIServiceFactory:
             print(f"Error generating audio feedback: {str(e)}")
             raise
 
+    def stream_audio_feedback(
+        self,
+        feedback: str,
+        language: str = 'en',
+        voice_type: str = 'neutral'
+    ) -> Iterator[bytes]:
+        """Stream audio feedback chunks in the specified language as they are synthesized"""
+        try:
+            # Translation happens up front so its errors surface before streaming starts
+            if language != 'en':
+                text_service = self.get_service('text')
+                feedback = text_service.translate_feedback(feedback, language)
+
+            audio_service = self.get_service('audio')
+            return audio_service.stream_feedback_audio(
+                text=feedback,
+                language=language,
+                voice_type=voice_type
+            )
+
+        except Exception as e:
+            print(f"Error streaming audio feedback: {str(e)}")
+            raise
+
     def explain_feedback(
         self,
         submission_type: str,
@@ -154,12 +337,19 @@ class AIServiceFactory:
             print(f"Error generating explanation: {str(e)}")
             raise
 
-    def health_check(self) -> Dict[str, bool]:
-        """Check the health status of all services"""
+    def health_check(self) -> Dict[str, str]:
+        """Report 'ok', 'failed' or 'unloaded' for every registered service
+
+        Services that have not been loaded yet are reported as 'unloaded'
+        rather than loaded here, so a health probe never triggers model loading.
+        """
         status = {}
-        for service_name in self._services:
+        for service_name in self._service_classes:
+            service = self._services.get(service_name)
+            if service is None:
+                status[service_name] = 'unloaded'
+                continue
             try:
-                service = self.get_service(service_name)
                 # Perform a basic operation to verify service is working
                 if service_name == 'text':
                     service.get_confidence_score('Test')
@@ -169,11 +359,11 @@ class AIServiceFactory:
                     service.preprocessing_params is not None
                 elif service_name == 'audio':
                     service.get_available_voices()
-                status[service_name] = True
+                status[service_name] = 'ok'
             except Exception as e:
                 print(f"Health check failed for {service_name}: {str(e)}")
-                status[service_name] = False
+                status[service_name] = 'failed'
         return status
 
-# Create a global instance
-ai_service_factory = AIServiceFactory()
\ No newline at end of file
+# Create a global instance (services load lazily on first use)
+ai_service_factory = AIServiceFactory()
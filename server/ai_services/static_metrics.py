@@ -0,0 +1,518 @@
+"""Deterministic code metrics from syntax trees and tokens
+
+Python is analysed with ast and tokenize, JavaScript/TypeScript with a small
+regex tokenizer. Each submission gets cyclomatic complexity (per function
+and in total), Halstead volume, a maintainability index, line and nesting
+statistics and lint-style violations, in milliseconds and without network
+access. Results are memoized by a hash of the language and code.
+"""
+import io
+import re
+import ast
+import math
+import keyword
+import hashlib
+import tokenize
+from dataclasses import dataclass, field, asdict
+from typing import Any, Dict, List, Optional, Set, Tuple
+from .cache_utils import LRUCache
+
+STATIC_LANGUAGES = ('python', 'javascript', 'typescript')
+
+LANGUAGE_ALIASES = {
+    'py': 'python',
+    'js': 'javascript',
+    'jsx': 'javascript',
+    'ts': 'typescript',
+    'tsx': 'typescript'
+}
+
+# Highest complexity, maintainability and efficiency score for code that does
+# not parse; line-based estimates would otherwise rate it as simple
+SYNTAX_ERROR_SCORE_CAP = 0.2
+
+# PEP 8 and Airbnb line length limits
+MAX_LINE_LENGTH = {
+    'python': 79,
+    'javascript': 100,
+    'typescript': 100
+}
+
+@dataclass
+class LintViolation:
+    line: int
+    code: str
+    message: str
+
+@dataclass
+class StaticMetrics:
+    language: str
+    total_lines: int
+    code_lines: int
+    comment_lines: int
+    blank_lines: int
+    functions: int
+    cyclomatic_complexity: int
+    max_function_complexity: int
+    average_function_complexity: float
+    max_nesting_depth: int
+    max_loop_depth: int
+    halstead_volume: float
+    maintainability_index: float
+    violations: List[LintViolation] = field(default_factory=list)
+    syntax_error: Optional[str] = None
+
+    def scores(self) -> Dict[str, float]:
+        """0-1 scores for CodeMetrics, higher is better"""
+        worst = self.max_function_complexity
+        scores = {
+            # Functions up to complexity 5 are simple; 30 and above score zero
+            'complexity': 1.0 if worst <= 5 else max(0.0, 1.0 - (worst - 5) / 25),
+            'maintainability': self.maintainability_index / 100,
+            # Each loop nested inside another multiplies the work
+            'efficiency': max(0.1, 1.0 - 0.3 * max(0, self.max_loop_depth - 1)),
+            # One violation every three code lines scores 0.5
+            'style': 1.0 / (1.0 + 3.0 * len(self.violations) / max(self.code_lines, 1))
+        }
+        if self.syntax_error:
+            for name in ('complexity', 'maintainability', 'efficiency'):
+                scores[name] = min(scores[name], SYNTAX_ERROR_SCORE_CAP)
+        return scores
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+def normalize_language(language: Optional[str]) -> str:
+    language = (language or '').strip().lower()
+    return LANGUAGE_ALIASES.get(language, language)
+
+def _maintainability_index(volume: float, complexity: int, code_lines: int) -> float:
+    """SEI maintainability index rescaled to 0-100 (as in Visual Studio)"""
+    mi = 171 - 5.2 * math.log(max(volume, 1.0)) - 0.23 * complexity - 16.2 * math.log(max(code_lines, 1))
+    return round(min(100.0, max(0.0, mi * 100 / 171)), 2)
+
+def _halstead_volume(operators: List[str], operands: List[str]) -> float:
+    vocabulary = len(set(operators)) + len(set(operands))
+    length = len(operators) + len(operands)
+    return round(length * math.log2(vocabulary), 2) if vocabulary > 1 else 0.0
+
+def _line_violations(lines: List[str], max_length: int, codes: Tuple[str, str, str]) -> List[LintViolation]:
+    """Physical-line checks: line length, trailing whitespace, tab indentation"""
+    too_long, trailing, tabs = codes
+    violations = []
+    for number, line in enumerate(lines, 1):
+        if len(line) > max_length:
+            violations.append(LintViolation(number, too_long, f"Line too long ({len(line)} > {max_length} characters)"))
+        if line != line.rstrip():
+            violations.append(LintViolation(number, trailing, "Trailing whitespace"))
+        if '\t' in line[:len(line) - len(line.lstrip())]:
+            violations.append(LintViolation(number, tabs, "Indentation contains tabs"))
+    return violations
+
+def _function_stats(complexities: List[int], module_complexity: int) -> Tuple[int, int, float]:
+    """Total, worst and average complexity; code outside functions counts as one more block"""
+    blocks = complexities + [module_complexity]
+    total = sum(complexities) + module_complexity
+    worst = max(blocks)
+    average = round(sum(complexities) / len(complexities), 2) if complexities else float(module_complexity)
+    return total, worst, average
+
+# ---------------------------------------------------------------------------
+# Python
+
+_PY_CONTROL_BLOCKS = tuple(getattr(ast, name) for name in (
+    'If', 'For', 'AsyncFor', 'While', 'With', 'AsyncWith', 'Try', 'TryStar', 'Match'
+) if hasattr(ast, name))
+_PY_LOOPS = (ast.For, ast.AsyncFor, ast.While)
+_PY_COMPREHENSIONS = (ast.ListComp, ast.SetComp, ast.DictComp, ast.GeneratorExp)
+_PY_FUNCTIONS = (ast.FunctionDef, ast.AsyncFunctionDef)
+
+_SNAKE_CASE = re.compile(r'^_{0,2}[a-z][a-z0-9_]*_{0,2}$|^_+$')
+_CAP_WORDS = re.compile(r'^_?[A-Z][A-Za-z0-9]*$')
+
+def _py_branches(node: ast.AST) -> int:
+    """Decision points a node adds to cyclomatic complexity"""
+    if isinstance(node, (ast.If, ast.IfExp, ast.For, ast.AsyncFor, ast.While, ast.ExceptHandler)):
+        return 1
+    if isinstance(node, ast.BoolOp):
+        return len(node.values) - 1
+    if isinstance(node, ast.comprehension):
+        return 1 + len(node.ifs)
+    if hasattr(ast, 'match_case') and isinstance(node, ast.match_case):
+        return 1
+    return 0
+
+class _PythonComplexity:
+    """Per-function cyclomatic complexity plus block and loop nesting depth"""
+
+    def __init__(self):
+        self.functions: List[int] = []
+        self.max_nesting = 0
+        self.max_loops = 0
+
+    def module(self, tree: ast.AST) -> int:
+        return 1 + self._count(tree, 0, 0)
+
+    def _count(self, node: ast.AST, nesting: int, loops: int) -> int:
+        decisions = 0
+        for child in ast.iter_child_nodes(node):
+            if isinstance(child, _PY_FUNCTIONS):
+                # Nested functions are scored on their own
+                self.functions.append(1 + self._count(child, nesting, 0))
+                continue
+
+            child_nesting, child_loops = nesting, loops
+            # An elif is written flat, so it does not add a level
+            is_elif = isinstance(node, ast.If) and isinstance(child, ast.If) and node.orelse == [child]
+            if isinstance(child, _PY_CONTROL_BLOCKS) and not is_elif:
+                child_nesting += 1
+            if isinstance(child, _PY_LOOPS):
+                child_loops += 1
+            elif isinstance(child, _PY_COMPREHENSIONS):
+                child_loops += len(child.generators)
+            self.max_nesting = max(self.max_nesting, child_nesting)
+            self.max_loops = max(self.max_loops, child_loops)
+
+            decisions += _py_branches(child) + self._count(child, child_nesting, child_loops)
+        return decisions
+
+def _python_lint(tree: ast.AST, tokens: List[tokenize.TokenInfo]) -> List[LintViolation]:
+    violations = []
+    used_names: Set[str] = set()
+    imports: List[Tuple[str, int]] = []
+
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name):
+            used_names.add(node.id)
+            if isinstance(node.ctx, ast.Store) and node.id in ('l', 'O', 'I'):
+                violations.append(LintViolation(node.lineno, 'E741', f"Ambiguous variable name '{node.id}'"))
+        elif isinstance(node, _PY_FUNCTIONS):
+            if not _SNAKE_CASE.match(node.name):
+                violations.append(LintViolation(node.lineno, 'N802', f"Function name '{node.name}' should be snake_case"))
+        elif isinstance(node, ast.ClassDef):
+            if not _CAP_WORDS.match(node.name):
+                violations.append(LintViolation(node.lineno, 'N801', f"Class name '{node.name}' should use CapWords"))
+        elif isinstance(node, ast.ExceptHandler):
+            if node.type is None:
+                violations.append(LintViolation(node.lineno, 'E722', "Bare 'except'"))
+        elif isinstance(node, ast.Compare):
+            for op, comparator in zip(node.ops, node.comparators):
+                if isinstance(op, (ast.Eq, ast.NotEq)) and isinstance(comparator, ast.Constant):
+                    if comparator.value is None:
+                        violations.append(LintViolation(node.lineno, 'E711', "Comparison to None should use 'is' or 'is not'"))
+                    elif comparator.value is True or comparator.value is False:
+                        violations.append(LintViolation(node.lineno, 'E712', f"Comparison to {comparator.value} should use 'if cond:'"))
+        elif isinstance(node, (ast.Import, ast.ImportFrom)):
+            if isinstance(node, ast.ImportFrom) and node.module == '__future__':
+                continue
+            for alias in node.names:
+                if alias.name != '*':
+                    imports.append(((alias.asname or alias.name).split('.')[0], node.lineno))
+
+        # Compound statement with its body on the header line (if x: y)
+        body = getattr(node, 'body', None)
+        if isinstance(node, ast.stmt) and isinstance(body, list) and body and body[0].lineno == node.lineno:
+            violations.append(LintViolation(node.lineno, 'E701', "Multiple statements on one line (colon)"))
+
+    for name, line in imports:
+        if name not in used_names:
+            violations.append(LintViolation(line, 'F401', f"'{name}' imported but unused"))
+
+    for token in tokens:
+        if token.type == tokenize.OP and token.string == ';':
+            violations.append(LintViolation(token.start[0], 'E702', "Multiple statements on one line (semicolon)"))
+
+    return violations
+
+_PY_DECISION_WORDS = re.compile(r'\b(if|elif|for|while|except|and|or|case)\b')
+_PY_LOOP_HEADER = re.compile(r'^(async\s+)?(for|while)\b')
+_PY_BLOCK_HEADER = re.compile(r'^(if|elif|else|for|async\s+for|while|with|async\s+with|try|except|finally|match)\b.*:\s*(#.*)?$')
+
+def _analyze_python_lines(lines: List[str], error: SyntaxError) -> StaticMetrics:
+    """Line-based estimate for Python that does not parse"""
+    comment_lines = sum(1 for line in lines if line.strip().startswith('#'))
+    blank_lines = sum(1 for line in lines if not line.strip())
+    code_lines = len(lines) - comment_lines - blank_lines
+
+    complexity = 1
+    functions = 0
+    max_nesting = max_loops = 0
+    # Open block headers as (indentation, is_loop)
+    blocks: List[Tuple[int, bool]] = []
+    for line in lines:
+        stripped = line.split('#', 1)[0].strip()
+        if not stripped:
+            continue
+        indent = len(line) - len(line.lstrip())
+        while blocks and blocks[-1][0] >= indent:
+            blocks.pop()
+        complexity += len(_PY_DECISION_WORDS.findall(stripped))
+        if re.match(r'^(async\s+)?def\b', stripped):
+            functions += 1
+        elif _PY_BLOCK_HEADER.match(stripped):
+            blocks.append((indent, bool(_PY_LOOP_HEADER.match(stripped))))
+            max_nesting = max(max_nesting, len(blocks))
+            max_loops = max(max_loops, sum(1 for _, is_loop in blocks if is_loop))
+
+    violations = [LintViolation(error.lineno or 1, 'E999', f"SyntaxError: {error.msg}")]
+    violations += _line_violations(lines, MAX_LINE_LENGTH['python'], ('E501', 'W291', 'W191'))
+    return StaticMetrics(
+        language='python',
+        total_lines=len(lines),
+        code_lines=code_lines,
+        comment_lines=comment_lines,
+        blank_lines=blank_lines,
+        functions=functions,
+        cyclomatic_complexity=complexity,
+        max_function_complexity=complexity,
+        average_function_complexity=float(complexity),
+        max_nesting_depth=max_nesting,
+        max_loop_depth=max_loops,
+        halstead_volume=0.0,
+        maintainability_index=_maintainability_index(0.0, complexity, code_lines),
+        violations=violations,
+        syntax_error=f"line {error.lineno}: {error.msg}"
+    )
+
+def analyze_python(code: str) -> StaticMetrics:
+    lines = code.splitlines()
+    try:
+        tree = ast.parse(code)
+        tokens = list(tokenize.generate_tokens(io.StringIO(code).readline))
+    except SyntaxError as e:
+        return _analyze_python_lines(lines, e)
+    except tokenize.TokenError as e:
+        return _analyze_python_lines(lines, SyntaxError(str(e.args[0]), ('<code>', e.args[1][0], 0, '')))
+
+    # Line counts and Halstead operators/operands from the token stream
+    code_line_numbers: Set[int] = set()
+    comment_line_numbers: Set[int] = set()
+    operators: List[str] = []
+    operands: List[str] = []
+    for token in tokens:
+        if token.type == tokenize.COMMENT:
+            comment_line_numbers.add(token.start[0])
+            continue
+        if token.type in (tokenize.NL, tokenize.NEWLINE, tokenize.INDENT, tokenize.DEDENT, tokenize.ENDMARKER):
+            continue
+        code_line_numbers.update(range(token.start[0], token.end[0] + 1))
+        if token.type == tokenize.OP or (token.type == tokenize.NAME and keyword.iskeyword(token.string)):
+            operators.append(token.string)
+        elif token.type in (tokenize.NAME, tokenize.NUMBER, tokenize.STRING):
+            operands.append(token.string)
+
+    visitor = _PythonComplexity()
+    module_complexity = visitor.module(tree)
+    total, worst, average = _function_stats(visitor.functions, module_complexity)
+    volume = _halstead_volume(operators, operands)
+    code_lines = len(code_line_numbers)
+
+    violations = _line_violations(lines, MAX_LINE_LENGTH['python'], ('E501', 'W291', 'W191'))
+    violations += _python_lint(tree, tokens)
+    violations.sort(key=lambda v: v.line)
+
+    return StaticMetrics(
+        language='python',
+        total_lines=len(lines),
+        code_lines=code_lines,
+        comment_lines=len(comment_line_numbers - code_line_numbers),
+        blank_lines=sum(1 for line in lines if not line.strip()),
+        functions=len(visitor.functions),
+        cyclomatic_complexity=total,
+        max_function_complexity=worst,
+        average_function_complexity=average,
+        max_nesting_depth=visitor.max_nesting,
+        max_loop_depth=visitor.max_loops,
+        halstead_volume=volume,
+        maintainability_index=_maintainability_index(volume, total, code_lines),
+        violations=violations
+    )
+
+# ---------------------------------------------------------------------------
+# JavaScript / TypeScript
+
+# Regex literals are not recognised; they tokenize as operators and operands
+_JS_TOKEN = re.compile(r"""
+    (?P<comment>//[^\n]*|/\*.*?\*/)
+  | (?P<string>`(?:\\.|[^`\\])*`|'(?:\\.|[^'\\\n])*'|"(?:\\.|[^"\\\n])*")
+  | (?P<number>\b0[xXbBoO][0-9a-fA-F_]+n?\b|(?:\b\d[\d_]*(?:\.\d*)?|\.\d+)(?:[eE][+-]?\d+)?n?\b)
+  | (?P<name>[A-Za-z_$][\w$]*)
+  | (?P<op>>>>=|===|!==|\.\.\.|\*\*=|<<=|>>=|>>>|&&=|\|\|=|\?\?=|=>|==|!=|<=|>=|&&|\|\||\?\?|\?\.|\+\+|--|<<|>>|\*\*|[-+*/%&|^]=|[{}()\[\];,.<>+\-*/%&|^!~?:=@\#])
+  | (?P<newline>\n)
+  | (?P<space>[^\S\n]+)
+  | (?P<other>.)
+""", re.VERBOSE | re.DOTALL)
+
+_JS_KEYWORDS = frozenset((
+    'break', 'case', 'catch', 'class', 'const', 'continue', 'debugger', 'default', 'delete', 'do',
+    'else', 'export', 'extends', 'finally', 'for', 'function', 'if', 'import', 'in', 'instanceof',
+    'let', 'new', 'return', 'super', 'switch', 'this', 'throw', 'try', 'typeof', 'var', 'void',
+    'while', 'with', 'yield', 'async', 'await', 'of', 'static', 'get', 'set',
+    'interface', 'type', 'enum', 'implements', 'private', 'public', 'protected', 'readonly'
+))
+_JS_DECISION_NAMES = frozenset(('if', 'for', 'while', 'case', 'catch'))
+_JS_DECISION_OPS = frozenset(('&&', '||', '??', '?'))
+_JS_LOOP_NAMES = frozenset(('for', 'while', 'do'))
+_JS_BLOCK_NAMES = frozenset(('if', 'else', 'switch', 'try', 'catch', 'finally'))
+_JS_DECLARATIONS = frozenset(('function', 'let', 'const', 'var', 'class'))
+
+# camelCase, PascalCase or SCREAMING_SNAKE_CASE
+_JS_NAME_STYLE = re.compile(r'^[_$]*[A-Za-z][A-Za-z0-9$]*_*$|^[A-Z][A-Z0-9_]*$')
+
+def _js_tokens(code: str) -> List[Tuple[str, str, int, int]]:
+    """(kind, text, first line, last line) for every token except whitespace"""
+    tokens = []
+    line = 1
+    for match in _JS_TOKEN.finditer(code):
+        kind, text = match.lastgroup, match.group()
+        newlines = text.count('\n')
+        if kind not in ('space', 'newline'):
+            tokens.append((kind, text, line, line + newlines))
+        line += newlines
+    return tokens
+
+def analyze_javascript(code: str, language: str = 'javascript') -> StaticMetrics:
+    lines = code.splitlines()
+    tokens = _js_tokens(code)
+
+    code_line_numbers: Set[int] = set()
+    comment_line_numbers: Set[int] = set()
+    operators: List[str] = []
+    operands: List[str] = []
+    violations: List[LintViolation] = []
+
+    # Brace scopes are 'function', 'loop', 'block' (if/else/try/switch) or 'other'
+    scopes: List[str] = []
+    decisions = [0]  # per open function, module code first
+    functions: List[int] = []
+    pending: Optional[str] = None
+    pending_parens = 0
+    parens = 0
+    max_nesting = max_loops = 0
+    previous = ('', '')
+
+    for kind, text, first, last in tokens:
+        if kind == 'comment':
+            comment_line_numbers.update(range(first, last + 1))
+            continue
+        code_line_numbers.update(range(first, last + 1))
+
+        if kind == 'name':
+            if text in _JS_KEYWORDS:
+                operators.append(text)
+            else:
+                operands.append(text)
+            if text in _JS_DECISION_NAMES:
+                decisions[-1] += 1
+            if text == 'function':
+                pending, pending_parens = 'function', parens
+            elif text in _JS_LOOP_NAMES and pending != 'function':
+                pending, pending_parens = 'loop', parens
+            elif text in _JS_BLOCK_NAMES and pending is None:
+                pending, pending_parens = 'block', parens
+
+            if text == 'var':
+                violations.append(LintViolation(first, 'no-var', "Unexpected var, use let or const instead"))
+            elif text == 'debugger':
+                violations.append(LintViolation(first, 'no-debugger', "Unexpected 'debugger' statement"))
+            elif text == 'console' and previous[1] != '.':
+                violations.append(LintViolation(first, 'no-console', "Unexpected console statement"))
+            elif previous[1] in _JS_DECLARATIONS and text not in _JS_KEYWORDS and not _JS_NAME_STYLE.match(text):
+                violations.append(LintViolation(first, 'camelcase', f"Identifier '{text}' is not in camel case"))
+
+        elif kind == 'op':
+            operators.append(text)
+            if text in _JS_DECISION_OPS:
+                decisions[-1] += 1
+            if text in ('==', '!='):
+                violations.append(LintViolation(first, 'eqeqeq', f"Expected '{text}=' and instead saw '{text}'"))
+
+            if text == '=>':
+                pending, pending_parens = 'function', parens
+            elif text in ('(', '['):
+                parens += 1
+            elif text in (')', ']'):
+                parens -= 1
+                if pending and parens < pending_parens:
+                    pending = None
+            elif text in (';', ',') and pending and parens == pending_parens:
+                # Brace-less body (for (...) x++;) or expression-bodied arrow
+                pending = None
+            elif text == '{':
+                if pending and parens == pending_parens:
+                    scope = pending
+                elif previous == ('op', ')') and parens == 0 and not pending:
+                    # Class or object method: name(args) {
+                    scope = 'function'
+                else:
+                    scope = 'other'
+                pending = None
+                scopes.append(scope)
+                if scope == 'function':
+                    decisions.append(0)
+                control = [s for s in scopes if s in ('loop', 'block')]
+                max_nesting = max(max_nesting, len(control))
+                max_loops = max(max_loops, sum(1 for s in control if s == 'loop'))
+            elif text == '}' and scopes:
+                if scopes.pop() == 'function':
+                    functions.append(1 + decisions.pop())
+
+        else:
+            operands.append(text)
+
+        previous = (kind, text)
+
+    # Unclosed functions still count
+    while len(decisions) > 1:
+        functions.append(1 + decisions.pop())
+    module_complexity = 1 + decisions[0]
+    total, worst, average = _function_stats(functions, module_complexity)
+    volume = _halstead_volume(operators, operands)
+    code_lines = len(code_line_numbers)
+
+    violations += _line_violations(lines, MAX_LINE_LENGTH[language], ('max-len', 'no-trailing-spaces', 'no-tabs'))
+    violations.sort(key=lambda v: v.line)
+
+    return StaticMetrics(
+        language=language,
+        total_lines=len(lines),
+        code_lines=code_lines,
+        comment_lines=len(comment_line_numbers - code_line_numbers),
+        blank_lines=sum(1 for line in lines if not line.strip()),
+        functions=len(functions),
+        cyclomatic_complexity=total,
+        max_function_complexity=worst,
+        average_function_complexity=average,
+        max_nesting_depth=max_nesting,
+        max_loop_depth=max_loops,
+        halstead_volume=volume,
+        maintainability_index=_maintainability_index(volume, total, code_lines),
+        violations=violations
+    )
+
+class StaticAnalyzer:
+    """Memoizing front end: one analysis per distinct (language, code)"""
+
+    def __init__(self, cache_size: int = 1024):
+        self.cache = LRUCache(max_entries=cache_size)
+
+    def supports(self, language: Optional[str]) -> bool:
+        return normalize_language(language) in STATIC_LANGUAGES
+
+    def analyze(self, code: str, language: str) -> StaticMetrics:
+        language = normalize_language(language)
+        if language not in STATIC_LANGUAGES:
+            raise ValueError(f"Static analysis is not available for {language} (supported: {', '.join(STATIC_LANGUAGES)})")
+
+        key = hashlib.sha256(f"{language}\0{code}".encode('utf-8')).hexdigest()
+        metrics = self.cache.get(key)
+        if metrics is None:
+            if language == 'python':
+                metrics = analyze_python(code)
+            else:
+                metrics = analyze_javascript(code, language)
+            self.cache.set(key, metrics)
+        return metrics
+
+    def stats(self) -> Dict[str, Any]:
+        return self.cache.stats()
@@ -0,0 +1,82 @@
+import asyncio
+import functools
+from concurrent.futures import Executor
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+@dataclass
+class Task:
+    name: str
+    fn: Callable[..., Any]
+    deps: Tuple[str, ...] = ()
+
+def _validate(tasks: List[Task]) -> List[Task]:
+    """Check names and dependencies and return the tasks in topological order"""
+    by_name = {}
+    for task in tasks:
+        if task.name in by_name:
+            raise ValueError(f"Duplicate task: {task.name}")
+        by_name[task.name] = task
+
+    ordered: List[Task] = []
+    state: Dict[str, str] = {}
+
+    def visit(name: str) -> None:
+        if state.get(name) == 'done':
+            return
+        if state.get(name) == 'visiting':
+            raise ValueError(f"Dependency cycle at task: {name}")
+        if name not in by_name:
+            raise ValueError(f"Unknown dependency: {name}")
+        state[name] = 'visiting'
+        for dep in by_name[name].deps:
+            visit(dep)
+        state[name] = 'done'
+        ordered.append(by_name[name])
+
+    for task in tasks:
+        visit(task.name)
+    return ordered
+
+async def run_task_graph(
+    tasks: List[Task],
+    max_concurrency: int = 4,
+    executor: Optional[Executor] = None
+) -> Dict[str, Any]:
+    """Run blocking tasks in threads as soon as their dependencies finish
+
+    Each task's function receives its dependencies' results as keyword
+    arguments named after the dependency. At most max_concurrency tasks run
+    at once; the first failure cancels everything still pending.
+    """
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(max_concurrency)
+    running: Dict[str, 'asyncio.Task[Any]'] = {}
+
+    async def run(task: Task) -> Any:
+        kwargs = {dep: await running[dep] for dep in task.deps}
+        async with semaphore:
+            return await loop.run_in_executor(executor, functools.partial(task.fn, **kwargs))
+
+    for task in _validate(tasks):
+        running[task.name] = asyncio.ensure_future(run(task))
+
+    try:
+        await asyncio.gather(*running.values())
+    except BaseException:
+        for pending in running.values():
+            pending.cancel()
+        raise
+
+    return {name: future.result() for name, future in running.items()}
+
+def run_sync(coro: Awaitable[Any]) -> Any:
+    """Run a coroutine from synchronous code; inside a running event loop, await it instead"""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    # Blocking here would stall the caller's loop until the graph finished
+    if asyncio.iscoroutine(coro):
+        coro.close()
+    raise RuntimeError("run_sync() cannot be called from a running event loop; await the coroutine instead")
@@ -1,28 +1,48 @@
 import os
+import re
 import json
+import time
+import threading
 import openai
+import numpy
 import torch
-from transformers import MarianMTModel, MarianTokenizer
-from elevenlabs import generate, save
-from lime.lime_text import LimeTextExplainer
+from lime.lime_text import IndexedString, LimeTextExplainer
+from sklearn.metrics.pairwise import pairwise_distances
+from .lazy_loading import LazyModelLoader
+from .cache_utils import LRUCache
+from .inference_backends import load_marian, check_marian_parity, parity_check_enabled
+from .llm_cache import chat_completion
+from .tts_cache import get_tts_cache, tts_cache_key
+from .tts_backends import create_tts_backend
+from .explanation_scorers import CLASS_NAMES, create_explanation_scorer, weights_converged
 
 class TextEvaluator:
-    def __init__(self):
+    def __init__(self, explanation_scorer=None):
         # Initialize OpenAI
         openai.api_key = os.getenv('OPENAI_API_KEY')
         
-        # Initialize translation models
-        self.translation_models = {}
-        self.translation_tokenizers = {}
+        # Translation models are loaded per language on first use
+        self.models = LazyModelLoader()
         self.supported_languages = ['ta', 'hi', 'te']  # Tamil, Hindi, Telugu
-        
-        for lang in self.supported_languages:
-            model_name = f'Helsinki-NLP/opus-mt-en-{lang}'
-            self.translation_models[lang] = MarianMTModel.from_pretrained(model_name)
-            self.translation_tokenizers[lang] = MarianTokenizer.from_pretrained(model_name)
+
+        # Sentence-level translation cache; rubric phrases repeat across feedback
+        self.translation_cache = LRUCache(max_entries=int(os.getenv('TRANSLATION_CACHE_SIZE', '10000')))
+        self.translation_batch_size = int(os.getenv('TRANSLATION_BATCH_SIZE', '16'))
+        self.translation_backend = os.getenv('MARIAN_BACKEND', 'torch')
+        self._translation_stats_lock = threading.Lock()
+        self._sentences_translated = 0
+        self._translation_seconds = 0.0
+
+        self._tts_backend = None
 
         # Initialize LIME explainer
-        self.explainer = LimeTextExplainer(class_names=['poor', 'fair', 'good', 'excellent'])
+        self.explainer = LimeTextExplainer(class_names=CLASS_NAMES)
+
+        # Scorer used as the LIME classifier; batched GPT-4 unless configured otherwise
+        self.explanation_scorer = explanation_scorer or create_explanation_scorer()
+        self.explanation_min_samples = int(os.getenv('EXPLANATION_MIN_SAMPLES', '25'))
+        self.explanation_max_samples = int(os.getenv('EXPLANATION_MAX_SAMPLES', '100'))
+        self.explanation_tolerance = float(os.getenv('EXPLANATION_CONVERGENCE_TOL', '0.1'))
 
     def evaluate_text(self, text, subject):
         """Evaluate text submission using GPT-4"""
@@ -39,7 +59,7 @@ class TextEvaluator:
             {text}
             """
 
-            response = openai.ChatCompletion.create(
+            response = chat_completion(
                 model="gpt-4",
                 messages=[
                     {"role": "system", "content": "You are an expert teacher providing detailed feedback."},
@@ -64,83 +84,246 @@ class TextEvaluator:
             print(f"Error in evaluate_text: {str(e)}")
             raise
 
+    _sentence_boundary = re.compile(r'(?<=[.!?])\s+')
+    _list_marker = re.compile(r'^(\d+|[a-zA-Z])[.)]$')
+
     def translate_feedback(self, feedback, target_language):
         """Translate feedback to target language"""
         try:
             if target_language not in self.supported_languages:
                 raise ValueError(f"Unsupported language: {target_language}")
 
-            model = self.translation_models[target_language]
-            tokenizer = self.translation_tokenizers[target_language]
+            paragraphs = self._split_sentences(feedback)
+            translations = self._translate_sentences(
+                [sentence for paragraph in paragraphs for sentence in paragraph],
+                target_language
+            )
+            return self._join_sentences(paragraphs, translations)
 
-            # Tokenize and translate
-            inputs = tokenizer(feedback, return_tensors="pt", padding=True, truncation=True)
-            translated = model.generate(**inputs)
-            translated_text = tokenizer.decode(translated[0], skip_special_tokens=True)
+        except Exception as e:
+            print(f"Error in translate_feedback: {str(e)}")
+            raise
+
+    def translate_feedback_all(self, feedback, languages=None):
+        """Translate feedback into several languages, splitting it only once"""
+        try:
+            languages = languages or self.supported_languages
+            for language in languages:
+                if language not in self.supported_languages:
+                    raise ValueError(f"Unsupported language: {language}")
+
+            paragraphs = self._split_sentences(feedback)
+            sentences = [sentence for paragraph in paragraphs for sentence in paragraph]
 
-            return translated_text
+            return {
+                language: self._join_sentences(paragraphs, self._translate_sentences(sentences, language))
+                for language in languages
+            }
 
         except Exception as e:
-            print(f"Error in translate_feedback: {str(e)}")
+            print(f"Error in translate_feedback_all: {str(e)}")
             raise
 
+    def _split_sentences(self, text):
+        """Split text into paragraphs (lines) of sentences"""
+        paragraphs = []
+        for line in text.splitlines():
+            sentences = []
+            for sentence in self._sentence_boundary.split(line.strip()):
+                if not sentence:
+                    continue
+                # Keep list markers such as "1." attached to the item they number
+                if sentences and self._list_marker.match(sentences[-1]):
+                    sentences[-1] = f"{sentences[-1]} {sentence}"
+                else:
+                    sentences.append(sentence)
+            paragraphs.append(sentences)
+        return paragraphs
+
+    def _join_sentences(self, paragraphs, translations):
+        return '\n'.join(
+            ' '.join(translations[sentence] for sentence in paragraph)
+            for paragraph in paragraphs
+        )
+
+    def _translate_sentences(self, sentences, language):
+        """Translate sentences in padded batches, reusing cached translations"""
+        translations = {}
+        pending = []
+        for sentence in dict.fromkeys(sentences):
+            cached = self.translation_cache.get((language, sentence))
+            if cached is None:
+                pending.append(sentence)
+            else:
+                translations[sentence] = cached
+
+        if not pending:
+            return translations
+
+        model, tokenizer = self._get_translation_model(language)
+
+        # Sort by length so each batch pads to a similar size
+        pending.sort(key=len)
+        start = time.perf_counter()
+        for i in range(0, len(pending), self.translation_batch_size):
+            batch = pending[i:i + self.translation_batch_size]
+
+            # Tokenize and translate
+            inputs = tokenizer(batch, return_tensors="pt", padding=True, truncation=True)
+            with torch.no_grad():
+                translated = model.generate(**inputs)
+            decoded = tokenizer.batch_decode(translated, skip_special_tokens=True)
+
+            for sentence, translated_text in zip(batch, decoded):
+                translations[sentence] = translated_text
+                self.translation_cache.set((language, sentence), translated_text)
+
+        with self._translation_stats_lock:
+            self._sentences_translated += len(pending)
+            self._translation_seconds += time.perf_counter() - start
+
+        return translations
+
+    def get_translation_stats(self):
+        """Report translation throughput and sentence cache effectiveness"""
+        with self._translation_stats_lock:
+            sentences = self._sentences_translated
+            seconds = self._translation_seconds
+        return {
+            'sentences_translated': sentences,
+            'translation_seconds': round(seconds, 3),
+            'sentences_per_second': round(sentences / seconds, 2) if seconds else 0.0,
+            'cache': self.translation_cache.stats()
+        }
+
+    def _get_translation_model(self, language):
+        """Get the MarianMT model and tokenizer for a language, loading them on first use"""
+        def load():
+            model_name = f'Helsinki-NLP/opus-mt-en-{language}'
+            model, tokenizer = load_marian(model_name, self.translation_backend)
+
+            # Optionally verify the selected backend against fp32 before serving with it
+            if self.translation_backend != 'torch' and parity_check_enabled():
+                report = check_marian_parity(model_name, self.translation_backend, candidate=(model, tokenizer))
+                if not report['passed']:
+                    print(f"Parity check failed for {model_name} ({self.translation_backend}): {report}; using torch")
+                    return load_marian(model_name, 'torch')
+            return model, tokenizer
+
+        return self.models.get(f'marian-en-{language}', load)
+
+    @property
+    def translation_models(self):
+        return {lang: self._get_translation_model(lang)[0] for lang in self.supported_languages}
+
+    @property
+    def translation_tokenizers(self):
+        return {lang: self._get_translation_model(lang)[1] for lang in self.supported_languages}
+
+    def warm_up(self, languages=None):
+        """Preload translation models so the first request does not pay for them"""
+        for lang in languages or self.supported_languages:
+            self._get_translation_model(lang)
+
+    def get_model_load_stats(self):
+        return self.models.stats()
+
+    @property
+    def tts_backend(self):
+        # Created on first use; audio feedback is optional for text evaluation
+        if self._tts_backend is None:
+            self._tts_backend = create_tts_backend()
+        return self._tts_backend
+
     def generate_audio_feedback(self, feedback, voice_id='default'):
         """Generate audio version of feedback using ElevenLabs"""
         try:
-            audio = generate(
-                text=feedback,
-                voice=voice_id,
-                model="eleven_monolingual_v1"
+            model = "eleven_monolingual_v1"
+            backend = self.tts_backend
+
+            # Identical feedback is synthesized once across workers and restarts
+            cached = get_tts_cache().get_or_create(
+                tts_cache_key(feedback, voice_id, model=f"{backend.name}:{model}"),
+                lambda: backend.synthesize(feedback, voice_id, model),
+                metadata={'voice_id': voice_id, 'text_length': len(feedback)},
+                extension=backend.extension
             )
 
-            # Generate unique filename
-            filename = f"feedback_{hash(feedback)}.mp3"
-            filepath = os.path.join('audio_cache', filename)
-            
-            # Save audio file
-            save(audio, filepath)
-            
-            return filepath
+            return cached.path
 
         except Exception as e:
             print(f"Error in generate_audio_feedback: {str(e)}")
             raise
 
+    def _perturbations(self, text, num_samples):
+        """Draw one LIME neighbourhood of num_samples word-removal masks; row 0 is the original text"""
+        indexed = IndexedString(
+            text,
+            bow=self.explainer.bow,
+            split_expression=self.explainer.split_expression,
+            mask_string=self.explainer.mask_string
+        )
+        doc_size = indexed.num_words()
+        random_state = self.explainer.random_state
+        sizes = random_state.randint(1, doc_size + 1, num_samples - 1)
+        masks = numpy.ones((num_samples, doc_size))
+        texts = [indexed.raw_string()]
+        for row, size in enumerate(sizes, start=1):
+            inactive = random_state.choice(doc_size, size, replace=False)
+            masks[row, inactive] = 0
+            texts.append(indexed.inverse_removing(inactive))
+        return indexed, masks, texts
+
+    def _lime_weights(self, indexed, masks, texts, predictor, num_samples, label=1):
+        """Fit LIME's local model on the first num_samples perturbations"""
+        data = masks[:num_samples]
+        labels = predictor(texts[:num_samples])
+        distances = pairwise_distances(data, data[:1], metric='cosine').ravel() * 100
+        _, features, _, _ = self.explainer.base.explain_instance_with_data(
+            data,
+            labels,
+            distances,
+            label,
+            num_features=6,
+            feature_selection=self.explainer.feature_selection
+        )
+        return [(indexed.word(feature), weight) for feature, weight in features]
+
     def _generate_explanation(self, text, feedback):
         """Generate explanation for the feedback using LIME"""
         try:
-            # Define prediction function for LIME
-            def predictor(texts):
-                # Simplified scoring based on feedback sentiment
-                scores = []
-                for t in texts:
-                    response = openai.ChatCompletion.create(
-                        model="gpt-4",
-                        messages=[
-                            {"role": "system", "content": "Rate the following text on a scale of 0-3 (0=poor, 1=fair, 2=good, 3=excellent). Return only the number."},
-                            {"role": "user", "content": t}
-                        ],
-                        temperature=0
-                    )
-                    score = int(response.choices[0].message.content)
-                    scores.append([1 if i == score else 0 for i in range(4)])
-                return numpy.array(scores)
-
-            # Generate explanation
-            exp = self.explainer.explain_instance(
-                text,
-                predictor,
-                num_features=6,
-                num_samples=100
-            )
+            # Score every perturbation of a round in one batched pass
+            predictor = self.explanation_scorer.predictor()
+
+            # Every round is a prefix of one perturbation set, so growing the
+            # sample only scores the new perturbations and the total number of
+            # texts scored never exceeds explanation_max_samples
+            indexed, masks, texts = self._perturbations(text, self.explanation_max_samples)
+
+            # Double the sample count until feature weights stop moving
+            num_samples = min(self.explanation_min_samples, self.explanation_max_samples)
+            previous_weights = None
+            while True:
+                features = self._lime_weights(indexed, masks, texts, predictor, num_samples)
+                weights = dict(features)
+                if previous_weights is not None and weights_converged(
+                    previous_weights, weights, self.explanation_tolerance
+                ):
+                    break
+                if num_samples >= self.explanation_max_samples:
+                    break
+                previous_weights = weights
+                num_samples = min(num_samples * 2, self.explanation_max_samples)
 
             # Format explanation
             explanation = {
                 'important_phrases': [],
-                'impact_scores': []
+                'impact_scores': [],
+                'num_samples': num_samples,
+                'samples_scored': predictor.samples_scored
             }
 
-            for feat, score in exp.as_list():
+            for feat, score in features:
                 explanation['important_phrases'].append(feat)
                 explanation['impact_scores'].append(float(score))
 
@@ -153,7 +336,7 @@ class TextEvaluator:
     def get_confidence_score(self, feedback):
         """Calculate confidence score for the feedback"""
         try:
-            response = openai.ChatCompletion.create(
+            response = chat_completion(
                 model="gpt-4",
                 messages=[
                     {"role": "system", "content": "Rate the confidence level of this feedback on a scale of 0-1. Consider factors like specificity, relevance, and actionability. Return only the number."},
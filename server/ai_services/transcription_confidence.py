@@ -0,0 +1,57 @@
+import numpy as np
+from typing import Any, Dict, List, Sequence, Tuple
+
+# Segments scoring below this are re-transcribed or escalated
+LOW_CONFIDENCE_THRESHOLD = 0.5
+
+def segment_confidences(segments: Sequence[Dict[str, Any]]) -> np.ndarray:
+    """Per-segment confidence in [0, 1] from Whisper's decoder statistics
+
+    exp(avg_logprob) is the geometric-mean token probability. Where the
+    backend returns word timings, it is averaged (geometrically) with the mean
+    word probability. The result is scaled by the probability that the
+    segment contains speech at all (1 - no_speech_prob).
+    """
+    if not segments:
+        return np.zeros(0)
+
+    avg_logprob = np.array([segment.get('avg_logprob', -np.inf) for segment in segments], dtype=np.float64)
+    no_speech_prob = np.array([segment.get('no_speech_prob', 0.0) for segment in segments], dtype=np.float64)
+    word_prob = np.array([
+        np.mean([word['probability'] for word in segment['words']]) if segment.get('words') else np.nan
+        for segment in segments
+    ], dtype=np.float64)
+
+    token_confidence = np.exp(np.minimum(avg_logprob, 0.0))
+    combined = np.where(np.isnan(word_prob), token_confidence, np.sqrt(token_confidence * np.nan_to_num(word_prob)))
+    return np.clip(combined * (1.0 - no_speech_prob), 0.0, 1.0)
+
+def score_segments(
+    segments: List[Dict[str, Any]],
+    threshold: float = LOW_CONFIDENCE_THRESHOLD
+) -> Tuple[float, List[int]]:
+    """Annotate segments with confidence / low_confidence and return the overall score
+
+    The overall score is the duration-weighted mean over segments with text,
+    so silent stretches neither inflate nor drag down the result. Returns
+    (confidence, positions of low-confidence segments).
+    """
+    confidences = segment_confidences(segments)
+    if not len(confidences):
+        return 0.0, []
+
+    durations = np.array([max(segment['end'] - segment['start'], 0.0) for segment in segments], dtype=np.float64)
+    has_text = np.array([bool(segment.get('text', '').strip()) for segment in segments])
+    low = has_text & (confidences < threshold)
+
+    for segment, confidence, is_low in zip(segments, confidences, low):
+        segment['confidence'] = round(float(confidence), 4)
+        segment['low_confidence'] = bool(is_low)
+
+    weights = durations * has_text
+    if weights.sum() == 0:
+        # No timing information (or no text): fall back to a plain mean
+        weights = has_text.astype(np.float64)
+    overall = float(np.average(confidences, weights=weights)) if weights.sum() else 0.0
+
+    return round(overall, 4), [int(position) for position in np.flatnonzero(low)]
@@ -0,0 +1,264 @@
+import os
+import numpy as np
+import torch
+import whisper
+from whisper.timing import add_word_timestamps
+from whisper.tokenizer import get_tokenizer
+from dataclasses import dataclass
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+from .batching import MicroBatcher
+
+SAMPLE_RATE = whisper.audio.SAMPLE_RATE
+MAX_CHUNK_SECONDS = whisper.audio.CHUNK_LENGTH  # Whisper's 30 s context window
+
+# Whisper's own fallback thresholds (see whisper.transcribe)
+FALLBACK_TEMPERATURES = (0.2, 0.4, 0.6, 0.8, 1.0)
+COMPRESSION_RATIO_THRESHOLD = 2.4
+LOGPROB_THRESHOLD = -1.0
+NO_SPEECH_THRESHOLD = 0.6
+
+@dataclass
+class AudioChunk:
+    index: int
+    start: float
+    end: float
+    samples: np.ndarray
+
+def split_on_silence(
+    audio: np.ndarray,
+    max_chunk_seconds: float = MAX_CHUNK_SECONDS,
+    min_chunk_seconds: float = 5.0,
+    frame_ms: int = 30
+) -> List[AudioChunk]:
+    """Split audio into chunks of at most max_chunk_seconds, cutting at the quietest frame
+
+    A lightweight energy VAD: frame RMS is computed in one vectorized pass and
+    each cut is placed at the lowest-energy frame between min_chunk_seconds
+    and max_chunk_seconds after the previous cut, so words are not split.
+    """
+    frame = int(SAMPLE_RATE * frame_ms / 1000)
+    n_frames = len(audio) // frame
+    if n_frames == 0:
+        return [AudioChunk(0, 0.0, len(audio) / SAMPLE_RATE, audio)] if len(audio) else []
+
+    rms = np.sqrt(np.mean(np.square(audio[:n_frames * frame].reshape(n_frames, frame), dtype=np.float64), axis=1))
+
+    max_frames = int(max_chunk_seconds * 1000 / frame_ms)
+    min_frames = int(min_chunk_seconds * 1000 / frame_ms)
+
+    cuts = [0]
+    while n_frames - cuts[-1] > max_frames:
+        window_start = cuts[-1] + min_frames
+        window = rms[window_start:cuts[-1] + max_frames]
+        # Last quietest frame in the window, to keep chunks as long as allowed
+        quietest = len(window) - 1 - int(np.argmin(window[::-1]))
+        cuts.append(window_start + quietest)
+    cuts.append(n_frames)
+
+    chunks = []
+    for index, (first, last) in enumerate(zip(cuts[:-1], cuts[1:])):
+        start_sample = first * frame
+        end_sample = len(audio) if last == n_frames else last * frame
+        chunks.append(AudioChunk(
+            index=index,
+            start=start_sample / SAMPLE_RATE,
+            end=end_sample / SAMPLE_RATE,
+            samples=audio[start_sample:end_sample]
+        ))
+    return chunks
+
+class TranscriptionEngine:
+    """Chunked Whisper transcription with chunks from concurrent requests decoded in batches"""
+
+    def __init__(
+        self,
+        model_provider: Callable[[], Any],
+        max_batch_size: int = 8,
+        max_wait_ms: float = 20.0,
+        word_timestamps: bool = True
+    ):
+        self._model_provider = model_provider
+        # Word timings come from a cross-attention alignment pass after decoding
+        self.word_timestamps = word_timestamps
+        self.batcher = MicroBatcher(
+            self._decode_batch,
+            max_batch_size=max_batch_size,
+            max_wait_ms=max_wait_ms,
+            name='whisper-batcher'
+        )
+
+    @classmethod
+    def from_env(cls, model_provider: Callable[[], Any]) -> 'TranscriptionEngine':
+        return cls(
+            model_provider,
+            max_batch_size=int(os.getenv('WHISPER_MAX_BATCH_SIZE', '8')),
+            max_wait_ms=float(os.getenv('WHISPER_MAX_WAIT_MS', '20')),
+            word_timestamps=os.getenv('WHISPER_WORD_TIMESTAMPS', 'true').lower() == 'true'
+        )
+
+    @property
+    def model(self) -> Any:
+        return self._model_provider()
+
+    def _mel(self, samples: np.ndarray) -> torch.Tensor:
+        model = self.model
+        return whisper.log_mel_spectrogram(
+            whisper.pad_or_trim(samples),
+            n_mels=model.dims.n_mels
+        ).to(model.device)
+
+    def _decode_batch(self, items: Sequence[Tuple[torch.Tensor, Tuple, int]]) -> List[Tuple[Any, List[Dict[str, Any]]]]:
+        """Decode mel spectrograms, one whisper.decode call per distinct set of options
+
+        Each result comes with its word timings (empty when disabled). Alignment
+        runs here, on the batcher thread, because it hooks the shared model's
+        attention layers and must not overlap another decode.
+        """
+        model = self.model
+        results: List[Any] = [None] * len(items)
+
+        groups: Dict[Tuple, List[int]] = {}
+        for position, (_, options, _) in enumerate(items):
+            groups.setdefault(options, []).append(position)
+
+        for options, positions in groups.items():
+            mel = torch.stack([items[p][0] for p in positions])
+            decoded = whisper.decode(model, mel, whisper.DecodingOptions(**dict(options)))
+            for position, result in zip(positions, decoded):
+                chunk_mel, _, num_frames = items[position]
+                words = self._align_words(result, chunk_mel, num_frames, dict(options)) if self.word_timestamps else []
+                results[position] = (result, words)
+        return results
+
+    def _align_words(self, result: Any, mel: torch.Tensor, num_frames: int, options: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Word timings (relative to the chunk) for a decoded chunk, as whisper.transcribe computes them"""
+        model = self.model
+        tokenizer_options = {'num_languages': model.num_languages} if hasattr(model, 'num_languages') else {}
+        tokenizer = get_tokenizer(
+            model.is_multilingual,
+            language=options['language'],
+            task=options['task'],
+            **tokenizer_options
+        )
+        if not any(token < tokenizer.eot for token in result.tokens):
+            return []
+
+        segment = {
+            'seek': 0,
+            'start': 0.0,
+            'end': num_frames * whisper.audio.HOP_LENGTH / SAMPLE_RATE,
+            'tokens': list(result.tokens)
+        }
+        add_word_timestamps(
+            segments=[segment],
+            model=model,
+            tokenizer=tokenizer,
+            mel=mel,
+            num_frames=num_frames,
+            last_speech_timestamp=0.0
+        )
+        return segment.get('words', [])
+
+    def _options(self, language: str, task: str, temperature: float) -> Tuple:
+        return tuple(sorted({
+            'language': language,
+            'task': task,
+            'temperature': temperature,
+            'without_timestamps': True,
+            'fp16': self.model.device.type != 'cpu'
+        }.items()))
+
+    def detect_language(self, chunk: AudioChunk) -> Tuple[str, float]:
+        """Detect the spoken language from a single chunk's mel spectrogram"""
+        _, probs = self.model.detect_language(self._mel(chunk.samples))
+        language = max(probs, key=probs.get)
+        return language, float(probs[language])
+
+    def _needs_fallback(self, result: Any) -> bool:
+        if result.no_speech_prob > NO_SPEECH_THRESHOLD and result.avg_logprob < LOGPROB_THRESHOLD:
+            return False  # Silence: nothing better to find
+        return result.compression_ratio > COMPRESSION_RATIO_THRESHOLD or result.avg_logprob < LOGPROB_THRESHOLD
+
+    def _decode_chunk(self, mel: torch.Tensor, num_frames: int, language: str, task: str, first: Future) -> Tuple[Any, List[Dict[str, Any]]]:
+        """Wait for a chunk's greedy decode, retrying at higher temperatures if it looks degenerate"""
+        result, words = first.result()
+        for temperature in FALLBACK_TEMPERATURES:
+            if not self._needs_fallback(result):
+                break
+            result, words = self.batcher((mel, self._options(language, task, temperature), num_frames))
+        return result, words
+
+    def transcribe_stream(
+        self,
+        audio: Union[str, np.ndarray],
+        task: Optional[str] = None,
+        language: Optional[str] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """Yield Whisper-style segment dicts in order as each chunk finishes decoding
+
+        The first yielded item is a header {'language': ..., 'language_probability': ...,
+        'duration': ...}; every following item is one segment.
+        """
+        if isinstance(audio, str):
+            audio = whisper.load_audio(audio)
+        task = task or 'transcribe'
+
+        chunks = split_on_silence(audio)
+        if not chunks:
+            yield {'language': language or 'en', 'language_probability': 0.0, 'duration': 0.0}
+            return
+
+        # Detect language on the first chunk only
+        language_probability = 1.0
+        if language is None:
+            language, language_probability = self.detect_language(chunks[0])
+        yield {
+            'language': language,
+            'language_probability': language_probability,
+            'duration': len(audio) / SAMPLE_RATE
+        }
+
+        # Queue every chunk up front so they batch with each other and other requests
+        mels = [self._mel(chunk.samples) for chunk in chunks]
+        frames = [min(len(chunk.samples) // whisper.audio.HOP_LENGTH, whisper.audio.N_FRAMES) for chunk in chunks]
+        futures = [
+            self.batcher.submit((mel, self._options(language, task, 0.0), num_frames))
+            for mel, num_frames in zip(mels, frames)
+        ]
+
+        for chunk, mel, num_frames, future in zip(chunks, mels, frames, futures):
+            result, words = self._decode_chunk(mel, num_frames, language, task, future)
+            yield {
+                'id': chunk.index,
+                'start': chunk.start,
+                'end': chunk.end,
+                'text': result.text,
+                'tokens': result.tokens,
+                'temperature': result.temperature,
+                'avg_logprob': result.avg_logprob,
+                'compression_ratio': result.compression_ratio,
+                'no_speech_prob': result.no_speech_prob,
+                'words': [
+                    {**word, 'start': round(word['start'] + chunk.start, 2), 'end': round(word['end'] + chunk.start, 2)}
+                    for word in words
+                ]
+            }
+
+    def transcribe(
+        self,
+        audio: Union[str, np.ndarray],
+        task: Optional[str] = None,
+        language: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Transcribe a whole recording, returning a dict shaped like whisper's transcribe()"""
+        stream = self.transcribe_stream(audio, task, language)
+        header = next(stream)
+        segments = list(stream)
+        return {
+            'text': ' '.join(segment['text'].strip() for segment in segments if segment['text'].strip()),
+            'segments': segments,
+            'language': header['language'],
+            'language_probability': header['language_probability'],
+            'duration': header['duration']
+        }
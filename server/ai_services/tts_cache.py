@@ -0,0 +1,358 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import struct
+import tempfile
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional
+from .audio_probe import probe_duration
+
+def tts_cache_key(
+    text: str,
+    voice: str,
+    language: Optional[str] = None,
+    emotion: Optional[str] = None,
+    model: Optional[str] = None
+) -> str:
+    """Stable digest of everything that determines the synthesized audio
+
+    Unlike hash(), this is the same in every worker and across restarts.
+    """
+    payload = json.dumps(
+        {'text': text, 'voice': voice, 'language': language, 'emotion': emotion, 'model': model},
+        sort_keys=True,
+        ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def _probe_or_zero(path: str) -> float:
+    try:
+        return probe_duration(path)
+    except (OSError, ValueError, struct.error) as e:
+        print(f"Error probing audio duration: {str(e)}")
+        return 0.0
+
+@dataclass
+class CachedAudio:
+    key: str
+    path: str
+    duration: float
+    size_bytes: int
+    metadata: Dict[str, Any]
+    cache_hit: bool = False
+
+class TTSCache:
+    """Content-addressed audio cache with an SQLite index and LRU / byte-budget eviction
+
+    Files are written to a temporary name and moved into place with
+    os.replace, so readers never see a partial file and concurrent writers of
+    the same key both leave a complete one. Within a process, a striped lock
+    per key makes concurrent requests for the same audio synthesize it once.
+    """
+
+    def __init__(
+        self,
+        cache_dir: str = 'audio_cache',
+        max_bytes: int = 512 * 1024 * 1024,
+        max_entries: Optional[int] = None,
+        index_path: Optional[str] = None,
+        lock_stripes: int = 64
+    ):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._locks = [threading.Lock() for _ in range(lock_stripes)]
+        self._index_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._conn = sqlite3.connect(
+            index_path or str(self.cache_dir / 'index.sqlite3'),
+            timeout=30,
+            check_same_thread=False
+        )
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS audio ('
+            'key TEXT PRIMARY KEY, filename TEXT NOT NULL, duration REAL NOT NULL, '
+            'size_bytes INTEGER NOT NULL, metadata TEXT NOT NULL, '
+            'created_at REAL NOT NULL, last_access REAL NOT NULL)'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS audio_last_access ON audio (last_access)')
+        self._conn.commit()
+
+    @classmethod
+    def from_env(cls) -> 'TTSCache':
+        max_entries = int(os.getenv('TTS_CACHE_MAX_ENTRIES', '0'))
+        return cls(
+            cache_dir=os.getenv('TTS_CACHE_DIR', 'audio_cache'),
+            max_bytes=int(os.getenv('TTS_CACHE_MAX_MB', '512')) * 1024 * 1024,
+            max_entries=max_entries or None,
+            index_path=os.getenv('TTS_CACHE_INDEX') or None
+        )
+
+    def _lock_for(self, key: str) -> threading.Lock:
+        return self._locks[int(key[:8], 16) % len(self._locks)]
+
+    def _filename(self, key: str, extension: str) -> str:
+        return f"feedback_{key}.{extension}"
+
+    def _lookup(self, key: str) -> Optional[CachedAudio]:
+        with self._index_lock:
+            row = self._conn.execute(
+                'SELECT filename, duration, size_bytes, metadata FROM audio WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None:
+                return None
+
+            filename, duration, size_bytes, metadata = row
+            path = self.cache_dir / filename
+            if not path.exists():
+                # Removed behind our back (another worker evicted it, manual cleanup)
+                self._conn.execute('DELETE FROM audio WHERE key = ?', (key,))
+                self._conn.commit()
+                return None
+
+            metadata = json.loads(metadata)
+            if duration <= 0:
+                # Indexed before durations were probed; fill it in once
+                duration = metadata['duration'] = _probe_or_zero(str(path))
+                self._conn.execute(
+                    'UPDATE audio SET duration = ?, metadata = ? WHERE key = ?',
+                    (duration, json.dumps(metadata, ensure_ascii=False), key)
+                )
+            self._conn.execute('UPDATE audio SET last_access = ? WHERE key = ?', (time.time(), key))
+            self._conn.commit()
+
+        return CachedAudio(
+            key=key,
+            path=str(path),
+            duration=duration,
+            size_bytes=size_bytes,
+            metadata=metadata,
+            cache_hit=True
+        )
+
+    def _count(self, cached: Optional[CachedAudio]) -> Optional[CachedAudio]:
+        with self._index_lock:
+            if cached is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return cached
+
+    def get(self, key: str) -> Optional[CachedAudio]:
+        """Look up a cached file, refreshing its last-access time"""
+        return self._count(self._lookup(key))
+
+    def _index(
+        self,
+        key: str,
+        filename: str,
+        size_bytes: int,
+        metadata: Optional[Dict[str, Any]],
+        duration_fn: Optional[Callable[[str], float]]
+    ) -> CachedAudio:
+        path = self.cache_dir / filename
+
+        # Probed once here from the file's headers and kept in the index
+        duration = (duration_fn or _probe_or_zero)(str(path))
+        metadata = dict(metadata or {})
+        metadata['duration'] = duration
+        now = time.time()
+        with self._index_lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO audio '
+                '(key, filename, duration, size_bytes, metadata, created_at, last_access) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (key, filename, duration, size_bytes, json.dumps(metadata, ensure_ascii=False), now, now)
+            )
+            self._conn.commit()
+        self.evict()
+
+        return CachedAudio(
+            key=key,
+            path=str(path),
+            duration=duration,
+            size_bytes=size_bytes,
+            metadata=metadata
+        )
+
+    def put(
+        self,
+        key: str,
+        data: bytes,
+        metadata: Optional[Dict[str, Any]] = None,
+        extension: str = 'mp3',
+        duration_fn: Optional[Callable[[str], float]] = None
+    ) -> CachedAudio:
+        """Atomically write audio bytes into the cache and index them"""
+        filename = self._filename(key, extension)
+
+        fd, temp_path = tempfile.mkstemp(dir=str(self.cache_dir), prefix='.tmp-', suffix=f'.{extension}')
+        try:
+            with os.fdopen(fd, 'wb') as temp_file:
+                temp_file.write(data)
+            os.replace(temp_path, self.cache_dir / filename)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+
+        return self._index(key, filename, len(data), metadata, duration_fn)
+
+    def stream(
+        self,
+        key: str,
+        synthesize_stream: Callable[[], Iterable[bytes]],
+        metadata: Optional[Dict[str, Any]] = None,
+        extension: str = 'mp3',
+        chunk_size: int = 64 * 1024
+    ) -> Iterator[bytes]:
+        """Yield cached audio, or stream freshly synthesized chunks while teeing them into the cache
+
+        The file is only indexed once the stream completes; if the consumer
+        stops early (client disconnect) the partial file is discarded.
+        Concurrent streams of the same key do not wait for each other, and
+        whichever finishes last replaces the file atomically.
+        """
+        cached = self.get(key)
+        if cached is not None:
+            with open(cached.path, 'rb') as audio_file:
+                while True:
+                    chunk = audio_file.read(chunk_size)
+                    if not chunk:
+                        return
+                    yield chunk
+
+        filename = self._filename(key, extension)
+        fd, temp_path = tempfile.mkstemp(dir=str(self.cache_dir), prefix='.tmp-', suffix=f'.{extension}')
+        size_bytes = 0
+        try:
+            with os.fdopen(fd, 'wb') as temp_file:
+                for chunk in synthesize_stream():
+                    temp_file.write(chunk)
+                    size_bytes += len(chunk)
+                    yield chunk
+            os.replace(temp_path, self.cache_dir / filename)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+
+        self._index(key, filename, size_bytes, metadata, None)
+
+    def get_or_create(
+        self,
+        key: str,
+        synthesize: Callable[[], bytes],
+        metadata: Optional[Dict[str, Any]] = None,
+        extension: str = 'mp3',
+        duration_fn: Optional[Callable[[str], float]] = None
+    ) -> CachedAudio:
+        """Return the cached audio for key, synthesizing and storing it on a miss"""
+        cached = self._lookup(key)
+        if cached is not None:
+            return self._count(cached)
+
+        with self._lock_for(key):
+            # Another thread may have produced it while we waited for the lock
+            cached = self._count(self._lookup(key))
+            if cached is not None:
+                return cached
+            return self.put(key, synthesize(), metadata, extension, duration_fn)
+
+    def _delete_rows(self, rows) -> None:
+        for key, filename in rows:
+            try:
+                (self.cache_dir / filename).unlink()
+            except FileNotFoundError:
+                pass
+            self._conn.execute('DELETE FROM audio WHERE key = ?', (key,))
+            self.evictions += 1
+        self._conn.commit()
+
+    def evict(self) -> int:
+        """Drop least recently used entries until within the byte and entry budgets"""
+        with self._index_lock:
+            total_bytes, count = self._conn.execute(
+                'SELECT COALESCE(SUM(size_bytes), 0), COUNT(*) FROM audio'
+            ).fetchone()
+            if total_bytes <= self.max_bytes and (self.max_entries is None or count <= self.max_entries):
+                return 0
+
+            victims = []
+            for key, filename, size_bytes in self._conn.execute(
+                'SELECT key, filename, size_bytes FROM audio ORDER BY last_access ASC'
+            ).fetchall():
+                if total_bytes <= self.max_bytes and (self.max_entries is None or count <= self.max_entries):
+                    break
+                victims.append((key, filename))
+                total_bytes -= size_bytes
+                count -= 1
+
+            self._delete_rows(victims)
+            return len(victims)
+
+    def clean(self, max_age_seconds: Optional[float] = None) -> int:
+        """Drop entries not accessed within max_age_seconds, then enforce the budgets
+
+        Also removes stray audio files that are not in the index (interrupted
+        writes, files from before the index existed) once they are that old.
+        """
+        removed = 0
+        now = time.time()
+        if max_age_seconds is not None:
+            with self._index_lock:
+                stale = self._conn.execute(
+                    'SELECT key, filename FROM audio WHERE last_access < ?', (now - max_age_seconds,)
+                ).fetchall()
+                self._delete_rows(stale)
+                removed += len(stale)
+
+                indexed = {row[0] for row in self._conn.execute('SELECT filename FROM audio')}
+            for path in self.cache_dir.iterdir():
+                if not path.is_file() or path.name in indexed or path.name.startswith('index.sqlite3'):
+                    continue
+                if path.stat().st_mtime < now - max_age_seconds:
+                    try:
+                        path.unlink()
+                        removed += 1
+                    except FileNotFoundError:
+                        pass
+
+        return removed + self.evict()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._index_lock:
+            total_bytes, count = self._conn.execute(
+                'SELECT COALESCE(SUM(size_bytes), 0), COUNT(*) FROM audio'
+            ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            'entries': count,
+            'bytes': total_bytes,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0
+        }
+
+_tts_cache: Optional[TTSCache] = None
+_tts_cache_lock = threading.Lock()
+
+def get_tts_cache() -> TTSCache:
+    """Process-wide TTS cache shared by the audio and text services"""
+    global _tts_cache
+    if _tts_cache is None:
+        with _tts_cache_lock:
+            if _tts_cache is None:
+                _tts_cache = TTSCache.from_env()
+    return _tts_cache
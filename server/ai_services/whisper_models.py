@@ -0,0 +1,203 @@
+import os
+import threading
+import numpy as np
+import whisper
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+from .lazy_loading import LazyModelLoader
+from .transcription_engine import TranscriptionEngine, SAMPLE_RATE
+
+WHISPER_BACKENDS = ('openai', 'ctranslate2')
+
+# Smallest to largest; low-confidence segments escalate one step up
+MODEL_SIZES = ('tiny', 'base', 'small', 'medium', 'large')
+
+# Requested quality -> model size
+QUALITY_TIERS = {
+    'fast': 'base',
+    'balanced': 'small',
+    'accurate': 'medium'
+}
+
+def _parse_duration_tiers(spec: str) -> List[Tuple[float, str]]:
+    """Parse "30:base,120:small" into [(30.0, 'base'), (120.0, 'small')]"""
+    tiers = []
+    for part in spec.split(','):
+        if part.strip():
+            seconds, size = part.split(':')
+            tiers.append((float(seconds), size.strip()))
+    return sorted(tiers)
+
+class FasterWhisperEngine:
+    """CTranslate2 (faster-whisper) transcription, int8 on CPU by default
+
+    Exposes the same transcribe / transcribe_stream interface as
+    TranscriptionEngine. faster-whisper does its own VAD chunking and yields
+    segments lazily, so streaming comes for free.
+    """
+
+    def __init__(self, model: Any):
+        self.model = model
+
+    @classmethod
+    def load(cls, size: str, compute_type: str = 'int8', cpu_threads: int = 0) -> 'FasterWhisperEngine':
+        from faster_whisper import WhisperModel
+        return cls(WhisperModel(size, device='cpu', compute_type=compute_type, cpu_threads=cpu_threads))
+
+    def transcribe_stream(
+        self,
+        audio: Union[str, np.ndarray],
+        task: Optional[str] = None,
+        language: Optional[str] = None
+    ) -> Iterator[Dict[str, Any]]:
+        segments, info = self.model.transcribe(
+            audio,
+            task=task or 'transcribe',
+            language=language,
+            vad_filter=True,
+            word_timestamps=True
+        )
+        yield {
+            'language': info.language,
+            'language_probability': info.language_probability,
+            'duration': info.duration
+        }
+        for segment in segments:
+            yield {
+                'id': segment.id,
+                'start': segment.start,
+                'end': segment.end,
+                'text': segment.text,
+                'tokens': list(segment.tokens),
+                'temperature': segment.temperature,
+                'avg_logprob': segment.avg_logprob,
+                'compression_ratio': segment.compression_ratio,
+                'no_speech_prob': segment.no_speech_prob,
+                'words': [
+                    {'word': w.word, 'start': w.start, 'end': w.end, 'probability': w.probability}
+                    for w in (segment.words or [])
+                ]
+            }
+
+    def transcribe(
+        self,
+        audio: Union[str, np.ndarray],
+        task: Optional[str] = None,
+        language: Optional[str] = None
+    ) -> Dict[str, Any]:
+        stream = self.transcribe_stream(audio, task, language)
+        header = next(stream)
+        segments = list(stream)
+        return {
+            'text': ' '.join(segment['text'].strip() for segment in segments if segment['text'].strip()),
+            'segments': segments,
+            'language': header['language'],
+            'language_probability': header['language_probability'],
+            'duration': header['duration']
+        }
+
+class WhisperModelRegistry:
+    """Lazily loaded Whisper models of several sizes, routed per request, with real-time-factor metrics"""
+
+    def __init__(
+        self,
+        models: LazyModelLoader,
+        backend: str = 'openai',
+        default_size: str = 'medium',
+        duration_tiers: Optional[List[Tuple[float, str]]] = None,
+        compute_type: str = 'int8'
+    ):
+        if backend not in WHISPER_BACKENDS:
+            raise ValueError(f"Unknown Whisper backend: {backend} (expected one of {', '.join(WHISPER_BACKENDS)})")
+        self.models = models
+        self.backend = backend
+        self.default_size = default_size
+        self.duration_tiers = duration_tiers or []
+        self.compute_type = compute_type
+        self._engines: Dict[str, Any] = {}
+        self._metrics: Dict[str, Dict[str, float]] = {}
+        self._metrics_lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, models: LazyModelLoader) -> 'WhisperModelRegistry':
+        return cls(
+            models,
+            backend=os.getenv('WHISPER_BACKEND', 'openai'),
+            default_size=os.getenv('WHISPER_DEFAULT_MODEL', 'medium'),
+            duration_tiers=_parse_duration_tiers(os.getenv('WHISPER_DURATION_TIERS', '30:base,120:small')),
+            compute_type=os.getenv('WHISPER_COMPUTE_TYPE', 'int8')
+        )
+
+    def select(self, duration: Optional[float] = None, quality: Optional[str] = None) -> str:
+        """Pick a model size from the requested quality, else from the audio duration"""
+        if quality is not None:
+            if quality not in QUALITY_TIERS:
+                raise ValueError(f"Unknown quality tier: {quality} (expected one of {', '.join(QUALITY_TIERS)})")
+            return QUALITY_TIERS[quality]
+        if duration is not None:
+            for max_seconds, size in self.duration_tiers:
+                if duration <= max_seconds:
+                    return size
+        return self.default_size
+
+    def larger(self, size: str) -> Optional[str]:
+        """The next model size up, or None if size is already the largest"""
+        base_size = size.split('.')[0].split('-')[0]  # "medium.en", "large-v3"
+        if base_size not in MODEL_SIZES or base_size == MODEL_SIZES[-1]:
+            return None
+        return MODEL_SIZES[MODEL_SIZES.index(base_size) + 1]
+
+    def get_model(self, size: str) -> Any:
+        """The openai-whisper model of a given size, loaded on first use"""
+        return self.models.get(f'whisper-{size}', lambda: whisper.load_model(size))
+
+    def get_engine(self, size: str) -> Any:
+        """Transcription engine for a model size on the configured backend, created on first use"""
+        if self.backend == 'ctranslate2':
+            engine = self.models.get(
+                f'whisper-{size}-ct2-{self.compute_type}',
+                lambda: FasterWhisperEngine.load(
+                    size,
+                    compute_type=self.compute_type,
+                    cpu_threads=int(os.getenv('WHISPER_CPU_THREADS', '0'))
+                )
+            )
+        else:
+            engine = self.models.get(
+                f'whisper-{size}-engine',
+                lambda: TranscriptionEngine.from_env(lambda: self.get_model(size))
+            )
+        self._engines[size] = engine
+        return engine
+
+    def record(self, size: str, audio_seconds: float, processing_seconds: float) -> None:
+        with self._metrics_lock:
+            entry = self._metrics.setdefault(size, {'calls': 0, 'audio_seconds': 0.0, 'processing_seconds': 0.0})
+            entry['calls'] += 1
+            entry['audio_seconds'] += audio_seconds
+            entry['processing_seconds'] += processing_seconds
+
+    def metrics(self) -> Dict[str, Dict[str, Any]]:
+        """Per-model call counts and real-time factor (processing time / audio time)"""
+        with self._metrics_lock:
+            metrics = {
+                size: {
+                    'backend': self.backend,
+                    'calls': entry['calls'],
+                    'audio_seconds': round(entry['audio_seconds'], 2),
+                    'processing_seconds': round(entry['processing_seconds'], 2),
+                    'real_time_factor': round(entry['processing_seconds'] / entry['audio_seconds'], 3)
+                    if entry['audio_seconds'] else None
+                }
+                for size, entry in self._metrics.items()
+            }
+
+        for size, engine in list(self._engines.items()):
+            if hasattr(engine, 'batcher'):
+                metrics.setdefault(size, {'backend': self.backend})['batching'] = engine.batcher.stats()
+        return metrics
+
+def load_audio(audio: Union[str, np.ndarray]) -> Tuple[np.ndarray, float]:
+    """Decode audio to 16 kHz mono float32 and return it with its duration in seconds"""
+    if isinstance(audio, str):
+        audio = whisper.load_audio(audio)
+    return audio, len(audio) / SAMPLE_RATE
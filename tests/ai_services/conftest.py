@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The AI services live in server/ai_services and are imported as ai_services
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'server'))
@@ -0,0 +1,59 @@
+import struct
+import wave
+import pytest
+from ai_services.audio_probe import probe_duration
+from ai_services.tts_backends import LocalStubBackend
+
+# MPEG-1 Layer III, 128 kbps, 44.1 kHz, stereo: 417-byte frames of 1152 samples
+FRAME_HEADER = b'\xff\xfb\x90\x00'
+FRAME_LENGTH = 417
+
+def _frame(payload=b''):
+    return FRAME_HEADER + payload + b'\x00' * (FRAME_LENGTH - 4 - len(payload))
+
+def _write(path, data):
+    path.write_bytes(data)
+    return str(path)
+
+def test_local_stub_mp3_duration(tmp_path):
+    backend = LocalStubBackend()
+    text = 'x' * 30  # two seconds at 15 characters per second
+    path = _write(tmp_path / 'stub.mp3', backend.synthesize(text, 'voice', 'model'))
+    assert probe_duration(path) == pytest.approx(2.0, abs=backend.FRAME_SECONDS)
+
+def test_cbr_mp3_skips_id3_tags(tmp_path):
+    id3v2 = b'ID3\x04\x00\x00\x00\x00\x01\x00' + b'\x00' * 128
+    id3v1 = b'TAG' + b'\x00' * 125
+    path = _write(tmp_path / 'tagged.mp3', id3v2 + _frame() * 100 + id3v1)
+    assert probe_duration(path) == pytest.approx(100 * FRAME_LENGTH * 8 / 128000)
+
+def test_xing_frame_count(tmp_path):
+    # Side information is 32 bytes for MPEG-1 stereo; the tag follows it
+    xing = b'\x00' * 32 + b'Xing' + struct.pack('>II', 0x01, 1000)
+    path = _write(tmp_path / 'vbr.mp3', _frame(xing) + _frame() * 10)
+    assert probe_duration(path) == pytest.approx(1000 * 1152 / 44100)
+
+def test_wav_duration(tmp_path):
+    path = str(tmp_path / 'tone.wav')
+    with wave.open(path, 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(16000)
+        wav.writeframes(b'\x00\x00' * 24000)
+    assert probe_duration(path) == pytest.approx(1.5)
+
+def test_wav_skips_unknown_chunks(tmp_path):
+    fmt = struct.pack('<HHIIHH', 1, 1, 8000, 16000, 2, 16)
+    data = b'\x00' * 8000
+    body = (
+        b'WAVE'
+        + b'LIST' + struct.pack('<I', 5) + b'info\x00\x00'
+        + b'fmt ' + struct.pack('<I', len(fmt)) + fmt
+        + b'data' + struct.pack('<I', len(data)) + data
+    )
+    path = _write(tmp_path / 'list.wav', b'RIFF' + struct.pack('<I', len(body)) + body)
+    assert probe_duration(path) == pytest.approx(0.5)
+
+def test_unsupported_format(tmp_path):
+    with pytest.raises(ValueError):
+        probe_duration(_write(tmp_path / 'notes.txt', b'not audio at all'))
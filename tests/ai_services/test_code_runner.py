@@ -0,0 +1,83 @@
+import os
+import time
+import shutil
+import pytest
+from ai_services.code_runner import CodeRunner, ResourceLimits
+
+pytestmark = pytest.mark.skipif(not hasattr(os, 'fork'), reason="sandbox needs fork()")
+
+@pytest.fixture
+def runner():
+    runner = CodeRunner(workers=2, limits=ResourceLimits(cpu_seconds=1, wall_seconds=1, memory_mb=128))
+    yield runner
+    runner.close()
+
+def test_runs_python_test_cases(runner):
+    report = runner.run_tests(
+        'a, b = map(int, input().split())\nprint(a + b)\n',
+        'python',
+        [{'input': '1 2', 'expected_output': '3'}, {'input': '2 2', 'expected_output': '5'}]
+    )
+    assert report.passed_tests == 1
+    assert [result.status for result in report.results] == ['passed', 'failed']
+
+def test_wall_clock_limit_applies_after_output_closes(runner):
+    started = time.monotonic()
+    report = runner.run_tests(
+        'import os, time\nos.close(1)\nos.close(2)\ntime.sleep(30)\n',
+        'python',
+        [{'expected_output': ''}]
+    )
+    assert report.results[0].status == 'timeout'
+    assert time.monotonic() - started < 5
+
+    # The worker is still usable afterwards
+    assert runner.run_tests('print(1)', 'python', [{'expected_output': '1'}]).passed_tests == 1
+
+def test_child_cannot_start_processes(runner):
+    report = runner.run_tests('import os\nos.fork()\nprint("forked")\n', 'python', [{'expected_output': 'forked'}])
+    assert report.results[0].status == 'error'
+
+@pytest.mark.skipif(not hasattr(os, 'geteuid') or os.geteuid() != 0, reason="privilege drop only applies to root")
+def test_root_service_runs_tests_unprivileged(runner):
+    report = runner.run_tests('import os\nprint(os.getuid())\n', 'python', [{'expected_output': '0'}])
+    assert report.results[0].status == 'failed'
+    assert report.results[0].output.strip() != '0'
+
+@pytest.mark.skipif(not hasattr(os, 'geteuid') or os.geteuid() != 0, reason="privilege drop only applies to root")
+def test_refuses_root_without_sandbox_user():
+    runner = CodeRunner(workers=1, sandbox_user='no-such-sandbox-user')
+    try:
+        with pytest.raises(RuntimeError):
+            runner.run_tests('print(1)\n', 'python', [{'expected_output': '1'}])
+    finally:
+        runner.close()
+
+def _alive(pid):
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            # Zombies are dead, just not reaped by init yet
+            return f.read().rsplit(')', 1)[1].split()[0] != 'Z'
+    except FileNotFoundError:
+        return False
+
+@pytest.mark.skipif(shutil.which('node') is None or not os.path.isdir('/proc'), reason="needs node and /proc")
+@pytest.mark.parametrize('permission_model', [True, False])
+def test_javascript_children_do_not_outlive_the_run(runner, permission_model):
+    if not permission_model:
+        # As on a node without the permission model: only rlimits and the session kill apply
+        runner._node_probed = True
+    code = (
+        "let pid = '';\n"
+        "try {\n"
+        "  const child = require('child_process').spawn('sleep', ['30'], {stdio: 'ignore'});\n"
+        "  pid = String(child.pid || '');\n"
+        "  child.unref();\n"
+        "} catch (e) {}\n"
+        "console.log(pid);\n"
+    )
+    report = runner.run_tests(code, 'javascript', [{'expected_output': ''}])
+    pid = report.results[0].output.strip()
+    if pid:
+        time.sleep(0.2)
+        assert not _alive(int(pid))
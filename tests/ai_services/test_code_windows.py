@@ -0,0 +1,60 @@
+import pytest
+from ai_services.code_windows import sliding_windows, split_code_units
+
+JAVA = '''\
+import java.util.List;
+
+public class Counter {
+    private int count = 0;
+    public int get() { return count; }
+
+    @Override
+    public String toString() {
+        return "Counter{" + count + "}";
+    }
+}
+'''
+
+def test_container_members_are_separate_units():
+    units = split_code_units(JAVA, 'java')
+    assert ''.join(units) == JAVA
+    assert [unit.strip().splitlines()[0] for unit in units] == [
+        'import java.util.List;',
+        'public class Counter {',
+        'private int count = 0;',
+        'public int get() { return count; }',
+        '@Override',
+    ]
+    # The closing brace of the class stays with its last member
+    assert units[-1].rstrip().endswith('}\n}')
+
+def test_nested_containers_and_allman_braces():
+    code = 'namespace App\n{\n    class A\n    {\n        int x;\n        void f()\n        {\n        }\n    }\n}\n'
+    units = split_code_units(code, 'csharp')
+    assert ''.join(units) == code
+    assert [unit.strip().splitlines()[0] for unit in units] == [
+        'namespace App', 'class A', 'int x;', 'void f()'
+    ]
+
+def test_top_level_javascript_functions():
+    code = 'function a() {\n  if (x) { return 1; }\n  return 2;\n}\nfunction b() {\n  return "}";\n}\n'
+    units = split_code_units(code, 'javascript')
+    assert units == ['function a() {\n  if (x) { return 1; }\n  return 2;\n}\n', 'function b() {\n  return "}";\n}\n']
+
+def test_python_methods_are_units():
+    code = 'import os\n\nclass A:\n    def f(self):\n        pass\n\n    def g(self):\n        pass\n'
+    units = split_code_units(code, 'python')
+    assert ''.join(units) == code
+    assert sum('def ' in unit for unit in units) == 2
+    assert all(unit.count('def ') <= 1 for unit in units)
+
+def test_sliding_windows_cover_every_token():
+    tokens = list(range(10))
+    windows = sliding_windows(tokens, size=4, stride=3)
+    assert windows == [[0, 1, 2, 3], [3, 4, 5, 6], [6, 7, 8, 9]]
+    assert sliding_windows(tokens[:3], size=4, stride=3) == [[0, 1, 2]]
+
+@pytest.mark.parametrize('stride', [0, -1, 5])
+def test_sliding_windows_reject_invalid_stride(stride):
+    with pytest.raises(ValueError):
+        sliding_windows(list(range(10)), size=4, stride=stride)
@@ -0,0 +1,26 @@
+import pytest
+
+pytest.importorskip('torch')
+pytest.importorskip('transformers')
+pytest.importorskip('sacrebleu')
+
+from transformers import MarianTokenizer
+from ai_services.inference_backends import check_marian_parity, load_marian
+
+MODEL = 'Helsinki-NLP/opus-mt-en-hi'
+
+@pytest.fixture(scope='module')
+def baseline():
+    # Only run against a model that is already in the local Hugging Face cache
+    try:
+        MarianTokenizer.from_pretrained(MODEL, local_files_only=True)
+    except OSError:
+        pytest.skip(f"{MODEL} is not cached locally")
+    return load_marian(MODEL, 'torch')
+
+@pytest.mark.parametrize('backend', ['int8', 'onnx'])
+def test_marian_backend_matches_fp32(baseline, backend):
+    if backend == 'onnx':
+        pytest.importorskip('optimum.onnxruntime')
+    report = check_marian_parity(MODEL, backend, baseline=baseline)
+    assert report['passed'], report
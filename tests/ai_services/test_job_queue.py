@@ -0,0 +1,52 @@
+import time
+from ai_services.job_queue import Job, JobQueue, MemoryJobStore, SQLiteJobStore, QUEUED, RUNNING, SUCCEEDED
+
+def _wait_finished(queue, job_id, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = queue.get(job_id)
+        if job['status'] in (SUCCEEDED, 'failed'):
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f"job {job_id} did not finish")
+
+def test_runs_jobs_and_keeps_results():
+    queue = JobQueue(MemoryJobStore(), {'double': lambda x: x * 2}, workers=1)
+    job = _wait_finished(queue, queue.submit('double', {'x': 21}))
+    assert job['status'] == SUCCEEDED
+    assert job['result'] == 42
+
+def test_claim_is_exclusive(tmp_path):
+    path = str(tmp_path / 'jobs.sqlite3')
+    store, other = SQLiteJobStore(path), SQLiteJobStore(path)
+    store.add(Job(id='a', kind='k', params={}, priority=0, created_at=time.time(), owner='me', heartbeat_at=time.time()))
+    assert other.claim('a', 'someone-else') is None
+    assert store.claim('a', 'me').status == RUNNING
+    assert store.claim('a', 'me') is None
+
+def test_sibling_processes_run_each_job_once(tmp_path):
+    path = str(tmp_path / 'jobs.sqlite3')
+    runs = []
+    handler = lambda x: runs.append(x) or x
+    first = JobQueue(SQLiteJobStore(path), {'h': handler}, workers=1)
+    job_ids = [first.submit('h', {'x': i}) for i in range(5)]
+    # A replica starting against the same database leaves live jobs alone
+    second = JobQueue(SQLiteJobStore(path), {'h': handler}, workers=1)
+    for job_id in job_ids:
+        _wait_finished(first, job_id)
+    assert sorted(runs) == list(range(5))
+    assert second.stats()['succeeded'] == 0
+
+def test_recovers_only_jobs_with_an_expired_lease(tmp_path):
+    path = str(tmp_path / 'jobs.sqlite3')
+    store = SQLiteJobStore(path)
+    now = time.time()
+    store.add(Job(id='stale', kind='h', params={'x': 1}, priority=0, created_at=now, owner='dead', heartbeat_at=now - 120))
+    store.add(Job(id='live', kind='h', params={'x': 2}, priority=0, created_at=now, owner='alive', heartbeat_at=now))
+    store.update('stale', status=RUNNING)
+
+    recovered = store.recover('new-owner', lease_seconds=60)
+    assert [job.id for job in recovered] == ['stale']
+    assert recovered[0].status == QUEUED and recovered[0].owner == 'new-owner'
+    assert store.get('live').owner == 'alive'
+    assert store.recover('another-owner', lease_seconds=60) == []
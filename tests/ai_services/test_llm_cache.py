@@ -0,0 +1,75 @@
+import time
+from ai_services import llm_cache
+from ai_services.llm_cache import CompletionCache, SQLiteResponseStore, completion_cache_key
+
+MESSAGES = [{'role': 'user', 'content': 'Explain recursion'}]
+
+def _response(content):
+    return {'choices': [{'message': {'role': 'assistant', 'content': content}}]}
+
+def test_key_depends_on_every_parameter_but_not_their_order():
+    key = completion_cache_key(model='gpt-4', messages=MESSAGES, temperature=0)
+    assert key == completion_cache_key(temperature=0, messages=MESSAGES, model='gpt-4')
+    assert key != completion_cache_key(model='gpt-4', messages=MESSAGES, temperature=0.7)
+    assert key != completion_cache_key(model='gpt-3.5-turbo', messages=MESSAGES, temperature=0)
+    assert key != completion_cache_key(model='gpt-4', messages=[{'role': 'user', 'content': 'Explain loops'}], temperature=0)
+
+def test_only_deterministic_calls_are_cached_by_default():
+    cache = CompletionCache()
+    assert cache.should_cache({'temperature': 0}, None)
+    assert not cache.should_cache({'temperature': 0.7}, None)
+    assert not cache.should_cache({}, None)
+    assert cache.should_cache({'temperature': 0.7}, True)
+    assert CompletionCache(cache_nondeterministic=True).should_cache({'temperature': 0.7}, None)
+
+def test_memory_entries_expire_after_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, 'monotonic', lambda: now[0])
+    cache = CompletionCache(ttl=60)
+    cache.set('k', _response('hi'))
+    now[0] += 59
+    assert cache.get('k')['choices'][0]['message']['content'] == 'hi'
+    now[0] += 2
+    assert cache.get('k') is None
+
+def test_disk_tier_is_shared_and_expires(tmp_path, monkeypatch):
+    path = str(tmp_path / 'llm.sqlite3')
+    CompletionCache(disk_path=path, ttl=60).set('k', _response('hi'))
+
+    other = CompletionCache(disk_path=path, ttl=60)
+    assert other.get('k').choices[0].message.content == 'hi'
+    assert other.stats()['disk_hits'] == 1
+
+    store = SQLiteResponseStore(path, ttl=60)
+    later = time.time() + 61
+    monkeypatch.setattr(time, 'time', lambda: later)
+    assert store.get('k') is None
+    assert len(store) == 0
+
+def test_disk_tier_evicts_least_recently_used(tmp_path):
+    store = SQLiteResponseStore(str(tmp_path / 'llm.sqlite3'), max_entries=2)
+    store.set('a', '1')
+    store.set('b', '2')
+    time.sleep(0.01)
+    store.get('a')
+    store.set('c', '3')
+    assert len(store) == 2
+    assert store.get('b') is None
+    assert store.get('a') == '1'
+
+def test_chat_completion_calls_upstream_once_per_key(monkeypatch):
+    calls = []
+
+    class FakeClient:
+        def chat_completion_sync(self, timeout=None, **params):
+            calls.append(params)
+            return _response(f"answer {len(calls)}")
+
+    monkeypatch.setattr(llm_cache, 'get_llm_client', lambda: FakeClient())
+    monkeypatch.setattr(llm_cache, '_completion_cache', CompletionCache())
+
+    first = llm_cache.chat_completion(model='gpt-4', messages=MESSAGES, temperature=0)
+    assert llm_cache.chat_completion(model='gpt-4', messages=MESSAGES, temperature=0) == first
+    llm_cache.chat_completion(model='gpt-4', messages=MESSAGES, temperature=0.7)
+    llm_cache.chat_completion(model='gpt-4', messages=MESSAGES, temperature=0.7)
+    assert len(calls) == 3
@@ -0,0 +1,15 @@
+import asyncio
+import pytest
+from ai_services.task_graph import Task, run_sync, run_task_graph
+
+def test_runs_dependencies_first():
+    tasks = [Task('a', lambda: 2), Task('b', lambda a: a * 3, deps=('a',))]
+    assert run_sync(run_task_graph(tasks)) == {'a': 2, 'b': 6}
+
+def test_run_sync_refuses_a_running_loop():
+    async def caller():
+        coro = run_task_graph([Task('a', lambda: 1)])
+        with pytest.raises(RuntimeError):
+            run_sync(coro)
+        return await run_task_graph([Task('a', lambda: 1)])
+    assert asyncio.run(caller()) == {'a': 1}
@@ -0,0 +1,96 @@
+import os
+import threading
+import time
+from ai_services.tts_cache import TTSCache, tts_cache_key
+
+def _zero(path):
+    return 0.0
+
+def test_key_is_stable_and_covers_every_input():
+    key = tts_cache_key('Well done', 'Rachel', 'en', 'happy', 'eleven_monolingual_v1')
+    assert key == tts_cache_key('Well done', 'Rachel', 'en', 'happy', 'eleven_monolingual_v1')
+    assert key != tts_cache_key('Well done', 'Rachel', 'en', 'neutral', 'eleven_monolingual_v1')
+    assert key != tts_cache_key('Well done', 'Domi', 'en', 'happy', 'eleven_monolingual_v1')
+
+def test_evicts_least_recently_used_within_byte_budget(tmp_path):
+    cache = TTSCache(str(tmp_path), max_bytes=250)
+    for name in ('a', 'b'):
+        cache.put(tts_cache_key(name, 'v'), b'x' * 100, duration_fn=_zero)
+        time.sleep(0.01)
+    cache.get(tts_cache_key('a', 'v'))
+    time.sleep(0.01)
+    cache.put(tts_cache_key('c', 'v'), b'x' * 100, duration_fn=_zero)
+
+    assert cache.get(tts_cache_key('b', 'v')) is None
+    assert cache.get(tts_cache_key('a', 'v')) is not None
+    assert cache.stats()['bytes'] == 200
+    assert cache.evictions == 1
+    assert not (tmp_path / f"feedback_{tts_cache_key('b', 'v')}.mp3").exists()
+
+def test_evicts_within_entry_budget(tmp_path):
+    cache = TTSCache(str(tmp_path), max_entries=2)
+    for name in ('a', 'b', 'c'):
+        cache.put(tts_cache_key(name, 'v'), b'x', duration_fn=_zero)
+        time.sleep(0.01)
+    assert cache.stats()['entries'] == 2
+    assert cache.get(tts_cache_key('a', 'v')) is None
+
+def test_concurrent_requests_synthesize_once(tmp_path):
+    cache = TTSCache(str(tmp_path))
+    key = tts_cache_key('Well done', 'Rachel')
+    calls = []
+    barrier = threading.Barrier(8)
+
+    def synthesize():
+        calls.append(1)
+        time.sleep(0.05)
+        return b'audio'
+
+    def request():
+        barrier.wait()
+        results.append(cache.get_or_create(key, synthesize, duration_fn=_zero).path)
+
+    results = []
+    threads = [threading.Thread(target=request) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert len(set(results)) == 1
+
+def test_concurrent_writers_leave_a_complete_file(tmp_path):
+    # Two caches over one directory stand in for two worker processes
+    first, second = TTSCache(str(tmp_path)), TTSCache(str(tmp_path))
+    key = tts_cache_key('Well done', 'Rachel')
+    payloads = {first: b'a' * 200000, second: b'b' * 200000}
+    barrier = threading.Barrier(2)
+
+    def write(cache):
+        barrier.wait()
+        for _ in range(20):
+            cache.put(key, payloads[cache], duration_fn=_zero)
+
+    threads = [threading.Thread(target=write, args=(cache,)) for cache in payloads]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    data = open(first.get(key).path, 'rb').read()
+    assert data in payloads.values()
+    assert not [name for name in os.listdir(tmp_path) if name.startswith('.tmp-')]
+
+def test_abandoned_stream_is_not_cached(tmp_path):
+    cache = TTSCache(str(tmp_path))
+    key = tts_cache_key('Well done', 'Rachel')
+    chunks = cache.stream(key, lambda: iter([b'one', b'two', b'three']))
+    assert next(chunks) == b'one'
+    chunks.close()
+
+    assert cache.get(key) is None
+    assert not [name for name in os.listdir(tmp_path) if name.startswith(('.tmp-', 'feedback_'))]
+
+    assert b''.join(cache.stream(key, lambda: iter([b'one', b'two']))) == b'onetwo'
+    assert b''.join(cache.stream(key, lambda: iter([]))) == b'onetwo'